@@ -0,0 +1,253 @@
+"""
+Local stand-ins for the Telegram Bot API and the RapidAPI movies database used by the replay benchmark.
+Both servers run on telegram_API.utils.http_server.HttpServer and support configurable latency and error rates.
+"""
+import asyncio
+import io
+import json
+import random
+import time
+from collections import Counter
+from email.parser import BytesParser
+from email.policy import HTTP
+from functools import lru_cache
+from http import HTTPStatus
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs
+
+from PIL import Image
+
+from telegram_API.utils.http_server import HttpServer, Request, Response
+
+TELEGRAM_METHODS = ('getMe', 'deleteWebhook', 'sendMessage', 'sendPhoto', 'sendDocument', 'sendMediaGroup',
+                    'answerCallbackQuery', 'editMessageReplyMarkup', 'answerInlineQuery')
+
+
+def _json_response(payload: object, status: int = HTTPStatus.OK) -> Response:
+    return Response(status, json.dumps(payload).encode(), 'application/json')
+
+
+def _query(request: Request) -> Dict[str, str]:
+    return {name: values[-1] for name, values in parse_qs(request.query).items()}
+
+
+def _multipart_fields(content_type: str, body: bytes) -> Dict[str, str]:
+    """
+    Extracts the text fields of a multipart/form-data body. Uploaded files are skipped.
+    :param content_type: The Content-Type header with the boundary.
+    :param body: The request body.
+    :return: The field values by name.
+    """
+    message = BytesParser(policy=HTTP).parsebytes(f'Content-Type: {content_type}\r\n\r\n'.encode() + body)
+    return {part.get_param('name', header='content-disposition'): part.get_content()
+            for part in message.iter_parts() if part.get_filename() is None}
+
+
+class _FakeServer:
+    """Common latency/error injection and call counting of the fake servers."""
+
+    def __init__(self, latency: float = 0.0, error_rate: float = 0.0, seed: int = 0) -> None:
+        self.latency = latency
+        self.error_rate = error_rate
+        self.calls: Counter = Counter()
+        self.errors: Counter = Counter()
+        self._random = random.Random(seed)
+        self.http_server = HttpServer('127.0.0.1', 0, max_connections=1000,
+                                      max_body_size=50 * 1024 * 1024)
+
+    @property
+    def url(self) -> str:
+        return f'http://127.0.0.1:{self.http_server.port_in_use}'
+
+    async def _simulate(self, name: str) -> bool:
+        """
+        Counts a call, sleeps for the configured latency and decides whether the call fails.
+        :param name: The endpoint or method name.
+        :return: True if the call must fail.
+        """
+        self.calls[name] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.error_rate and self._random.random() < self.error_rate:
+            self.errors[name] += 1
+            return True
+        return False
+
+    async def start(self) -> None:
+        await self.http_server.start()
+
+    async def stop(self) -> None:
+        await self.http_server.stop()
+
+
+@lru_cache(maxsize=1)
+def poster_image(width: int = 2000, height: int = 3000) -> bytes:
+    """
+    Builds a large JPEG poster, so the bot has to downscale it before sending.
+    :param width: The poster width.
+    :param height: The poster height.
+    :return: The JPEG image.
+    """
+    output = io.BytesIO()
+    Image.linear_gradient('L').resize((width, height)).convert('RGB').save(output, 'JPEG', quality=95)
+    return output.getvalue()
+
+
+def generate_movies(count: int = 250, genres: List[str] = None, seed: int = 0,
+                    image_base_url: str = 'https://images.example.com/poster') -> List[Dict]:
+    """
+    Builds synthetic Top-250 records in the RapidAPI 'base_info' format.
+    :param count: Number of movies.
+    :param genres: Genres to pick from.
+    :param seed: Random seed.
+    :param image_base_url: The base URL of the poster images.
+    :return: The movie records.
+    """
+    rnd = random.Random(seed)
+    genres = genres or ['Action', 'Adventure', 'Comedy', 'Crime', 'Drama', 'Fantasy', 'Sci-Fi', 'Thriller', 'War']
+    movies = []
+    for position in range(1, count + 1):
+        year = rnd.randint(1921, 2023)
+        movies.append({
+            'id': f'tt{position:07d}',
+            'position': position,
+            'titleText': {'text': f'Movie {position}'},
+            'releaseYear': {'year': year},
+            'releaseDate': {'day': rnd.randint(1, 28), 'month': rnd.randint(1, 12), 'year': year},
+            'primaryImage': {'url': f'{image_base_url}/{position}.jpg',
+                             'caption': {'plainText': f'Poster of Movie {position}'}},
+            'genres': {'genres': [{'text': genre} for genre in rnd.sample(genres, rnd.randint(1, 3))]},
+        })
+    return movies
+
+
+class FakeSiteApi(_FakeServer):
+    """
+    Stand-in for the RapidAPI movies database: /titles/utils/genres and the Top-250 /titles list.
+    Also serves the poster images under /posters for movies generated with image_base_url=poster_base_url.
+    """
+
+    def __init__(self, movies: List[Dict], genres: List[str], **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.movies = movies
+        self.genres = genres
+        self.http_server.route('GET', '/titles/utils/genres', self._handle_genres)
+        self.http_server.route('GET', '/titles', self._handle_titles)
+        for movie in movies:
+            self.http_server.route('GET', f'/posters/{movie["position"]}.jpg', self._handle_poster)
+        # The poster is rendered up front, so rendering it does not block the event loop during the replay
+        poster_image()
+
+    @property
+    def poster_base_url(self) -> str:
+        return f'{self.url}/posters'
+
+    async def _handle_poster(self, request: Request) -> Response:
+        self.calls['posters'] += 1
+        return Response(HTTPStatus.OK, poster_image(), 'image/jpeg')
+
+    async def _handle_genres(self, request: Request) -> Response:
+        if await self._simulate('genres'):
+            return Response(HTTPStatus.INTERNAL_SERVER_ERROR)
+        return _json_response({'results': [None] + [genre for genre in self.genres if genre != 'All']})
+
+    async def _handle_titles(self, request: Request) -> Response:
+        query = _query(request)
+        endpoint = 'titles:top_rated_page' if 'page' in query else 'titles'
+        if await self._simulate(endpoint):
+            return Response(HTTPStatus.INTERNAL_SERVER_ERROR)
+        movies = self.movies
+        if query.get('genre'):
+            movies = [movie for movie in movies
+                      if any(genre['text'] == query['genre'] for genre in movie['genres']['genres'])]
+        if query.get('startYear'):
+            movies = [movie for movie in movies if movie['releaseYear']['year'] >= int(query['startYear'])]
+        if query.get('endYear'):
+            movies = [movie for movie in movies if movie['releaseYear']['year'] <= int(query['endYear'])]
+        movies = sorted(movies, key=lambda movie: movie['releaseYear']['year'],
+                        reverse=query.get('sort') == 'year.decr')
+        limit = int(query.get('limit', 10))
+        page = int(query.get('page', 1))
+        results = movies[(page - 1) * limit:page * limit]
+        has_next = page * limit < len(movies)
+        return _json_response({'page': page, 'next': f'/titles?page={page + 1}' if has_next else None,
+                               'entries': len(results), 'results': results})
+
+
+class FakeTelegram(_FakeServer):
+    """
+    Stand-in for the Telegram Bot API. Accepts the methods the bot uses and answers with minimal Message objects.
+    Failed calls are answered with a flood-control error (HTTP 429) that carries retry_after.
+    The inline keyboard of the last message sent to each chat is kept in keyboards,
+    the answers to inline queries are kept in inline_answers by inline query id.
+    """
+
+    def __init__(self, token: str, retry_after: int = 1, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.token = token
+        self.retry_after = retry_after
+        self._message_id = 0
+        self.keyboards: Dict[int, Dict] = {}
+        self.inline_answers: Dict[str, Dict[str, str]] = {}
+        for method in TELEGRAM_METHODS:
+            self.http_server.route('POST', f'/bot{token}/{method}', self._handler(method))
+
+    @property
+    def base_url(self) -> str:
+        return f'{self.url}/bot'
+
+    def _message(self, chat_id: Optional[str], **content) -> Dict:
+        self._message_id += 1
+        return {'message_id': self._message_id, 'date': int(time.time()),
+                'chat': {'id': int(chat_id or 0), 'type': 'private'}, **content}
+
+    def _photo(self) -> Dict:
+        return {'photo': [{'file_id': f'photo-{self._message_id}', 'file_unique_id': f'u{self._message_id}',
+                           'width': 300, 'height': 450}]}
+
+    def _result(self, method: str, params: Dict[str, str]) -> object:
+        chat_id = params.get('chat_id')
+        if method == 'getMe':
+            return {'id': int(self.token.split(':')[0]), 'is_bot': True, 'first_name': 'Benchmark',
+                    'username': 'benchmark_bot', 'can_join_groups': False,
+                    'can_read_all_group_messages': False, 'supports_inline_queries': True}
+        if method == 'answerInlineQuery':
+            self.inline_answers[params['inline_query_id']] = params
+            return True
+        if method in ('deleteWebhook', 'answerCallbackQuery', 'editMessageReplyMarkup'):
+            return True
+        if method == 'sendPhoto':
+            return self._message(chat_id, **self._photo())
+        if method == 'sendDocument':
+            return self._message(chat_id, document={'file_id': f'document-{self._message_id + 1}',
+                                                    'file_unique_id': f'd{self._message_id + 1}'})
+        if method == 'sendMediaGroup':
+            messages = []
+            for _ in json.loads(params.get('media', '[]')):
+                message = self._message(chat_id)
+                message.update(self._photo())
+                messages.append(message)
+            return messages
+        markup = json.loads(params.get('reply_markup') or '{}')
+        if 'inline_keyboard' in markup:
+            self.keyboards[int(chat_id or 0)] = markup
+        return self._message(chat_id, text=params.get('text', ''))
+
+    def _handler(self, method: str):
+        async def handle(request: Request) -> Response:
+            if await self._simulate(method):
+                return _json_response({'ok': False, 'error_code': 429,
+                                       'description': f'Too Many Requests: retry after {self.retry_after}',
+                                       'parameters': {'retry_after': self.retry_after}},
+                                      HTTPStatus.TOO_MANY_REQUESTS)
+            content_type = request.headers.get('content-type', '')
+            if content_type.startswith('application/json'):
+                params = {name: value if isinstance(value, str) else json.dumps(value)
+                          for name, value in json.loads(request.body or b'{}').items()}
+            elif content_type.startswith('multipart/form-data'):
+                params = _multipart_fields(content_type, request.body)
+            else:
+                params = {name: values[-1] for name, values in parse_qs(request.body.decode()).items()}
+            return _json_response({'ok': True, 'result': self._result(method, params)})
+
+        return handle
@@ -0,0 +1,103 @@
+"""
+Micro-benchmark of parsing a Top-250 movies response: time and memory per payload for the former dict records
+and for site_API.utils.movies.Movie records with each available JSON backend.
+
+Run from the MovieBot root folder:
+    python -m benchmarks.movie_parsing --movies 250 --repeat 200
+"""
+import argparse
+import json
+import timeit
+import tracemalloc
+from datetime import datetime
+from typing import Any, Callable, Dict, List
+
+from benchmarks.fake_servers import generate_movies
+from site_API.utils.movies import orjson, parse_movies
+
+
+def _dict_movies_info(response: Dict) -> List[Dict[str, str]]:
+    """
+    The former parser of site_API.utils.site_api_handler: a dict per movie with 'Info is absent' placeholders.
+    :param response: The parsed response.
+    :return: The movie dicts.
+    """
+    results = []
+    if response['results']:
+        for movie in response['results']:
+            movie_info = {}
+            try:
+                movie_info['image_caption'] = movie['primaryImage']['caption']['plainText']
+            except (KeyError, TypeError):
+                movie_info['image_caption'] = 'Info is absent'
+            try:
+                movie_info['image_url'] = movie['primaryImage']['url']
+            except (KeyError, TypeError):
+                movie_info['image_url'] = 'Info is absent'
+            try:
+                movie_info['release_date'] = datetime(year=movie['releaseDate']['year'],
+                                                      month=movie['releaseDate']['month'],
+                                                      day=movie['releaseDate']['day']).strftime('%d %b %Y')
+            except (KeyError, TypeError):
+                movie_info['release_date'] = 'Info is absent'
+            try:
+                movie_info['title'] = movie['titleText']['text']
+            except (KeyError, TypeError):
+                movie_info['title'] = 'Info is absent'
+            try:
+                movie_info['position'] = movie['position']
+            except (KeyError, TypeError):
+                movie_info['position'] = 'Info is absent'
+            results.append(movie_info)
+    return results
+
+
+def _parsers(content: bytes) -> Dict[str, Callable[[], Any]]:
+    parsers = {
+        'dict, json': lambda: _dict_movies_info(json.loads(content)),
+        'Movie, json': lambda: parse_movies(json.loads(content)['results']),
+    }
+    if orjson is not None:
+        parsers['dict, orjson'] = lambda: _dict_movies_info(orjson.loads(content))
+        parsers['Movie, orjson'] = lambda: parse_movies(orjson.loads(content)['results'])
+    return parsers
+
+
+def measure(parse: Callable[[], Any], repeat: int) -> Dict[str, float]:
+    """
+    Measures one parser.
+    :param parse: Parses the payload and returns the movie records.
+    :param repeat: Number of timed runs.
+    :return: The best time per payload, the peak allocation while parsing
+        and the memory held by the parsed records.
+    """
+    best = min(timeit.repeat(parse, number=1, repeat=repeat))
+    tracemalloc.start()
+    try:
+        records = parse()
+        retained, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del records
+    return {'us': best * 1e6, 'peak KiB': peak / 1024, 'retained KiB': retained / 1024}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--movies', type=int, default=250, help='movies in the payload')
+    parser.add_argument('--repeat', type=int, default=200, help='timed runs per parser')
+    args = parser.parse_args()
+
+    content = json.dumps({'page': 1, 'next': None, 'entries': args.movies,
+                          'results': generate_movies(args.movies)}).encode()
+    print(f'Payload: {args.movies} movies, {len(content)} bytes')
+    header = f'{"parser":<16}{"us/payload":>14}{"peak KiB":>12}{"retained KiB":>16}'
+    print(header)
+    print('-' * len(header))
+    for name, parse in _parsers(content).items():
+        results = measure(parse, args.repeat)
+        print(f'{name:<16}{results["us"]:>14.0f}{results["peak KiB"]:>12.1f}{results["retained KiB"]:>16.1f}')
+
+
+if __name__ == '__main__':
+    main()
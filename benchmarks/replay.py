@@ -0,0 +1,272 @@
+"""
+Offline replay benchmark of the bot.
+
+Scripted conversations (/start, /high with paging, /custom with years, /low, /history, inline title search) are
+replayed through the real handlers and Application against local stand-ins for the Telegram Bot API and the RapidAPI
+movies database, so the benchmark needs no network access and no .env file. Reports throughput, per-step latency
+percentiles and the number of upstream and Telegram calls made during the replay.
+
+Run from the MovieBot root folder:
+    python -m benchmarks.replay --users 50 --rounds 2 --api-latency 0.05 --telegram-latency 0.02
+"""
+import argparse
+import asyncio
+import json
+import logging
+import math
+import os
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from itertools import count
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from telegram import Update
+
+from benchmarks.fake_servers import FakeSiteApi, FakeTelegram, generate_movies
+
+replay_logger = logging.getLogger(__name__)
+
+TOKEN = '123456:BENCHMARK'
+
+GENRES_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'site_API', 'data',
+                           'genres.json')
+
+# Pressing the "More" button of the last results page sent to the user
+MORE = None
+# Inline queries are written as '@<query>'. INLINE_NEXT requests the next page of the previous inline query.
+INLINE_NEXT = '@'
+
+SCRIPT: List[Tuple[str, Optional[str]]] = [
+    ('start', '/start'),
+    ('high', '/high'),
+    ('high:genre', 'Drama'),
+    ('high:count', '5'),
+    ('high:more', MORE),
+    ('custom', '/custom'),
+    ('custom:genre', 'Crime'),
+    # Paging through the /high results while the /custom conversation is open must not lose its state
+    ('custom:high_more', MORE),
+    ('custom:start_year', '1990'),
+    ('custom:end_year', '2010'),
+    ('custom:count', '5'),
+    ('low', '/low'),
+    ('low:genre', 'All'),
+    ('low:count', '3'),
+    ('history', '/history'),
+    ('inline', '@M'),
+    ('inline', '@Mov'),
+    ('inline', '@Movie 1'),
+    ('inline:next', INLINE_NEXT),
+]
+
+
+def _user(user_id: int) -> Dict:
+    return {'id': user_id, 'is_bot': False, 'first_name': f'User {user_id}', 'username': f'user{user_id}'}
+
+
+def _callback_data(update_id: int, user_id: int, data: str) -> Dict:
+    message = {'message_id': update_id, 'date': int(time.time()), 'text': 'Page',
+               'chat': {'id': user_id, 'type': 'private'}}
+    return {'update_id': update_id, 'callback_query': {'id': str(update_id), 'from': _user(user_id),
+                                                       'chat_instance': str(user_id), 'data': data,
+                                                       'message': message}}
+
+
+def _inline_query_data(update_id: int, user_id: int, query: str, offset: str = '') -> Dict:
+    return {'update_id': update_id, 'inline_query': {'id': str(update_id), 'from': _user(user_id), 'query': query,
+                                                     'offset': offset}}
+
+
+def _more_button(telegram: FakeTelegram, user_id: int) -> Optional[str]:
+    keyboard = telegram.keyboards.get(user_id, {}).get('inline_keyboard', [])
+    for button in (button for row in keyboard for button in row):
+        if button['text'].startswith('More'):
+            return button['callback_data']
+    return None
+
+
+def _update_data(update_id: int, user_id: int, text: str) -> Dict:
+    user = _user(user_id)
+    message = {'message_id': update_id, 'date': int(time.time()), 'text': text, 'from': user,
+               'chat': {'id': user_id, 'type': 'private', 'first_name': user['first_name']}}
+    if text.startswith('/'):
+        message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]
+    return {'update_id': update_id, 'message': message}
+
+
+def percentile(values: List[float], q: float) -> float:
+    """
+    Nearest-rank percentile.
+    :param values: The measured values.
+    :param q: The percentile from 0 to 100.
+    :return: The percentile value.
+    """
+    ordered = sorted(values)
+    return ordered[max(0, min(len(ordered) - 1, math.ceil(q / 100 * len(ordered)) - 1))]
+
+
+async def _replay_user(application, telegram: FakeTelegram, user_id: int, rounds: int, update_ids: Iterator[int],
+                       latencies: Dict[str, List[float]]) -> None:
+    for _ in range(rounds):
+        inline_query = None
+        for label, text in SCRIPT:
+            if text is MORE:
+                data = _more_button(telegram, user_id)
+                if data is None:
+                    continue
+                update_data = _callback_data(next(update_ids), user_id, data)
+            elif text == INLINE_NEXT:
+                answer = telegram.inline_answers.get(inline_query['id']) if inline_query else None
+                if not answer or not answer.get('next_offset'):
+                    continue
+                update_data = _inline_query_data(next(update_ids), user_id, inline_query['query'],
+                                                 answer['next_offset'])
+                inline_query = update_data['inline_query']
+            elif text.startswith('@'):
+                update_data = _inline_query_data(next(update_ids), user_id, text[1:])
+                inline_query = update_data['inline_query']
+            else:
+                update_data = _update_data(next(update_ids), user_id, text)
+            update = Update.de_json(update_data, application.bot)
+            started = time.perf_counter()
+            await application.process_update(update)
+            latencies[label].append(time.perf_counter() - started)
+
+
+async def run(args: argparse.Namespace) -> Dict:
+    """
+    Starts the fake servers and the bot, replays the conversations and stops everything.
+    :param args: The parsed command line arguments.
+    :return: The benchmark results.
+    """
+    with open(GENRES_PATH, encoding='utf-8') as file:
+        genres = json.load(file)
+    site_api = FakeSiteApi(generate_movies(seed=args.seed), genres, latency=args.api_latency,
+                           error_rate=args.api_error_rate, seed=args.seed)
+    telegram = FakeTelegram(TOKEN, latency=args.telegram_latency, error_rate=args.telegram_error_rate,
+                            seed=args.seed)
+    await site_api.start()
+    await telegram.start()
+    # Posters are served by the fake site API, whose address is known only after it has started
+    site_api.movies = generate_movies(seed=args.seed, image_base_url=site_api.poster_base_url)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        os.environ.update({
+            'SITE_API_KEY': 'benchmark',
+            'SITE_API_HOST': 'benchmark',
+            'SITE_API_URL': site_api.url,
+            'SITE_API_HTTP2': 'false',
+            'TELEGRAM_BOT_API_KEY': TOKEN,
+            'TELEGRAM_BASE_URL': telegram.base_url,
+            'DB_PATH': os.path.join(tmp_dir, 'history.db'),
+            'GENRES_SNAPSHOT_PATH': os.path.join(tmp_dir, 'genres_snapshot.json'),
+            'POSTER_CACHE_DIR': os.path.join(tmp_dir, 'posters'),
+        })
+        # The bot reads its settings on import, so it is imported only after the environment is prepared
+        from database.db_core import init_db
+        from site_API.site_api import movie_catalog
+        from telegram_API.loader import build_application
+
+        init_db()
+        application = build_application(with_updater=False)
+        handler_errors: Counter = Counter()
+
+        async def count_error(update: object, context) -> None:
+            handler_errors[type(context.error).__name__] += 1
+            replay_logger.error('Handler raised an exception', exc_info=context.error)
+
+        application.add_error_handler(count_error)
+        await application.initialize()
+        await application.post_init(application)
+        if not args.catalog:
+            for job in application.job_queue.get_jobs_by_name('refresh_catalog'):
+                job.schedule_removal()
+        await application.start()
+        if args.catalog:
+            deadline = time.monotonic() + 30
+            while not movie_catalog.is_loaded and time.monotonic() < deadline:
+                await asyncio.sleep(0.05)
+
+        before = {name: Counter(counter) for name, counter in (('site_api_calls', site_api.calls),
+                                                                 ('site_api_errors', site_api.errors),
+                                                                 ('telegram_calls', telegram.calls),
+                                                                 ('telegram_errors', telegram.errors))}
+        latencies: Dict[str, List[float]] = defaultdict(list)
+        update_ids = count(1)
+        started = time.perf_counter()
+        await asyncio.gather(*(_replay_user(application, telegram, user_id, args.rounds, update_ids, latencies)
+                               for user_id in range(1, args.users + 1)))
+        elapsed = time.perf_counter() - started
+
+        await application.stop()
+        await application.shutdown()
+        await application.post_shutdown(application)
+
+    await site_api.stop()
+    await telegram.stop()
+
+    updates = sum(len(values) for values in latencies.values())
+    return {
+        'updates': updates,
+        'elapsed': elapsed,
+        'throughput': updates / elapsed,
+        'catalog': args.catalog,
+        'latency': {label: {'count': len(latencies[label]),
+                            'p50': percentile(latencies[label], 50),
+                            'p95': percentile(latencies[label], 95),
+                            'p99': percentile(latencies[label], 99)}
+                    for label, _ in SCRIPT if latencies[label]},
+        'site_api_calls': dict(site_api.calls - before['site_api_calls']),
+        'site_api_errors': dict(site_api.errors - before['site_api_errors']),
+        'telegram_calls': dict(telegram.calls - before['telegram_calls']),
+        'telegram_errors': dict(telegram.errors - before['telegram_errors']),
+        'handler_errors': dict(handler_errors),
+    }
+
+
+def _print_results(results: Dict) -> None:
+    print(f'{results["updates"]} updates in {results["elapsed"]:.2f}s: {results["throughput"]:.1f} updates/s '
+          f'(catalog {"on" if results["catalog"] else "off"})')
+    header = f'{"step":<20}{"count":>8}{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}'
+    print(header)
+    print('-' * len(header))
+    for label, stats in results['latency'].items():
+        print(f'{label:<20}{stats["count"]:>8}'
+              f'{stats["p50"] * 1000:>10.1f}{stats["p95"] * 1000:>10.1f}{stats["p99"] * 1000:>10.1f}')
+    for name in ('site_api_calls', 'site_api_errors', 'telegram_calls', 'telegram_errors', 'handler_errors'):
+        print(f'{name}: {dict(sorted(results[name].items()))}')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=50, help='number of concurrent users')
+    parser.add_argument('--rounds', type=int, default=1, help='how many times every user replays the script')
+    parser.add_argument('--api-latency', type=float, default=0.05, help='fake RapidAPI latency in seconds')
+    parser.add_argument('--api-error-rate', type=float, default=0.0, help='share of failed RapidAPI calls')
+    parser.add_argument('--telegram-latency', type=float, default=0.02, help='fake Telegram latency in seconds')
+    parser.add_argument('--telegram-error-rate', type=float, default=0.0,
+                        help='share of Telegram calls answered with a flood-control error')
+    parser.add_argument('--no-catalog', dest='catalog', action='store_false',
+                        help='serve movie requests from the API instead of the preloaded Top-250 catalog')
+    parser.add_argument('--seed', type=int, default=0, help='random seed of the fake data and errors')
+    parser.add_argument('--json', action='store_true', help='print the results as JSON')
+    parser.add_argument('--verbose', action='store_true', help='show the bot logs')
+    parser.add_argument('--check', action='store_true',
+                        help='exit with status 1 if any handler raised an exception during the replay')
+    args = parser.parse_args()
+
+    logging.basicConfig(format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+                        level=logging.INFO if args.verbose else logging.CRITICAL)
+    results = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        _print_results(results)
+    if args.check and results['handler_errors']:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+"""
+Micro-benchmark of history insert/retrieve throughput for SQLite storage profiles.
+
+Run from the MovieBot root folder:
+    python -m benchmarks.sqlite_profiles --rows 20000 --users 500
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime
+from typing import Callable, Dict, List
+
+from database.models import db, configure_db, BotUser, History, PosterFile
+
+PROFILES: Dict[str, Dict] = {
+    'default': dict(journal_mode='delete', synchronous='full', cache_size=-2000, mmap_size=0),
+    'wal-full': dict(journal_mode='wal', synchronous='full', cache_size=-2000, mmap_size=0),
+    'wal-normal': dict(journal_mode='wal', synchronous='normal', cache_size=-2000, mmap_size=0),
+    'wal-normal-cache-mmap': dict(journal_mode='wal', synchronous='normal', cache_size=-64000,
+                                  mmap_size=256 * 1024 * 1024),
+    'memory-journal-off': dict(journal_mode='memory', synchronous='off', cache_size=-64000,
+                               mmap_size=256 * 1024 * 1024),
+}
+
+
+def _history_rows(count: int, users: int) -> List[Dict]:
+    commands = ['start', 'help', 'high', 'low', 'custom', 'history']
+    return [
+        {
+            'user': random.randrange(users),
+            'command': random.choice(commands),
+            'genre': random.choice([None, 'Drama', 'Action', 'Crime']),
+            'start_year': None,
+            'end_year': None,
+            'create_datetime': datetime.now(),
+        }
+        for _ in range(count)
+    ]
+
+
+def _timed(action: Callable[[], None]) -> float:
+    started = time.perf_counter()
+    action()
+    return time.perf_counter() - started
+
+
+def run_profile(name: str, profile: Dict, rows: int, users: int, batch_size: int, reads: int) -> Dict[str, float]:
+    """
+    Measures one storage profile on a fresh database file.
+    :param name: The profile name.
+    :param profile: Keyword arguments of database.models.get_pragmas.
+    :param rows: Number of history rows inserted by each insert scenario.
+    :param users: Number of distinct users.
+    :param batch_size: Rows per transaction in the batched insert scenario.
+    :param reads: Number of "last 10 entries" reads.
+    :return: Throughput of each scenario in operations per second.
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        configure_db(os.path.join(tmp_dir, f'{name}.db'), **profile)
+        db.connect()
+        db.create_tables([BotUser, History, PosterFile])
+        BotUser.insert_many([{'id': user_id} for user_id in range(users)]).execute()
+
+        single_rows = _history_rows(rows // 10, users)
+
+        def insert_single() -> None:
+            for row in single_rows:
+                with db.atomic():
+                    History.insert(row).execute()
+
+        batched_rows = _history_rows(rows, users)
+
+        def insert_batched() -> None:
+            for i in range(0, len(batched_rows), batch_size):
+                with db.atomic():
+                    History.insert_many(batched_rows[i:i + batch_size]).execute()
+
+        def retrieve() -> None:
+            for _ in range(reads):
+                list(History.select()
+                     .where(History.user == random.randrange(users))
+                     .order_by(History.create_datetime.desc())
+                     .limit(10)
+                     .tuples())
+
+        results = {
+            'single insert rows/s': len(single_rows) / _timed(insert_single),
+            'batched insert rows/s': len(batched_rows) / _timed(insert_batched),
+            'retrieve queries/s': reads / _timed(retrieve),
+        }
+        db.close()
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=20000, help='rows inserted by the batched scenario')
+    parser.add_argument('--users', type=int, default=500, help='number of distinct users')
+    parser.add_argument('--batch-size', type=int, default=100, help='rows per transaction in the batched scenario')
+    parser.add_argument('--reads', type=int, default=5000, help='number of history reads')
+    parser.add_argument('--profile', action='append', choices=sorted(PROFILES), help='profiles to run (default: all)')
+    args = parser.parse_args()
+
+    random.seed(0)
+    header = f'{"profile":<24}{"single insert rows/s":>24}{"batched insert rows/s":>24}{"retrieve queries/s":>22}'
+    print(header)
+    print('-' * len(header))
+    for name in args.profile or PROFILES:
+        results = run_profile(name, PROFILES[name], args.rows, args.users, args.batch_size, args.reads)
+        print(f'{name:<24}'
+              f'{results["single insert rows/s"]:>24.0f}'
+              f'{results["batched insert rows/s"]:>24.0f}'
+              f'{results["retrieve queries/s"]:>22.0f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,10 +1,23 @@
-from database.models import db, History, BotUser
+from database.models import db, configure_db, History, BotUser, PosterFile, PersistedData
 from database.utils.CRUD import CRUDInterface
+from database.utils.history_writer import HistoryWriter
+from settings import ApplicationSettings
+
+app_settings = ApplicationSettings()
 
 
 def init_db():
+    configure_db(app_settings.db_path,
+                 journal_mode=app_settings.db_journal_mode,
+                 synchronous=app_settings.db_synchronous,
+                 cache_size=app_settings.db_cache_size,
+                 mmap_size=app_settings.db_mmap_size,
+                 busy_timeout=app_settings.db_busy_timeout)
     with db:
-        db.create_tables([History, BotUser])
+        db.create_tables([History, BotUser, PosterFile, PersistedData])
 
 
-crud = CRUDInterface()
+crud = CRUDInterface(HistoryWriter(batch_size=app_settings.history_batch_size,
+                                   flush_interval=app_settings.history_flush_interval),
+                     known_users_size=app_settings.known_users_cache_size,
+                     history_cache_size=app_settings.history_cache_size)
@@ -1,8 +1,39 @@
 from datetime import datetime
+from typing import Dict, Union
 
 import peewee as pw
 
-db = pw.SqliteDatabase('history.db')
+db = pw.SqliteDatabase(None)
+
+
+def get_pragmas(journal_mode: str = 'wal', synchronous: str = 'normal', cache_size: int = -64000,
+                mmap_size: int = 256 * 1024 * 1024, busy_timeout: int = 5000) -> Dict[str, Union[str, int]]:
+    """
+    Builds the SQLite pragmas of a storage performance profile.
+    :param journal_mode: SQLite journal mode, e.g. 'delete' or 'wal'.
+    :param synchronous: SQLite synchronous level: 'off', 'normal', 'full' or 'extra'.
+    :param cache_size: Page cache size. Negative values are in KiB, positive values are in pages.
+    :param mmap_size: Maximum number of bytes of the database file to memory-map. 0 disables mmap.
+    :param busy_timeout: How long to wait for a locked database in milliseconds.
+    :return: The pragmas to pass to the database.
+    """
+    return {
+        'journal_mode': journal_mode,
+        'synchronous': synchronous,
+        'cache_size': cache_size,
+        'mmap_size': mmap_size,
+        'busy_timeout': busy_timeout,
+    }
+
+
+def configure_db(path: str, **profile) -> None:
+    """
+    Initializes the deferred database with a file path and a storage performance profile.
+    :param path: The database file path.
+    :param profile: Keyword arguments of get_pragmas.
+    :return: None
+    """
+    db.init(path, pragmas=get_pragmas(**profile))
 
 
 class BaseModel(pw.Model):
@@ -19,8 +50,30 @@ class BotUser(BaseModel):
 
 
 class History(BaseModel):
-    user = pw.ForeignKeyField(BotUser, backref='history')
+    user = pw.ForeignKeyField(BotUser, backref='history', index=False)
     command = pw.TextField()
     genre = pw.CharField(null=True, default=None)
     start_year = pw.IntegerField(null=True, default=None)
     end_year = pw.IntegerField(null=True, default=None)
+
+    class Meta:
+        # Covers "last N entries of a user" reads and per-user retention pruning.
+        indexes = (
+            (('user', 'create_datetime'), False),
+        )
+
+
+class PosterFile(BaseModel):
+    image_url = pw.TextField(unique=True)
+    file_id = pw.CharField()
+    media_type = pw.CharField(default='photo')
+
+
+class PersistedData(BaseModel):
+    # kind is 'user_data', 'chat_data', 'bot_data' or 'conversation:<handler name>'.
+    kind = pw.CharField()
+    key = pw.TextField()
+    value = pw.TextField()
+
+    class Meta:
+        primary_key = pw.CompositeKey('kind', 'key')
@@ -1,62 +1,279 @@
 import logging
-from typing import Dict, TypeVar
+from datetime import datetime, timedelta
+from collections import OrderedDict, deque
+from typing import Deque, Dict, List, NamedTuple, Optional, Tuple, TypeVar
 
 import peewee as pw
 from telegram import User
 
-from database.models import db, BotUser, History
+from database.models import db, History, PosterFile
+from database.utils.history_writer import HistoryWriter, PosterFileChange
+from metrics import REGISTRY, timed
 
 crud_logger = logging.getLogger(__name__)
 
+CRUD_DURATION = REGISTRY.histogram('crud_operation_duration_seconds', 'Duration of CRUD operations', ('method',))
+CRUD_ERRORS = REGISTRY.counter('crud_operation_errors_total', 'CRUD operations that raised an exception', ('method',))
+
 T = TypeVar("T")
 
+HISTORY_SIZE = 10
+
+
+class HistoryEntry(NamedTuple):
+    command: str
+    genre: Optional[str]
+    start_year: Optional[int]
+    end_year: Optional[int]
+    create_datetime: datetime
+
 
 class CRUDInterface:
     """CRUD Interface class for easier database access"""
 
-    @staticmethod
-    def insert_history_data(user: User, data: Dict) -> None:
+    def __init__(self, history_writer: HistoryWriter, known_users_size: int = 10000,
+                 history_cache_size: int = 10000) -> None:
+        self.history_writer = history_writer
+        self.known_users_size = known_users_size
+        self.history_cache_size = history_cache_size
+        self._known_users: 'OrderedDict[int, Tuple[Optional[str], Optional[str]]]' = OrderedDict()
+        self._history_cache: 'OrderedDict[int, Deque[HistoryEntry]]' = OrderedDict()
+        self._poster_files: Dict[str, Tuple[str, str]] = {}
+
+    def _remember_user(self, user: User) -> Optional[Dict]:
         """
-        Inserts history data into the database for the specified user.
+        Updates the in-process LRU of known users with the user's last seen profile.
+        :param user: The Telegram user object.
+        :return: The BotUser fields to upsert if the user is new or their profile changed, otherwise None.
+        """
+        profile = (user.username, user.first_name)
+        if self._known_users.get(user.id) == profile:
+            self._known_users.move_to_end(user.id)
+            return None
+        self._known_users[user.id] = profile
+        self._known_users.move_to_end(user.id)
+        if len(self._known_users) > self.known_users_size:
+            self._known_users.popitem(last=False)
+        return {
+            'id': user.id,
+            'username': user.username,
+            'first_name': user.first_name,
+        }
+
+    @timed(CRUD_DURATION, CRUD_ERRORS, method=None)
+    def insert_history_data(self, user: User, data: Dict) -> None:
+        """
+        Queues history data for the specified user to be written by the history writer.
         :param user: The Telegram user object.
         :param data: The data to be inserted.
         :return: None
         """
-        try:
-            crud_logger.info(f'Inserting "{data["command"]}" history for @{user.username}')
-            with db.atomic():
-                user_info = {
-                    'id': user.id,
-                    'username': user.username,
-                    'first_name': user.first_name,
-                }
-                user_obj, is_created = BotUser.get_or_create(**user_info)
-                History.create(user=user_obj, **data)
-            crud_logger.debug(f'OK. Inserted "{data["command"]}" history for @{user.username}')
-        except pw.PeeweeException as e:
-            crud_logger.exception(f'Something went wrong during history insertion. Error: {e}')
+        crud_logger.info(f'Queueing "{data["command"]}" history for @{user.username}')
+        user_info = self._remember_user(user)
+        row = {
+            'user': user.id,
+            'create_datetime': datetime.now(),
+            'genre': None,
+            'start_year': None,
+            'end_year': None,
+            **data,
+        }
+        self.history_writer.submit(user_info, row)
+        history = self._history_cache.get(user.id)
+        if history is not None:
+            history.appendleft(HistoryEntry(row['command'], row['genre'], row['start_year'], row['end_year'],
+                                            row['create_datetime']))
 
-    @staticmethod
-    def retrieve_history(user: User) -> pw.ModelSelect:
+    @timed(CRUD_DURATION, CRUD_ERRORS, method=None)
+    def get_cached_history(self, user: User) -> Optional[List[HistoryEntry]]:
+        """
+        Returns the user's latest history entries from the in-memory ring buffer without touching the database.
+        :param user: The Telegram user object.
+        :return: The latest history entries, newest first, or None if the buffer is cold.
+        """
+        history = self._history_cache.get(user.id)
+        if history is None:
+            return None
+        self._history_cache.move_to_end(user.id)
+        return list(history)
+
+    @timed(CRUD_DURATION, CRUD_ERRORS, method=None)
+    def retrieve_history(self, user: User) -> Optional[List[HistoryEntry]]:
         """
-        Retrieves history data from the database for the specified user.
+        Retrieves history data from the database for the specified user with a single query.
+        Rows still queued in the history writer are written first. The in-memory caches are not touched,
+        so this can run in a worker thread; pass the result to cache_history on the event loop.
         :param user: The Telegram user object.
-        :return: A query object representing the retrieved history data.
+        :return: The latest history entries, newest first, or None if the query failed.
         """
+        self.history_writer.flush(timeout=self.history_writer.flush_interval)
         try:
             crud_logger.info(f'Retrieving history for @{user.username}')
-            with db.atomic():
-                user_info = {
-                    'id': user.id,
-                    'username': user.username,
-                    'first_name': user.first_name,
-                }
-                user_obj, is_created = BotUser.get_or_create(**user_info)
-                response = History.select() \
-                    .where(History.user == user_obj) \
-                    .order_by(History.create_datetime.desc()) \
-                    .limit(10)
+            query = History.select(History.command, History.genre, History.start_year, History.end_year,
+                                   History.create_datetime) \
+                .where(History.user == user.id) \
+                .order_by(History.create_datetime.desc()) \
+                .limit(HISTORY_SIZE) \
+                .tuples()
+            history = [HistoryEntry(*row) for row in query]
             crud_logger.debug(f'OK. Retrieved history for @{user.username}')
-            return response
+            return history
         except pw.PeeweeException as e:
             crud_logger.exception(f'Something went wrong during history retrieval. Error: {e}')
+            return None
+
+    @timed(CRUD_DURATION, CRUD_ERRORS, method=None)
+    def cache_history(self, user: User, history: Optional[List[HistoryEntry]]) -> List[HistoryEntry]:
+        """
+        Fills the user's ring buffer with history retrieved from the database.
+        Like the other methods that update the in-memory caches, it must be called from the event loop thread.
+        :param user: The Telegram user object.
+        :param history: The result of retrieve_history.
+        :return: The latest history entries, newest first.
+        """
+        user_info = self._remember_user(user)
+        if user_info is not None:
+            self.history_writer.submit(user_info, None)
+        if history is None:
+            return []
+        self._history_cache[user.id] = deque(history, maxlen=HISTORY_SIZE)
+        if len(self._history_cache) > self.history_cache_size:
+            self._history_cache.popitem(last=False)
+        return history
+
+    @staticmethod
+    @timed(CRUD_DURATION, CRUD_ERRORS, method=None)
+    def prune_history(keep_last: int = 0, max_age_days: int = 0, batch_size: int = 10000) -> int:
+        """
+        Applies the history retention policy. Rows are deleted in batches to keep write locks short.
+        :param keep_last: How many latest rows to keep per user. 0 keeps all rows.
+        :param max_age_days: Maximum row age in days. 0 keeps rows of any age.
+        :param batch_size: Maximum number of rows deleted by one statement.
+        :return: The number of deleted rows.
+        """
+        deleted = 0
+        try:
+            crud_logger.info(f'Pruning history (keep_last={keep_last}, max_age_days={max_age_days})')
+            if max_age_days:
+                expired = History.select(History.id) \
+                    .where(History.create_datetime < datetime.now() - timedelta(days=max_age_days)) \
+                    .limit(batch_size)
+                deleted += CRUDInterface._delete_in_batches(expired)
+            if keep_last:
+                ranked = History.select(
+                    History.id,
+                    pw.fn.ROW_NUMBER().over(partition_by=[History.user],
+                                            order_by=[History.create_datetime.desc(), History.id.desc()]).alias('rn')
+                ).alias('ranked')
+                stale = pw.Select([ranked], [ranked.c.id]).where(ranked.c.rn > keep_last).limit(batch_size)
+                deleted += CRUDInterface._delete_in_batches(stale)
+            crud_logger.debug(f'OK. Pruned {deleted} history rows')
+        except pw.PeeweeException as e:
+            crud_logger.exception(f'Something went wrong during history pruning. Error: {e}')
+        return deleted
+
+    @staticmethod
+    def _delete_in_batches(ids_query: pw.SelectBase) -> int:
+        deleted = 0
+        while True:
+            with db.atomic():
+                count = History.delete().where(History.id.in_(ids_query)).execute()
+            deleted += count
+            if not count:
+                return deleted
+
+    @staticmethod
+    @timed(CRUD_DURATION, CRUD_ERRORS, method=None)
+    def compact_database(min_free_ratio: float = 0.25) -> bool:
+        """
+        Runs VACUUM when free pages make up a large part of the database file.
+        :param min_free_ratio: The minimum share of free pages that triggers VACUUM.
+        :return: True if VACUUM was run.
+        """
+        try:
+            page_count = db.execute_sql('PRAGMA page_count').fetchone()[0]
+            free_count = db.execute_sql('PRAGMA freelist_count').fetchone()[0]
+            if not page_count or free_count / page_count < min_free_ratio:
+                return False
+            crud_logger.info(f'Compacting database: {free_count} of {page_count} pages are free')
+            db.execute_sql('VACUUM')
+            return True
+        except pw.PeeweeException as e:
+            crud_logger.exception(f'Something went wrong during database compaction. Error: {e}')
+            return False
+
+    @staticmethod
+    @timed(CRUD_DURATION, CRUD_ERRORS, method=None)
+    def popular_queries(commands: Tuple[str, ...] = ('high', 'low'), limit: int = 20,
+                        since_days: int = 7) -> List[Tuple[str, Optional[str]]]:
+        """
+        Finds the most frequent (command, genre) combinations in the history.
+        :param commands: The commands to count.
+        :param limit: The maximum number of combinations.
+        :param since_days: Only rows of the last since_days days are counted. 0 counts all rows.
+        :return: (command, genre) tuples, most frequent first. The genre is None for all genres.
+        """
+        try:
+            requests = pw.fn.COUNT(History.id)
+            query = History.select(History.command, History.genre) \
+                .where(History.command.in_(commands))
+            if since_days:
+                query = query.where(History.create_datetime >= datetime.now() - timedelta(days=since_days))
+            query = query.group_by(History.command, History.genre) \
+                .order_by(requests.desc()) \
+                .limit(limit) \
+                .tuples()
+            return list(query)
+        except pw.PeeweeException as e:
+            crud_logger.exception(f'Something went wrong during popular queries retrieval. Error: {e}')
+            return []
+
+    @timed(CRUD_DURATION, CRUD_ERRORS, method=None)
+    def load_poster_files(self) -> int:
+        """
+        Loads the image URL to Telegram file_id mapping into memory. Called once at startup,
+        after that poster file ids are only read from memory.
+        :return: The number of loaded file ids.
+        """
+        try:
+            self._poster_files = {
+                poster.image_url: (poster.file_id, poster.media_type)
+                for poster in PosterFile.select()
+            }
+            crud_logger.debug(f'OK. Loaded {len(self._poster_files)} poster file ids')
+        except pw.PeeweeException as e:
+            crud_logger.exception(f'Something went wrong during poster file ids loading. Error: {e}')
+        return len(self._poster_files)
+
+    @timed(CRUD_DURATION, CRUD_ERRORS, method=None)
+    def get_poster_file(self, image_url: str) -> Optional[Tuple[str, str]]:
+        """
+        Retrieves the Telegram file_id of an already uploaded poster from memory.
+        :param image_url: The poster image URL.
+        :return: A (file_id, media_type) tuple or None if the poster was never uploaded.
+        """
+        return self._poster_files.get(image_url)
+
+    @timed(CRUD_DURATION, CRUD_ERRORS, method=None)
+    def save_poster_file(self, image_url: str, file_id: str, media_type: str = 'photo') -> None:
+        """
+        Stores the Telegram file_id of an uploaded poster in memory and queues it to be written by the history writer.
+        :param image_url: The poster image URL.
+        :param file_id: The Telegram file_id of the uploaded poster.
+        :param media_type: How the poster was sent: 'photo' or 'document'.
+        :return: None
+        """
+        if self._poster_files.get(image_url) == (file_id, media_type):
+            return
+        self._poster_files[image_url] = (file_id, media_type)
+        self.history_writer.submit_poster_file(PosterFileChange(image_url, file_id, media_type))
+
+    @timed(CRUD_DURATION, CRUD_ERRORS, method=None)
+    def forget_poster_file(self, image_url: str) -> None:
+        """
+        Removes a poster file_id that Telegram no longer accepts from memory and queues its deletion.
+        :param image_url: The poster image URL.
+        :return: None
+        """
+        if self._poster_files.pop(image_url, None) is not None:
+            self.history_writer.submit_poster_file(PosterFileChange(image_url))
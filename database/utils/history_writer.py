@@ -0,0 +1,310 @@
+import logging
+import queue
+import threading
+import time
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+import peewee as pw
+
+from database.models import db, BotUser, History, PosterFile
+from database.utils.persistence_store import PersistenceStore
+
+history_writer_logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class PosterFileChange(NamedTuple):
+    """A Telegram file_id of a poster to store, or to delete if file_id is None."""
+    image_url: str
+    file_id: Optional[str] = None
+    media_type: Optional[str] = None
+
+
+class PersistenceBatch(NamedTuple):
+    """Changed persisted bot state entries: serialized values by (kind, key), None deletes the entry."""
+    entries: Dict[Tuple[str, str], Optional[str]]
+
+
+class HistoryWriter:
+    """
+    Write-behind history writer.
+    Handlers only put rows into an in-memory queue; a dedicated DB worker thread drains it
+    and inserts the rows in batches, so the event loop never waits on disk I/O and the commit
+    cost is shared by many users. A batch is written when it is full or when the oldest row
+    in it has waited for flush_interval seconds, and everything left is written on stop().
+    Poster file_id changes and, in the worker process mode, persisted bot state of the workers
+    are queued and written by the same thread, so it is the only thread that writes to the database.
+    """
+
+    def __init__(self, batch_size: int = 100, flush_interval: float = 1.0, max_queue_size: int = 10000) -> None:
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue_size)
+        self._thread: Optional[threading.Thread] = None
+        self.written = 0
+        self.dropped = 0
+        self.batches = 0
+
+    @property
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        """
+        Starts the DB worker thread. Does nothing if it is already running.
+        :return: None
+        """
+        if self.is_running:
+            return
+        history_writer_logger.info('Starting history writer')
+        self._thread = threading.Thread(target=self._run, name='history-writer', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = None) -> None:
+        """
+        Writes all queued rows and stops the DB worker thread.
+        :param timeout: Maximum time to wait for the worker thread in seconds.
+        :return: None
+        """
+        if not self.is_running:
+            return
+        history_writer_logger.info('Stopping history writer')
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        self._thread = None
+        history_writer_logger.info(f'History writer stopped. Stats: {self.stats()}')
+
+    def submit(self, user_info: Optional[Dict], row: Optional[Dict]) -> None:
+        """
+        Queues a history row and/or a BotUser upsert for writing.
+        :param user_info: The Telegram user fields to upsert into BotUser or None if they are already stored.
+        :param row: The History row or None.
+        :return: None
+        """
+        try:
+            self._queue.put_nowait((user_info, row))
+        except queue.Full:
+            self.dropped += 1
+            history_writer_logger.error(f'History queue is full. Dropped history row {row}')
+
+    def submit_poster_file(self, change: PosterFileChange) -> None:
+        """
+        Queues a poster file_id change for writing.
+        :param change: The file_id to store or delete.
+        :return: None
+        """
+        try:
+            self._queue.put_nowait(change)
+        except queue.Full:
+            history_writer_logger.error(f'History queue is full. Dropped poster file id change {change}')
+
+    def submit_persistence(self, entries: Dict[Tuple[str, str], Optional[str]]) -> None:
+        """
+        Queues a batch of persisted bot state entries for writing.
+        Unlike history rows, state is never dropped: the call blocks while the queue is full.
+        :param entries: Serialized values by (kind, key); None deletes the entry.
+        :return: None
+        """
+        self._queue.put(PersistenceBatch(entries))
+
+    def submit_item(self, item: Any) -> None:
+        """
+        Queues an item forwarded by QueueHistoryWriter of a worker process.
+        :param item: A (user_info, row) tuple, a PosterFileChange or a PersistenceBatch.
+        :return: None
+        """
+        if isinstance(item, PosterFileChange):
+            self.submit_poster_file(item)
+        elif isinstance(item, PersistenceBatch):
+            self.submit_persistence(item.entries)
+        else:
+            self.submit(*item)
+
+    def flush(self, timeout: float = None) -> bool:
+        """
+        Blocks until every row queued before the call is written.
+        :param timeout: Maximum time to wait in seconds.
+        :return: True if the rows were written in time.
+        """
+        if not self.is_running:
+            return self._queue.empty()
+        flushed = threading.Event()
+        self._queue.put(flushed)
+        return flushed.wait(timeout)
+
+    def _run(self) -> None:
+        db.connect(reuse_if_open=True)
+        try:
+            self._drain()
+        finally:
+            db.close()
+
+    def _drain(self) -> None:
+        stopping = False
+        while not stopping:
+            batch: List[Any] = []
+            waiters: List[threading.Event] = []
+            item = self._queue.get()
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                if item is _STOP:
+                    stopping = True
+                    break
+                if isinstance(item, threading.Event):
+                    waiters.append(item)
+                    break
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+            if batch:
+                self._write(batch)
+            for waiter in waiters:
+                waiter.set()
+
+        batch = []
+        waiters = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if isinstance(item, threading.Event):
+                waiters.append(item)
+            elif item is not _STOP:
+                batch.append(item)
+        if batch:
+            self._write(batch)
+        for waiter in waiters:
+            waiter.set()
+
+    def _write(self, batch: List[Any]) -> None:
+        history = []
+        # Only the latest change of each poster and of each persisted entry matters
+        poster_files: Dict[str, PosterFileChange] = {}
+        persisted: Dict[Tuple[str, str], Optional[str]] = {}
+        for item in batch:
+            if isinstance(item, PosterFileChange):
+                poster_files[item.image_url] = item
+            elif isinstance(item, PersistenceBatch):
+                persisted.update(item.entries)
+            else:
+                history.append(item)
+        if history:
+            self._write_history(history)
+        if poster_files:
+            self._write_poster_files(list(poster_files.values()))
+        if persisted:
+            self._write_persisted(persisted)
+
+    def _write_history(self, batch: List[Tuple[Optional[Dict], Optional[Dict]]]) -> None:
+        users = {user_info['id']: user_info for user_info, row in batch if user_info is not None}
+        rows = [row for user_info, row in batch if row is not None]
+        try:
+            with db.atomic():
+                if users:
+                    BotUser.insert_many(list(users.values())) \
+                        .on_conflict(conflict_target=[BotUser.id], preserve=[BotUser.username, BotUser.first_name]) \
+                        .execute()
+                if rows:
+                    History.insert_many(rows).execute()
+            self.written += len(rows)
+            self.batches += 1
+            history_writer_logger.debug(f'OK. Inserted {len(rows)} history rows')
+        except pw.PeeweeException as e:
+            self.dropped += len(rows)
+            history_writer_logger.exception(f'Something went wrong during history batch insertion. Error: {e}')
+
+    @staticmethod
+    def _write_poster_files(changes: List[PosterFileChange]) -> None:
+        saved = [{'image_url': change.image_url, 'file_id': change.file_id, 'media_type': change.media_type}
+                 for change in changes if change.file_id is not None]
+        forgotten = [change.image_url for change in changes if change.file_id is None]
+        try:
+            with db.atomic():
+                if saved:
+                    PosterFile.insert_many(saved) \
+                        .on_conflict(conflict_target=[PosterFile.image_url],
+                                     preserve=[PosterFile.file_id, PosterFile.media_type]) \
+                        .execute()
+                if forgotten:
+                    PosterFile.delete().where(PosterFile.image_url.in_(forgotten)).execute()
+            history_writer_logger.debug(f'OK. Saved {len(saved)} and removed {len(forgotten)} poster file ids')
+        except pw.PeeweeException as e:
+            history_writer_logger.exception(f'Something went wrong during poster file ids writing. Error: {e}')
+
+    @staticmethod
+    def _write_persisted(entries: Dict[Tuple[str, str], Optional[str]]) -> None:
+        try:
+            PersistenceStore.write_batch(entries)
+        except pw.PeeweeException as e:
+            history_writer_logger.exception(f'Something went wrong during persisted entries writing. Error: {e}')
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Writer counters.
+        :return: Queue size and numbers of written rows, batches and dropped rows.
+        """
+        return {
+            'queued': self._queue.qsize(),
+            'written': self.written,
+            'batches': self.batches,
+            'dropped': self.dropped,
+        }
+
+
+class QueueHistoryWriter:
+    """
+    History writer of a worker process.
+    Forwards queued rows, poster file_id changes and persisted bot state to the HistoryWriter of the supervisor
+    process through a multiprocessing queue, so a single thread owns all database writes. Rows forwarded shortly
+    before a cold /history read may not be written yet when the read happens.
+    """
+
+    def __init__(self, forward_queue: Any) -> None:
+        self.forward_queue = forward_queue
+        self.forwarded = 0
+
+    def start(self) -> None:
+        pass
+
+    def stop(self, timeout: float = None) -> None:
+        pass
+
+    def submit(self, user_info: Optional[Dict], row: Optional[Dict]) -> None:
+        """
+        Forwards a history row and/or a BotUser upsert to the supervisor process.
+        :param user_info: The Telegram user fields to upsert into BotUser or None if they are already stored.
+        :param row: The History row or None.
+        :return: None
+        """
+        self.forward_queue.put((user_info, row))
+        self.forwarded += 1
+
+    def submit_poster_file(self, change: PosterFileChange) -> None:
+        """
+        Forwards a poster file_id change to the supervisor process.
+        :param change: The file_id to store or delete.
+        :return: None
+        """
+        self.forward_queue.put(change)
+        self.forwarded += 1
+
+    def submit_persistence(self, entries: Dict[Tuple[str, str], Optional[str]]) -> None:
+        """
+        Forwards a batch of persisted bot state entries to the supervisor process.
+        :param entries: Serialized values by (kind, key); None deletes the entry.
+        :return: None
+        """
+        self.forward_queue.put(PersistenceBatch(entries))
+        self.forwarded += 1
+
+    def flush(self, timeout: float = None) -> bool:
+        return True
+
+    def stats(self) -> Dict[str, int]:
+        return {'forwarded': self.forwarded}
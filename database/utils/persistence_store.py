@@ -0,0 +1,79 @@
+import logging
+from typing import Any, Dict, Optional, Tuple
+
+import peewee as pw
+
+from database.models import db, PersistedData
+
+persistence_store_logger = logging.getLogger(__name__)
+
+
+class PersistenceStore:
+    """
+    Key-value storage of serialized bot state (user data, chat data, conversation states).
+    Values are stored as JSON text; entries are only read and written one key or one batch at a time,
+    so the cost of an operation does not depend on the total number of stored users.
+    In a worker process the store is given the process's history writer: reads still go to the database,
+    while written batches are forwarded to the single writer thread of the supervisor process.
+    """
+
+    def __init__(self, writer: Optional[Any] = None) -> None:
+        self.writer = writer
+
+    @staticmethod
+    def load(kind: str, key: str) -> Optional[str]:
+        """
+        Reads one stored value.
+        :param kind: The entry kind, e.g. 'user_data'.
+        :param key: The entry key.
+        :return: The serialized value or None if it is not stored.
+        """
+        row = PersistedData.select(PersistedData.value) \
+            .where((PersistedData.kind == kind) & (PersistedData.key == key)) \
+            .tuples() \
+            .first()
+        return row[0] if row else None
+
+    @staticmethod
+    def load_kind(kind: str) -> Dict[str, str]:
+        """
+        Reads all stored values of one kind.
+        :param kind: The entry kind, e.g. 'conversation:high'.
+        :return: Serialized values by key.
+        """
+        return dict(PersistedData.select(PersistedData.key, PersistedData.value)
+                    .where(PersistedData.kind == kind)
+                    .tuples())
+
+    def write(self, batch: Dict[Tuple[str, str], Optional[str]]) -> None:
+        """
+        Writes a batch of changed entries, or queues it for the writer if the store has one.
+        :param batch: Serialized values by (kind, key); None deletes the entry.
+        :return: None
+        """
+        if self.writer is not None:
+            self.writer.submit_persistence(batch)
+        else:
+            self.write_batch(batch)
+
+    @staticmethod
+    def write_batch(batch: Dict[Tuple[str, str], Optional[str]]) -> None:
+        """
+        Writes a batch of changed entries in a single transaction.
+        :param batch: Serialized values by (kind, key); None deletes the entry.
+        :return: None
+        """
+        upserts = [{'kind': kind, 'key': key, 'value': value}
+                   for (kind, key), value in batch.items() if value is not None]
+        deletes = [(kind, key) for (kind, key), value in batch.items() if value is None]
+        with db.atomic():
+            for chunk in pw.chunked(upserts, 200):
+                PersistedData.insert_many(chunk) \
+                    .on_conflict(conflict_target=[PersistedData.kind, PersistedData.key],
+                                 preserve=[PersistedData.value]) \
+                    .execute()
+            for kind, key in deletes:
+                PersistedData.delete() \
+                    .where((PersistedData.kind == kind) & (PersistedData.key == key)) \
+                    .execute()
+        persistence_store_logger.debug(f'OK. Wrote {len(upserts)} and deleted {len(deletes)} persisted entries')
@@ -1,7 +1,10 @@
+import argparse
 import logging
 
 from database.db_core import init_db
+from settings import ApplicationSettings
 from telegram_API.loader import load_bot
+from telegram_API.supervisor import run_supervisor
 
 logging.basicConfig(
     format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO
@@ -10,7 +13,16 @@ logging.basicConfig(
 main_logger = logging.getLogger(__name__)
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Movie bot')
+    parser.add_argument('--workers', type=int, default=ApplicationSettings().workers,
+                        help='number of worker processes; more than one starts the supervisor mode')
+    args = parser.parse_args()
+
     main_logger.info('Initiating DB')
     init_db()
-    main_logger.info('Loading the bot')
-    load_bot()
+    if args.workers > 1:
+        main_logger.info(f'Loading the bot with {args.workers} workers')
+        run_supervisor(args.workers)
+    else:
+        main_logger.info('Loading the bot')
+        load_bot()
@@ -0,0 +1,240 @@
+import asyncio
+import functools
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# Наблюдение гистограммы: имя метрики, значения меток и значение
+Span = Tuple[str, Tuple[str, ...], float]
+
+_current_trace: ContextVar[Optional[List[Span]]] = ContextVar('metrics_trace', default=None)
+
+
+@contextmanager
+def trace() -> Iterator[List[Span]]:
+    """
+    Собирает все наблюдения гистограмм, сделанные в текущем контексте (в том числе в задачах и потоках,
+    запущенных из него через asyncio.create_task и asyncio.to_thread).
+    :return: список наблюдений, пополняемый до выхода из контекста
+    """
+    spans: List[Span] = []
+    token = _current_trace.set(spans)
+    try:
+        yield spans
+    finally:
+        _current_trace.reset(token)
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Tuple[str, str] = None) -> str:
+    pairs = list(zip(names, values))
+    if extra is not None:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    """
+    Базовый класс метрики с метками. Значения хранятся по кортежу значений меток.
+    Метрики потокобезопасны: их обновляют и обработчики в цикле событий, и потоки работы с базой данных.
+    """
+    type = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], object] = {}
+
+    def _key(self, labels: Dict[str, object]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f'Metric {self.name} expects labels {self.labelnames}, got {tuple(labels)}')
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+    def _samples(self) -> Iterator[Tuple[str, Tuple[str, ...], Optional[Tuple[str, str]], float]]:
+        with self._lock:
+            values = list(self._values.items())
+        for key, value in values:
+            yield '', key, None, value
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type}']
+        for suffix, key, extra, value in self._samples():
+            lines.append(f'{self.name}{suffix}{_format_labels(self.labelnames, key, extra)} {_format_value(value)}')
+        return lines
+
+
+class Counter(_Metric):
+    type = 'counter'
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    type = 'gauge'
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            # Количество наблюдений в каждом интервале, затем сумма и общее количество
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            if index < len(self.buckets):
+                state[index] += 1
+            state[-2] += value
+            state[-1] += 1
+        spans = _current_trace.get()
+        if spans is not None:
+            spans.append((self.name, key, value))
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def _samples(self) -> Iterator[Tuple[str, Tuple[str, ...], Optional[Tuple[str, str]], float]]:
+        with self._lock:
+            values = [(key, list(state)) for key, state in self._values.items()]
+        for key, state in values:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, state):
+                cumulative += bucket_count
+                yield '_bucket', key, ('le', _format_value(bound)), cumulative
+            yield '_bucket', key, ('le', '+Inf'), state[-1]
+            yield '_sum', key, None, state[-2]
+            yield '_count', key, None, state[-1]
+
+
+class Registry:
+    """
+    Реестр метрик. Метрики, значения которых известны только в момент запроса (размеры очередей,
+    количество диалогов), обновляются сборщиками, вызываемыми перед формированием ответа.
+    """
+
+    def __init__(self) -> None:
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def register_collector(self, collector: Callable[[], None]) -> None:
+        """
+        Регистрирует функцию, обновляющую метрики перед формированием ответа.
+        :param collector: функция без аргументов
+        :return: None
+        """
+        with self._lock:
+            if collector not in self._collectors:
+                self._collectors.append(collector)
+
+    def render(self) -> str:
+        """
+        Формирует текущие значения всех метрик в текстовом формате Prometheus.
+        :return: текст ответа
+        """
+        for collector in list(self._collectors):
+            collector()
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+
+def timed(histogram: Histogram, errors: Counter = None, **labels) -> Callable:
+    """
+    Декоратор, измеряющий длительность вызовов функции или корутины.
+    :param histogram: гистограмма длительности
+    :param errors: счётчик вызовов, завершившихся исключением
+    :param labels: значения меток; метка со значением None получает имя функции
+    :return: декоратор
+    """
+    def decorator(func: Callable) -> Callable:
+        values = {name: func.__name__ if value is None else value for name, value in labels.items()}
+
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                except Exception:
+                    if errors is not None:
+                        errors.inc(**values)
+                    raise
+                finally:
+                    histogram.observe(time.perf_counter() - started, **values)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            except Exception:
+                if errors is not None:
+                    errors.inc(**values)
+                raise
+            finally:
+                histogram.observe(time.perf_counter() - started, **values)
+        return wrapper
+
+    return decorator
@@ -1,18 +1,119 @@
 import os
+from pathlib import Path
+from typing import Literal, Optional
 
 from dotenv import load_dotenv, find_dotenv
 from pydantic import BaseSettings, SecretStr, StrictStr
 
-if not find_dotenv():
-    exit("Переменные окружения не загружены т.к отсутствует файл .env")
-else:
+REQUIRED_VARIABLES = ('SITE_API_KEY', 'SITE_API_HOST', 'TELEGRAM_BOT_API_KEY')
+
+if find_dotenv():
     load_dotenv()
+elif not all(os.getenv(variable) for variable in REQUIRED_VARIABLES):
+    exit("Переменные окружения не загружены т.к отсутствует файл .env")
+
+BASE_DIR = Path(__file__).resolve().parent
 
 
 class ApplicationSettings(BaseSettings):
     # Site Settings
     site_api_key: SecretStr = os.getenv("SITE_API_KEY", None)
     site_api_host: StrictStr = os.getenv("SITE_API_HOST", None)
+    site_api_url: Optional[str] = os.getenv("SITE_API_URL", None)
+
+    # Site API client settings
+    site_api_timeout: float = os.getenv("SITE_API_TIMEOUT", 10)
+    site_api_max_connections: int = os.getenv("SITE_API_MAX_CONNECTIONS", 20)
+    site_api_max_keepalive_connections: int = os.getenv("SITE_API_MAX_KEEPALIVE_CONNECTIONS", 10)
+    site_api_keepalive_expiry: float = os.getenv("SITE_API_KEEPALIVE_EXPIRY", 30)
+    site_api_http2: bool = os.getenv("SITE_API_HTTP2", True)
+    site_api_cache_ttl: float = os.getenv("SITE_API_CACHE_TTL", 300)
+    site_api_cache_max_entries: int = os.getenv("SITE_API_CACHE_MAX_ENTRIES", 256)
+    site_api_cache_stale_ttl: float = os.getenv("SITE_API_CACHE_STALE_TTL", 24 * 60 * 60)
+
+    # Site API resilience settings
+    site_api_max_attempts: int = os.getenv("SITE_API_MAX_ATTEMPTS", 3)
+    site_api_retry_base_delay: float = os.getenv("SITE_API_RETRY_BASE_DELAY", 0.2)
+    site_api_retry_max_delay: float = os.getenv("SITE_API_RETRY_MAX_DELAY", 2)
+    site_api_retry_deadline: float = os.getenv("SITE_API_RETRY_DEADLINE", 15)
+    site_api_hedge_delay: float = os.getenv("SITE_API_HEDGE_DELAY", 0)
+    site_api_breaker_threshold: int = os.getenv("SITE_API_BREAKER_THRESHOLD", 5)
+    site_api_breaker_recovery: float = os.getenv("SITE_API_BREAKER_RECOVERY", 30)
+
+    # Top-250 catalog settings
+    catalog_refresh_interval: float = os.getenv("CATALOG_REFRESH_INTERVAL", 6 * 60 * 60)
+
+    # Popular queries prefetch settings
+    prefetch_queries: int = os.getenv("PREFETCH_QUERIES", 20)
+    prefetch_interval: float = os.getenv("PREFETCH_INTERVAL", 4 * 60)
+    prefetch_rate: float = os.getenv("PREFETCH_RATE", 1)
+    prefetch_history_days: int = os.getenv("PREFETCH_HISTORY_DAYS", 7)
+
+    # Genre registry settings
+    genres_snapshot_path: str = os.getenv("GENRES_SNAPSHOT_PATH", str(BASE_DIR / 'genres_snapshot.json'))
+    genres_refresh_interval: float = os.getenv("GENRES_REFRESH_INTERVAL", 24 * 60 * 60)
 
     # Telegram Bot settings
     telegram_bot_api_key: SecretStr = os.getenv("TELEGRAM_BOT_API_KEY", None)
+    telegram_base_url: str = os.getenv("TELEGRAM_BASE_URL", 'https://api.telegram.org/bot')
+    movie_delivery_mode: Literal['album', 'single'] = os.getenv("MOVIE_DELIVERY_MODE", 'album')
+    pagination_max_results: int = os.getenv("PAGINATION_MAX_RESULTS", 50)
+    pagination_cursor_ttl: float = os.getenv("PAGINATION_CURSOR_TTL", 60 * 60)
+    pagination_max_cursors: int = os.getenv("PAGINATION_MAX_CURSORS", 10000)
+    poster_cache_enabled: bool = os.getenv("POSTER_CACHE_ENABLED", True)
+    poster_cache_dir: str = os.getenv("POSTER_CACHE_DIR", str(BASE_DIR / 'posters'))
+    poster_cache_max_bytes: int = os.getenv("POSTER_CACHE_MAX_BYTES", 256 * 1024 * 1024)
+    poster_max_side: int = os.getenv("POSTER_MAX_SIDE", 1280)
+    poster_jpeg_quality: int = os.getenv("POSTER_JPEG_QUALITY", 85)
+    poster_workers: int = os.getenv("POSTER_WORKERS", 2)
+    poster_download_timeout: float = os.getenv("POSTER_DOWNLOAD_TIMEOUT", 10)
+    inline_results_per_page: int = os.getenv("INLINE_RESULTS_PER_PAGE", 20)
+    inline_cache_time: int = os.getenv("INLINE_CACHE_TIME", 300)
+    stats_log_interval: float = os.getenv("STATS_LOG_INTERVAL", 5 * 60)
+    metrics_enabled: bool = os.getenv("METRICS_ENABLED", False)
+    metrics_listen: str = os.getenv("METRICS_LISTEN", '127.0.0.1')
+    metrics_port: int = os.getenv("METRICS_PORT", 9100)
+    profiler_enabled: bool = os.getenv("PROFILER_ENABLED", False)
+    profiler_sample_rate: float = os.getenv("PROFILER_SAMPLE_RATE", 0.01)
+    profiler_slow_threshold: float = os.getenv("PROFILER_SLOW_THRESHOLD", 1.0)
+    profiler_dir: str = os.getenv("PROFILER_DIR", str(BASE_DIR / 'profiles'))
+    profiler_max_files: int = os.getenv("PROFILER_MAX_FILES", 200)
+
+    # Update delivery settings
+    concurrent_updates: int = os.getenv("CONCURRENT_UPDATES", 64)
+    max_pending_updates: int = os.getenv("MAX_PENDING_UPDATES", 1024)
+    workers: int = os.getenv("WORKERS", 1)
+    telegram_mode: Literal['polling', 'webhook'] = os.getenv("TELEGRAM_MODE", 'polling')
+    webhook_listen: str = os.getenv("WEBHOOK_LISTEN", '127.0.0.1')
+    webhook_port: int = os.getenv("WEBHOOK_PORT", 8080)
+    webhook_path: str = os.getenv("WEBHOOK_PATH", '/telegram')
+    webhook_url: Optional[str] = os.getenv("WEBHOOK_URL", None)
+    webhook_secret_token: Optional[SecretStr] = os.getenv("WEBHOOK_SECRET_TOKEN", None)
+    webhook_max_connections: int = os.getenv("WEBHOOK_MAX_CONNECTIONS", 40)
+
+    # Outbound rate limit settings
+    rate_limit_global_rate: float = os.getenv("RATE_LIMIT_GLOBAL_RATE", 30)
+    rate_limit_global_burst: float = os.getenv("RATE_LIMIT_GLOBAL_BURST", 30)
+    rate_limit_chat_rate: float = os.getenv("RATE_LIMIT_CHAT_RATE", 1)
+    rate_limit_chat_burst: float = os.getenv("RATE_LIMIT_CHAT_BURST", 10)
+    rate_limit_group_rate: float = os.getenv("RATE_LIMIT_GROUP_RATE", 20 / 60)
+    rate_limit_group_burst: float = os.getenv("RATE_LIMIT_GROUP_BURST", 3)
+    rate_limit_max_retries: int = os.getenv("RATE_LIMIT_MAX_RETRIES", 3)
+
+    # Storage settings
+    db_path: str = os.getenv("DB_PATH", str(BASE_DIR / 'history.db'))
+    db_journal_mode: Literal['delete', 'truncate', 'persist', 'memory', 'wal', 'off'] = \
+        os.getenv("DB_JOURNAL_MODE", 'wal')
+    db_synchronous: Literal['off', 'normal', 'full', 'extra'] = os.getenv("DB_SYNCHRONOUS", 'normal')
+    db_cache_size: int = os.getenv("DB_CACHE_SIZE", -64000)
+    db_mmap_size: int = os.getenv("DB_MMAP_SIZE", 256 * 1024 * 1024)
+    db_busy_timeout: int = os.getenv("DB_BUSY_TIMEOUT", 5000)
+    history_batch_size: int = os.getenv("HISTORY_BATCH_SIZE", 100)
+    history_flush_interval: float = os.getenv("HISTORY_FLUSH_INTERVAL", 1.0)
+    known_users_cache_size: int = os.getenv("KNOWN_USERS_CACHE_SIZE", 10000)
+    history_cache_size: int = os.getenv("HISTORY_CACHE_SIZE", 10000)
+    history_keep_last: int = os.getenv("HISTORY_KEEP_LAST", 100)
+    history_max_age_days: int = os.getenv("HISTORY_MAX_AGE_DAYS", 365)
+    persistence_update_interval: float = os.getenv("PERSISTENCE_UPDATE_INTERVAL", 10)
+    persistence_cache_size: int = os.getenv("PERSISTENCE_CACHE_SIZE", 10000)
+    history_prune_interval: float = os.getenv("HISTORY_PRUNE_INTERVAL", 24 * 60 * 60)
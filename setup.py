@@ -6,6 +6,7 @@ setup(
     packages=['database', 'database.utils', 'site_API', 'site_API.utils', 'telegram_API', 'telegram_API.utils',
               'telegram_API.handlers', 'telegram_API.handlers.custom_handlers',
               'telegram_API.handlers.default_handlers', 'telegram_API.keyboards'],
+    package_data={'site_API': ['data/*.json']},
     url='',
     license='',
     author='Daurepchik',
@@ -16,7 +17,11 @@ setup(
         'peewee',
         'pydantic',
         'python-dotenv',
-        'python-telegram-bot',
-        'requests'
-    ]
+        'python-telegram-bot[job-queue]',
+        'httpx[http2]',
+        'Pillow'
+    ],
+    extras_require={
+        'fast-json': ['orjson'],
+    }
 )
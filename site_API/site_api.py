@@ -1,9 +1,14 @@
 from settings import ApplicationSettings
+from site_API.utils.cache import ResponseCache
+from site_API.utils.catalog import MovieCatalog
+from site_API.utils.genres import GenreRegistry
+from site_API.utils.prefetch import QueryPrefetcher
+from site_API.utils.resilience import CircuitBreaker, UpstreamGuard
 from site_API.utils.site_api_handler import SiteApiInterface
 
 app_settings = ApplicationSettings()
 
-URL = f'https://{app_settings.site_api_host}'
+URL = app_settings.site_api_url or f'https://{app_settings.site_api_host}'
 
 HEADERS = {
     'content-type': 'application/octet-stream',
@@ -11,4 +16,34 @@ HEADERS = {
     'X-RapidAPI-Host': app_settings.site_api_host
 }
 
-site_api_interface = SiteApiInterface(URL, HEADERS)
+
+def _create_site_api_interface() -> SiteApiInterface:
+    """
+    Создаёт интерфейс API сайта с настройками пула соединений, кэша и политики устойчивости из ApplicationSettings.
+    :return: интерфейс API сайта
+    """
+    return SiteApiInterface(URL, HEADERS,
+                            timeout=app_settings.site_api_timeout,
+                            max_connections=app_settings.site_api_max_connections,
+                            max_keepalive_connections=app_settings.site_api_max_keepalive_connections,
+                            keepalive_expiry=app_settings.site_api_keepalive_expiry,
+                            http2=app_settings.site_api_http2,
+                            cache=ResponseCache(ttl=app_settings.site_api_cache_ttl,
+                                                max_entries=app_settings.site_api_cache_max_entries,
+                                                stale_ttl=app_settings.site_api_cache_stale_ttl),
+                            guard=UpstreamGuard(max_attempts=app_settings.site_api_max_attempts,
+                                                base_delay=app_settings.site_api_retry_base_delay,
+                                                max_delay=app_settings.site_api_retry_max_delay,
+                                                deadline=app_settings.site_api_retry_deadline,
+                                                hedge_delay=app_settings.site_api_hedge_delay,
+                                                breaker=CircuitBreaker(app_settings.site_api_breaker_threshold,
+                                                                       app_settings.site_api_breaker_recovery)))
+
+
+site_api_interface = _create_site_api_interface()
+
+movie_catalog = MovieCatalog(site_api_interface)
+
+query_prefetcher = QueryPrefetcher(site_api_interface, movie_catalog, rate=app_settings.prefetch_rate)
+
+genre_registry = GenreRegistry(site_api_interface, app_settings.genres_snapshot_path)
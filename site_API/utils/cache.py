@@ -0,0 +1,175 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+cache_logger = logging.getLogger(__name__)
+
+
+class ResponseCache:
+    """
+    Кэш ответов API с ограниченным временем жизни (TTL), ограниченным количеством записей
+    и вытеснением давно не использованных записей (LRU).
+    Одновременные промахи по одному ключу объединяются в один запрос к API (single-flight).
+    Устаревшие записи хранятся ещё stale_ttl секунд и возвращаются, если повторный запрос к API не удался.
+    """
+
+    def __init__(self, ttl: float = 300, max_entries: int = 256,
+                 cacheable: Callable[[Any], bool] = lambda value: isinstance(value, dict),
+                 stale_ttl: float = 0) -> None:
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self.cacheable = cacheable
+        self._entries: 'OrderedDict[Hashable, Tuple[float, Any]]' = OrderedDict()
+        self._in_flight: Dict[Hashable, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.stale_served = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def make_key(url: str, params: Optional[Dict] = None) -> Tuple:
+        """
+        Строит нормализованный ключ кэша из адреса и параметров запроса.
+        Параметры со значением None отбрасываются, значения приводятся к строке, порядок не важен.
+        :param url: адрес запроса
+        :param params: параметры запроса
+        :return: ключ кэша
+        """
+        if not params:
+            return url, ()
+        return url, tuple(sorted((key, str(value)) for key, value in params.items() if value is not None))
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """
+        Возвращает значение из кэша, если оно есть и не устарело.
+        :param key: ключ кэша
+        :return: значение или None
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        now = time.monotonic()
+        if expires_at <= now:
+            if expires_at + self.stale_ttl <= now:
+                del self._entries[key]
+                self.expirations += 1
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def get_stale(self, key: Hashable) -> Optional[Any]:
+        """
+        Возвращает значение из кэша, даже если оно устарело, но не дольше stale_ttl секунд назад.
+        :param key: ключ кэша
+        :return: значение или None
+        """
+        entry = self._entries.get(key)
+        if entry is None or entry[0] + self.stale_ttl <= time.monotonic():
+            return None
+        return entry[1]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """
+        Сохраняет значение в кэше, вытесняя давно не использованные записи при переполнении.
+        :param key: ключ кэша
+        :param value: значение
+        :return: None
+        """
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    async def get_or_fetch(self, key: Hashable, fetch: Callable[[], Awaitable[Any]], refresh: bool = False) -> Any:
+        """
+        Возвращает значение из кэша или получает его вызовом fetch.
+        Если запрос по этому ключу уже выполняется, ожидает его результат вместо нового запроса.
+        Если выполнявший запрос вызов отменён, ожидающие его вызовы не отменяются, а повторяют запрос.
+        В кэш попадают только значения, для которых cacheable возвращает True. Если fetch вернул значение, не подлежащее
+        кэшированию, или завершился исключением, а в кэше есть устаревшая, но ещё допустимая запись, возвращается она.
+        :param key: ключ кэша
+        :param fetch: функция, выполняющая запрос к API
+        :param refresh: выполнить запрос, даже если в кэше есть актуальное значение
+        :return: значение
+        """
+        while True:
+            value = None if refresh else self.get(key)
+            if value is not None:
+                self.hits += 1
+                return value
+
+            in_flight = self._in_flight.get(key)
+            if in_flight is None:
+                break
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(in_flight)
+            except asyncio.CancelledError:
+                if not in_flight.cancelled():
+                    raise
+                # Отменён запрос, выполнявший fetch, а не ожидающий: запрос повторяется, и первый из ожидающих
+                # становится новым ведущим
+
+        if not refresh:
+            self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            value = await fetch()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            stale = self._serve_stale(key, e)
+            if stale is None:
+                future.set_exception(e)
+                future.exception()
+                raise
+            future.set_result(stale)
+            return stale
+        else:
+            if self.cacheable(value):
+                self.set(key, value)
+            else:
+                stale = self._serve_stale(key, value)
+                if stale is not None:
+                    value = stale
+            future.set_result(value)
+            return value
+        finally:
+            del self._in_flight[key]
+
+    def _serve_stale(self, key: Hashable, failure: Any) -> Optional[Any]:
+        stale = self.get_stale(key)
+        if stale is not None:
+            self.stale_served += 1
+            cache_logger.warning(f'Serving stale response for {key}. Upstream result: {failure!r}')
+        return stale
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Счётчики работы кэша.
+        :return: словарь со счётчиками попаданий, промахов, объединённых запросов и вытеснений
+        """
+        return {
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'coalesced': self.coalesced,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'stale_served': self.stale_served,
+        }
@@ -0,0 +1,157 @@
+import logging
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple, Union
+
+from site_API.utils.movies import Movie
+from site_API.utils.site_api_handler import SiteApiInterface
+from site_API.utils.title_search import TitleIndex
+
+catalog_logger = logging.getLogger(__name__)
+
+
+class MovieCatalog:
+    """
+    Локальный индекс списка Top-250.
+    Весь список загружается одним обновлением, хранится отсортированным по году выпуска
+    и дополняется списками позиций фильмов для каждого жанра и поисковым индексом названий. Запросы /low, /high
+    и /custom обслуживаются из памяти без обращения к API. Пока индекс не загружен, запросы передаются в API.
+    """
+
+    def __init__(self, site_api_interface: SiteApiInterface) -> None:
+        self.site_api_interface = site_api_interface
+        self.updated_at: Optional[datetime] = None
+        self._movies: List[Movie] = []
+        self._years: List[int] = []
+        self._genre_postings: Dict[str, Tuple[List[int], List[int]]] = {}
+        self._title_index = TitleIndex([])
+
+    @property
+    def is_loaded(self) -> bool:
+        """
+        Загружен ли индекс.
+        :return: True, если индекс загружен
+        """
+        return self.updated_at is not None
+
+    def __len__(self) -> int:
+        return len(self._movies)
+
+    async def refresh(self) -> bool:
+        """
+        Загружает полный список Top-250 из API и атомарно заменяет индекс.
+        При ошибке API прежний индекс сохраняется.
+        :return: True, если индекс обновлён
+        """
+        movies = await self.site_api_interface.get_top_rated_movies()
+        if not isinstance(movies, list) or not movies:
+            catalog_logger.error(f'Catalog refresh failed. API response: {movies}')
+            return False
+        self.load(movies)
+        catalog_logger.info(f'Catalog refreshed: {len(self._movies)} movies, {len(self._genre_postings)} genres')
+        return True
+
+    def load(self, movies: List[Movie]) -> None:
+        """
+        Строит индекс из записей о фильмах.
+        :param movies: список записей о фильмах из API
+        :return: None
+        """
+        entries = []
+        for movie in movies:
+            if not movie.year:
+                catalog_logger.debug(f'Skipping movie without release year: {movie.title}')
+                continue
+            entries.append(movie)
+        entries.sort(key=lambda movie: (movie.year, movie.month, movie.day))
+
+        years = []
+        genre_postings = {}
+        for i, movie in enumerate(entries):
+            years.append(movie.year)
+            for genre in movie.genres:
+                positions, genre_years = genre_postings.setdefault(genre, ([], []))
+                positions.append(i)
+                genre_years.append(movie.year)
+        title_index = TitleIndex(movies)
+
+        self._movies, self._years, self._genre_postings = entries, years, genre_postings
+        self._title_index = title_index
+        self.updated_at = datetime.now()
+
+    def _lookup(self, genre: Union[str, None], sort: str, limit: int,
+                start_year: int = None, end_year: int = None) -> List[Movie]:
+        """
+        Выбирает фильмы из индекса.
+        :param genre: жанр фильмов, None - все жанры
+        :param sort: 'incr' - по возрастанию года выпуска, 'decr' - по убыванию
+        :param limit: максимальное количество фильмов
+        :param start_year: начальный год выпуска фильмов
+        :param end_year: конечный год выпуска фильмов
+        :return: список фильмов
+        """
+        if genre is None:
+            positions, years = None, self._years
+        elif genre in self._genre_postings:
+            positions, years = self._genre_postings[genre]
+        else:
+            return []
+        low = bisect_left(years, int(start_year)) if start_year is not None else 0
+        high = bisect_right(years, int(end_year)) if end_year is not None else len(years)
+        limit = max(0, min(int(limit), high - low))
+        if sort == 'incr':
+            selected = range(low, low + limit)
+        else:
+            selected = range(high - 1, high - 1 - limit, -1)
+        if positions is None:
+            return [self._movies[i] for i in selected]
+        return [self._movies[positions[i]] for i in selected]
+
+    def search_titles(self, query: str) -> List[Movie]:
+        """
+        Ищет фильмы по названию в загруженном индексе без обращения к API.
+        :param query: текст запроса
+        :return: найденные фильмы в порядке ранжирования или пустой список, если индекс не загружен
+        """
+        return self._title_index.search(query)
+
+    async def get_movies_low(self, genre: Union[str, None], limit: int) -> Union[List[Movie], int, None]:
+        """
+        Получить список фильмов отсортированных по возрастанию года выпуска фильма.
+
+        :param genre: жанр фильмов
+        :param limit: максимальное количество фильмов
+
+        :return: список фильмов
+        """
+        if not self.is_loaded:
+            return await self.site_api_interface.get_movies_low(genre, limit)
+        return self._lookup(genre, 'incr', limit)
+
+    async def get_movies_high(self, genre: Union[str, None], limit: int) -> Union[List[Movie], int, None]:
+        """
+        Получить список фильмов отсортированных по убыванию года выпуска фильма.
+
+        :param genre: жанр фильмов
+        :param limit: максимальное количество фильмов
+
+        :return: список фильмов
+        """
+        if not self.is_loaded:
+            return await self.site_api_interface.get_movies_high(genre, limit)
+        return self._lookup(genre, 'decr', limit)
+
+    async def get_movies_custom(self, genre: Union[str, None], limit: int, start_year: int = None,
+                                end_year: int = None) -> Union[List[Movie], int, None]:
+        """
+        Получить список фильмов с пользовательскими параметрами диапазона года выпуска.
+
+        :param genre: жанр фильмов
+        :param limit: максимальное количество фильмов
+        :param start_year: начальный год выпуска фильмов
+        :param end_year: конечный год выпуска фильмов
+        :return: список фильмов
+        """
+        if not self.is_loaded:
+            return await self.site_api_interface.get_movies_custom(genre, limit, start_year, end_year)
+        return self._lookup(genre, 'decr', limit, start_year, end_year)
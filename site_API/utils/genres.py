@@ -0,0 +1,110 @@
+import asyncio
+import json
+import logging
+import os
+from pathlib import Path
+from typing import List, Optional, Tuple, Union
+
+from site_API.utils.site_api_handler import SiteApiInterface
+
+genres_logger = logging.getLogger(__name__)
+
+BUNDLED_SNAPSHOT_PATH = Path(__file__).resolve().parent.parent / 'data' / 'genres.json'
+
+
+def _read_snapshot(path: Union[str, Path]) -> Optional[List[str]]:
+    """
+    Читает снимок списка жанров с диска.
+    :param path: путь к файлу снимка
+    :return: список жанров или None, если снимок отсутствует или повреждён
+    """
+    try:
+        with open(path, encoding='utf-8') as snapshot:
+            genres = json.load(snapshot)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        genres_logger.warning(f'Genres snapshot {path} is unreadable. Error: {e}')
+        return None
+    if not isinstance(genres, list) or not all(isinstance(genre, str) for genre in genres):
+        genres_logger.warning(f'Genres snapshot {path} has unexpected format')
+        return None
+    return genres
+
+
+def _write_snapshot(path: Union[str, Path], genres: List[str]) -> None:
+    """
+    Атомарно записывает снимок списка жанров на диск.
+    :param path: путь к файлу снимка
+    :param genres: список жанров
+    :return: None
+    """
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as snapshot:
+        json.dump(genres, snapshot, ensure_ascii=False, indent=4)
+    os.replace(tmp_path, path)
+
+
+class GenreRegistry:
+    """
+    Общий реестр жанров фильмов для клавиатур и фильтров обработчиков.
+    При создании заполняется из снимка на диске, а при его отсутствии - из снимка, поставляемого с ботом,
+    поэтому запуск бота не зависит от доступности API. После запуска приложения реестр асинхронно
+    обновляется из API и сохраняет свежий снимок на диск.
+    """
+
+    def __init__(self, site_api_interface: SiteApiInterface, snapshot_path: Union[str, Path]) -> None:
+        self.site_api_interface = site_api_interface
+        self.snapshot_path = snapshot_path
+        self._genres: Tuple[str, ...] = ()
+        self._genres_set = frozenset()
+        genres = _read_snapshot(snapshot_path)
+        if genres is None:
+            genres_logger.info(f'Loading bundled genres snapshot {BUNDLED_SNAPSHOT_PATH}')
+            genres = _read_snapshot(BUNDLED_SNAPSHOT_PATH) or ['All']
+        self._set(genres)
+
+    def _set(self, genres: List[str]) -> None:
+        self._genres = tuple(genres)
+        self._genres_set = frozenset(genres)
+
+    def load(self, genres: List[str]) -> None:
+        """
+        Заменяет список жанров списком, полученным из другого источника (например, от процесса-супервизора).
+        :param genres: список жанров
+        :return: None
+        """
+        self._set(genres)
+
+    @property
+    def genres(self) -> Tuple[str, ...]:
+        """
+        Текущий список жанров.
+        :return: кортеж жанров
+        """
+        return self._genres
+
+    def __contains__(self, genre: object) -> bool:
+        return genre in self._genres_set
+
+    def __len__(self) -> int:
+        return len(self._genres)
+
+    async def refresh(self) -> bool:
+        """
+        Загружает список жанров из API и сохраняет его снимок на диск.
+        При ошибке API текущий список жанров сохраняется.
+        :return: True, если список жанров обновлён
+        """
+        genres = await self.site_api_interface.get_genres_list()
+        if not isinstance(genres, list):
+            genres_logger.error(f'Genres refresh failed. API response: {genres}')
+            return False
+        if tuple(genres) != self._genres:
+            self._set(genres)
+            genres_logger.info(f'Genres list updated: {len(genres)} genres')
+            try:
+                await asyncio.to_thread(_write_snapshot, self.snapshot_path, genres)
+            except OSError as e:
+                genres_logger.warning(f'Could not save genres snapshot {self.snapshot_path}. Error: {e}')
+        return True
@@ -0,0 +1,103 @@
+import json
+import sys
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Текст, который показывается пользователю вместо отсутствующих данных о фильме
+INFO_ABSENT = 'Info is absent'
+
+# Сокращённые названия месяцев, как их форматирует strftime('%b') в локали C
+MONTH_NAMES = ('', 'Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec')
+
+_EMPTY: Dict = {}
+
+
+def loads(content: bytes) -> Any:
+    """
+    Разбирает JSON из байтов ответа. Если установлен orjson, используется он, иначе - стандартный модуль json.
+    :param content: тело ответа
+    :return: разобранный объект
+    """
+    if orjson is not None:
+        return orjson.loads(content)
+    return json.loads(content)
+
+
+class Movie(NamedTuple):
+    """
+    Неизменяемая запись о фильме. Отсутствующие числовые поля равны 0, отсутствующие строки - None.
+    """
+    id: int
+    title: Optional[str]
+    position: int
+    year: int
+    month: int
+    day: int
+    genres: Tuple[str, ...]
+    image_url: Optional[str]
+    image_caption: Optional[str]
+
+    @property
+    def imdb_id(self) -> str:
+        return f'tt{self.id:07d}'
+
+    @property
+    def release_date(self) -> Optional[str]:
+        """
+        Дата выпуска фильма в формате '14 Oct 1994'.
+        :return: дата выпуска или None, если она известна не полностью
+        """
+        if not (self.year and self.day and 0 < self.month < len(MONTH_NAMES)):
+            return None
+        return f'{self.day:02d} {MONTH_NAMES[self.month]} {self.year}'
+
+
+def parse_movie(record: Dict) -> Movie:
+    """
+    Строит запись о фильме из записи ответа API за один проход, без исключений на отсутствующих полях.
+    :param record: запись о фильме из ответа API
+    :return: запись о фильме
+    """
+    image = record.get('primaryImage') or _EMPTY
+    release_date = record.get('releaseDate') or _EMPTY
+    imdb_id = (record.get('id') or '')[2:]
+    year = (record.get('releaseYear') or _EMPTY).get('year') or release_date.get('year')
+    # Названия жанров повторяются во всех записях, поэтому хранится по одной строке на жанр
+    genres = tuple([sys.intern(genre['text']) for genre in (record.get('genres') or _EMPTY).get('genres') or ()
+                    if genre and genre.get('text')])
+    return Movie(
+        int(imdb_id) if imdb_id.isdigit() else 0,
+        (record.get('titleText') or _EMPTY).get('text'),
+        int(record.get('position') or 0),
+        int(year or 0),
+        int(release_date.get('month') or 0),
+        int(release_date.get('day') or 0),
+        genres,
+        image.get('url'),
+        (image.get('caption') or _EMPTY).get('plainText'),
+    )
+
+
+def parse_movies(results: Optional[List[Dict]]) -> List[Movie]:
+    """
+    Строит записи о фильмах из списка results ответа API.
+    :param results: записи о фильмах из ответа API
+    :return: список записей о фильмах
+    """
+    return [parse_movie(record) for record in results or ()]
+
+
+def parse_movies_response(content: bytes) -> Dict:
+    """
+    Разбирает тело ответа API со списком фильмов. Записи о фильмах заменяются на Movie сразу при разборе,
+    поэтому в кэше ответов хранятся уже готовые записи.
+    :param content: тело ответа
+    :return: словарь ответа, в котором results - список записей о фильмах
+    """
+    response = loads(content)
+    response['results'] = parse_movies(response.get('results'))
+    return response
@@ -0,0 +1,86 @@
+import asyncio
+import logging
+from typing import Dict, Iterable, Optional, Tuple
+
+from site_API.utils.catalog import MovieCatalog
+from site_API.utils.resilience import CircuitBreaker
+from site_API.utils.site_api_handler import SiteApiInterface
+
+prefetch_logger = logging.getLogger(__name__)
+
+# Сортировка запроса к API для каждой команды бота
+COMMAND_SORTS = {'high': 'decr', 'low': 'incr'}
+
+
+class QueryPrefetcher:
+    """
+    Прогрев кэша API популярными запросами.
+    Для каждой пары (команда, жанр) ответ API заново запрашивается и сохраняется в кэше до истечения срока
+    его жизни, поэтому популярные запросы пользователей не попадают на пустой кэш. Запросы прогрева
+    выполняются последовательно не чаще rate в секунду и не выполняются, пока разомкнут выключатель API,
+    чтобы прогрев не расходовал квоту API и не нагружал деградировавший API.
+    Пока загружен локальный индекс Top-250, запросы обслуживаются из него, и прогрев не выполняется.
+    """
+
+    def __init__(self, site_api_interface: SiteApiInterface, catalog: MovieCatalog = None, *,
+                 rate: float = 1) -> None:
+        self.site_api_interface = site_api_interface
+        self.catalog = catalog
+        self.rate = rate
+        self.rounds = 0
+        self.warmed = 0
+        self.failed = 0
+        self.skipped = 0
+        self._running = False
+
+    def _breaker_open(self) -> bool:
+        guard = self.site_api_interface.guard
+        return guard is not None and guard.breaker.state == CircuitBreaker.OPEN
+
+    async def warm(self, queries: Iterable[Tuple[str, Optional[str]]]) -> int:
+        """
+        Обновляет в кэше ответы API на запросы. Одновременно выполняется только один прогрев.
+        :param queries: пары (команда, жанр); жанр None - все жанры
+        :return: количество обновлённых записей кэша
+        """
+        if self._running:
+            prefetch_logger.info('Previous prefetch round is still running, skipping')
+            self.skipped += 1
+            return 0
+        self._running = True
+        self.rounds += 1
+        warmed = sent = 0
+        try:
+            for command, genre in queries:
+                sort = COMMAND_SORTS.get(command)
+                if sort is None:
+                    continue
+                if sent and self.rate > 0:
+                    await asyncio.sleep(1 / self.rate)
+                if self.catalog is not None and self.catalog.is_loaded:
+                    prefetch_logger.info('Movie catalog is loaded, prefetch round stopped')
+                    break
+                if self._breaker_open():
+                    prefetch_logger.warning('Site API circuit breaker is open, prefetch round stopped')
+                    break
+                sent += 1
+                if await self.site_api_interface.prefetch_movies(genre, sort):
+                    warmed += 1
+                else:
+                    self.failed += 1
+        finally:
+            self.warmed += warmed
+            self._running = False
+        return warmed
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Счётчики прогрева кэша.
+        :return: словарь с количеством раундов, обновлённых и неудавшихся запросов
+        """
+        return {
+            'rounds': self.rounds,
+            'warmed': self.warmed,
+            'failed': self.failed,
+            'skipped': self.skipped,
+        }
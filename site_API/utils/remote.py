@@ -0,0 +1,87 @@
+import asyncio
+import itertools
+import logging
+import os
+import threading
+from typing import Any, Dict, Hashable, Optional
+
+remote_logger = logging.getLogger(__name__)
+
+# Методы SiteApiInterface, которые рабочий процесс выполняет через супервизора
+REMOTE_METHODS = frozenset({'get_movies_low', 'get_movies_high', 'get_movies_custom'})
+
+
+class RemoteSiteApi:
+    """
+    Клиент API сайта рабочего процесса.
+    Запросы передаются супервизору через общую очередь запросов, супервизор выполняет их своим SiteApiInterface
+    с общим кэшем ответов, объединением одинаковых запросов и автоматическим выключателем и возвращает ответ
+    в очередь ответов рабочего процесса. Поэтому количество запросов к API не растёт с количеством рабочих
+    процессов. Ответы читает отдельный поток, который запускается методом start.
+    """
+
+    def __init__(self, worker: int, request_queue: Any, reply_queue: Any, timeout: float = 30) -> None:
+        self.worker = worker
+        self.request_queue = request_queue
+        self.reply_queue = reply_queue
+        self.timeout = timeout
+        self._ids = itertools.count()
+        self._futures: Dict[Hashable, asyncio.Future] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.requests = 0
+        self.timeouts = 0
+
+    def start(self) -> None:
+        """
+        Запускает поток чтения ответов супервизора. Повторный вызов ничего не делает.
+        :return: None
+        """
+        if self._loop is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        threading.Thread(target=self._read_replies, name='site-api-replies', daemon=True).start()
+
+    def _read_replies(self) -> None:
+        while True:
+            request_id, result = self.reply_queue.get()
+            try:
+                self._loop.call_soon_threadsafe(self._resolve, request_id, result)
+            except RuntimeError:
+                # Цикл событий рабочего процесса уже закрыт
+                return
+
+    def _resolve(self, request_id: Hashable, result: Any) -> None:
+        future = self._futures.get(request_id)
+        if future is not None and not future.done():
+            future.set_result(result)
+
+    async def call(self, method: str, *args: Any) -> Any:
+        """
+        Выполняет метод SiteApiInterface в супервизоре.
+        :param method: название метода из REMOTE_METHODS
+        :param args: аргументы метода
+        :return: ответ метода или None, если супервизор не ответил за timeout секунд
+        """
+        self.start()
+        # Номер процесса в идентификаторе не даёт перезапущенному рабочему процессу принять ответ,
+        # предназначенный его предшественнику
+        request_id = (os.getpid(), next(self._ids))
+        future = self._loop.create_future()
+        self._futures[request_id] = future
+        self.requests += 1
+        try:
+            self.request_queue.put((self.worker, request_id, method, args))
+            return await asyncio.wait_for(future, self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            remote_logger.error(f'Supervisor did not answer {method}{args} in {self.timeout} seconds')
+            return None
+        finally:
+            del self._futures[request_id]
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Счётчики запросов к супервизору.
+        :return: словарь с количеством запросов, ожидающих ответа запросов и запросов без ответа
+        """
+        return {'requests': self.requests, 'pending': len(self._futures), 'timeouts': self.timeouts}
@@ -0,0 +1,187 @@
+import asyncio
+import logging
+import random
+import time
+from typing import Any, Awaitable, Callable, Dict, Union
+
+import httpx
+
+resilience_logger = logging.getLogger(__name__)
+
+Attempt = Callable[[], Awaitable[Union[Dict, int, None]]]
+
+
+def is_failure(response: Union[Dict, int, None]) -> bool:
+    """
+    Является ли результат запроса отказом API, после которого имеет смысл повторить запрос:
+    сетевая ошибка (None), превышение лимита запросов (429) или ошибка сервера (5xx).
+    :param response: результат запроса - словарь из JSON ответа, статус код или None
+    :return: True, если запрос не удался по вине API
+    """
+    if response is None:
+        return True
+    if isinstance(response, int):
+        return response == httpx.codes.TOO_MANY_REQUESTS or response >= httpx.codes.INTERNAL_SERVER_ERROR
+    return False
+
+
+class CircuitBreaker:
+    """
+    Автоматический выключатель запросов к API.
+    После failure_threshold отказов подряд выключатель размыкается, и запросы отклоняются без обращения к API.
+    Через recovery_timeout секунд пропускается один пробный запрос: успех замыкает выключатель,
+    отказ размыкает его снова.
+    """
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, failure_threshold: int = 5, recovery_timeout: float = 30) -> None:
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened = 0
+        self.rejected = 0
+        self._opened_at = 0.0
+        self._probe_started = 0.0
+        self._probe_in_flight = False
+
+    def allow(self) -> bool:
+        """
+        Можно ли выполнить запрос к API.
+        :return: True, если запрос разрешён
+        """
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.recovery_timeout:
+            self.state = self.HALF_OPEN
+            self._probe_in_flight = False
+        # Пробный запрос, не завершившийся за recovery_timeout (например, отменённый), не блокирует следующий
+        if self.state == self.HALF_OPEN and (not self._probe_in_flight
+                                             or time.monotonic() - self._probe_started >= self.recovery_timeout):
+            self._probe_in_flight = True
+            self._probe_started = time.monotonic()
+            return True
+        self.rejected += 1
+        return False
+
+    def record_success(self) -> None:
+        if self.state != self.CLOSED:
+            resilience_logger.info('Site API recovered, circuit breaker closed')
+        self.state = self.CLOSED
+        self.failures = 0
+        self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == self.HALF_OPEN or (self.state == self.CLOSED and self.failures >= self.failure_threshold):
+            resilience_logger.warning(f'Site API is failing ({self.failures} failures in a row), '
+                                      f'circuit breaker opened for {self.recovery_timeout}s')
+            self.state = self.OPEN
+            self.opened += 1
+            self._opened_at = time.monotonic()
+            self._probe_in_flight = False
+
+
+class UpstreamGuard:
+    """
+    Политика устойчивости запросов к API сайта.
+    Отказавшие запросы повторяются не больше max_attempts раз с экспоненциальной задержкой со случайным
+    разбросом (full jitter), пока не исчерпан общий бюджет времени deadline. Запросы проходят через
+    автоматический выключатель, поэтому при деградации API они сразу завершаются отказом.
+    Если hedge_delay больше нуля, то при отсутствии ответа за hedge_delay секунд отправляется
+    дублирующий запрос и используется первый успешный ответ.
+    """
+
+    def __init__(self, *, max_attempts: int = 3, base_delay: float = 0.2, max_delay: float = 2,
+                 deadline: float = 15, hedge_delay: float = 0, breaker: CircuitBreaker = None) -> None:
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self.hedge_delay = hedge_delay
+        self.breaker = breaker or CircuitBreaker()
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.failures = 0
+
+    def backoff(self, attempt: int) -> float:
+        """
+        Задержка перед повтором запроса.
+        :param attempt: номер неудавшейся попытки, начиная с 0
+        :return: задержка в секундах
+        """
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    async def call(self, endpoint: str, attempt: Attempt) -> Union[Dict, int, None]:
+        """
+        Выполняет запрос к API с повторами, выключателем и дублирующими запросами.
+        :param endpoint: адрес запроса, используется в логах
+        :param attempt: функция, выполняющая одну попытку запроса
+        :return: результат последней попытки; None, если выключатель отклонил запрос
+        """
+        started = time.monotonic()
+        response = None
+        for attempt_number in range(self.max_attempts):
+            if not self.breaker.allow():
+                resilience_logger.warning(f'Circuit breaker is open, request to {endpoint} rejected')
+                break
+            response = await (self._hedged(attempt) if self.hedge_delay > 0 else attempt())
+            if not is_failure(response):
+                self.breaker.record_success()
+                return response
+            self.breaker.record_failure()
+            if attempt_number + 1 == self.max_attempts:
+                break
+            delay = self.backoff(attempt_number)
+            if time.monotonic() - started + delay >= self.deadline:
+                break
+            self.retries += 1
+            resilience_logger.info(f'Request to {endpoint} failed ({response}), retrying in {delay:.2f}s')
+            await asyncio.sleep(delay)
+        self.failures += 1
+        return response
+
+    async def _hedged(self, attempt: Attempt) -> Union[Dict, int, None]:
+        """
+        Выполняет попытку запроса, дублируя её, если ответ не получен за hedge_delay секунд.
+        :param attempt: функция, выполняющая одну попытку запроса
+        :return: первый успешный результат или результат последнего завершившегося запроса
+        """
+        first = asyncio.ensure_future(attempt())
+        pending = {first}
+        try:
+            done, pending = await asyncio.wait(pending, timeout=self.hedge_delay)
+            if done:
+                return first.result()
+            self.hedges += 1
+            hedge = asyncio.ensure_future(attempt())
+            pending.add(hedge)
+            response = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    response = task.result()
+                    if not is_failure(response):
+                        if task is hedge:
+                            self.hedge_wins += 1
+                        return response
+            return response
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Счётчики работы политики устойчивости.
+        :return: словарь с состоянием выключателя и счётчиками повторов, дублирующих запросов и отказов
+        """
+        return {
+            'breaker_open': int(self.breaker.state != CircuitBreaker.CLOSED),
+            'breaker_opened': self.breaker.opened,
+            'breaker_rejected': self.breaker.rejected,
+            'retries': self.retries,
+            'hedges': self.hedges,
+            'hedge_wins': self.hedge_wins,
+            'failures': self.failures,
+        }
@@ -1,73 +1,113 @@
 import logging
-from datetime import datetime
-from typing import Dict, Union, List
+import time
+from typing import Any, Callable, Dict, Union, List, Optional
 
-import requests
+import httpx
+
+from metrics import REGISTRY
+from site_API.utils.cache import ResponseCache
+from site_API.utils.movies import Movie, loads, parse_movies_response
+from site_API.utils.remote import RemoteSiteApi
+from site_API.utils.resilience import UpstreamGuard
 
 site_api_handler_logger = logging.getLogger(__name__)
 
+# Максимальное количество фильмов в одном ответе API. Фильмы запрашиваются у API с этим лимитом и обрезаются
+# до запрошенного количества, поэтому в кэше хранится одна запись на жанр и сортировку.
+MOVIES_LIMIT = 50
+
+SITE_API_REQUEST_DURATION = REGISTRY.histogram('site_api_request_duration_seconds',
+                                               'Duration of site API requests', ('endpoint', 'status'))
+
 
-def _get_response(url: str, headers: Dict,
-                  *, params: Dict = None, timeout: int = 10) -> Union[Dict, int]:
+async def _get_response(client: httpx.AsyncClient, url: str, *, params: Dict = None, timeout: float = None,
+                        cache: ResponseCache = None, guard: UpstreamGuard = None, refresh: bool = False,
+                        parse: Callable[[bytes], Any] = loads) -> Union[Dict, int, None]:
     """
-    Отправляет HTTP-запрос и возвращает ответ в формате JSON, если ответ успешный (статус код 200),
-    в противном случае возвращает статус код.
+    Асинхронно отправляет HTTP-запрос через общий пул соединений и возвращает разобранный ответ в формате JSON,
+    если ответ успешный (статус код 200), в противном случае возвращает статус код (None при сетевой ошибке).
 
-    :param method: HTTP метод запроса (GET, POST, PUT, DELETE и т.д.).
-    :param url: URL-адрес, по которому будет отправлен запрос.
-    :param headers: Заголовки запроса в виде словаря.
+    :param client: Общий асинхронный HTTP-клиент с пулом соединений.
+    :param url: URL-адрес (относительно базового адреса клиента), по которому будет отправлен запрос.
     :param params: Дополнительные параметры запроса, передаваемые в URL-строке.
-            По умолчанию None.
+            Параметры со значением None не передаются. По умолчанию None.
     :param timeout: Время ожидания ответа от сервера в секундах.
-            По умолчанию 10.
+            По умолчанию используется таймаут клиента.
+    :param cache: Кэш ответов. Если передан, успешные ответы кэшируются по нормализованным параметрам запроса,
+            а одновременные одинаковые запросы объединяются в один. По умолчанию None.
+    :param guard: Политика устойчивости. Если передана, отказавшие запросы повторяются через автоматический
+            выключатель. По умолчанию None - одна попытка.
+    :param refresh: Запросить ответ у API, даже если в кэше есть актуальная запись, и обновить её.
+            По умолчанию False.
+    :param parse: Функция разбора тела ответа. По умолчанию JSON разбирается в словарь.
     :return: Возвращает словарь, полученный из ответа в формате JSON, если ответ успешный
             (статус код 200), в противном случае возвращает статус код.
     """
+    if params is not None:
+        params = {key: value for key, value in params.items() if value is not None}
+    if cache is not None:
+        return await cache.get_or_fetch(cache.make_key(url, params),
+                                        lambda: _get_response(client, url, params=params, timeout=timeout,
+                                                              guard=guard, parse=parse),
+                                        refresh=refresh)
+    if guard is not None:
+        return await guard.call(url, lambda: _get_response(client, url, params=params, timeout=timeout,
+                                                           parse=parse))
+    request_timeout = timeout if timeout is not None else client.timeout
+    started = time.perf_counter()
+    status = 'error'
     try:
         site_api_handler_logger.debug(f'Trying to access {url}')
-        response = requests.get(url, headers=headers, params=params, timeout=timeout)
-        status_code = response.status_code
+        response = await client.get(url, params=params, timeout=request_timeout)
+        status_code = status = response.status_code
 
-        if status_code == requests.codes.ok:
+        if status_code == httpx.codes.OK:
             site_api_handler_logger.debug(f'Request succeed')
-            return response.json()
+            return parse(response.content)
         else:
             site_api_handler_logger.info(f'Request failed')
             site_api_handler_logger.error(f'Request failed with status code: {status_code}')
             return status_code
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         site_api_handler_logger.exception(e)
+    finally:
+        SITE_API_REQUEST_DURATION.observe(time.perf_counter() - started, endpoint=url, status=status)
 
 
-def _get_genres_list(url: str, headers: Dict) -> Union[Dict, int]:
+async def _get_genres_list(client: httpx.AsyncClient, *, cache: ResponseCache = None,
+                           guard: UpstreamGuard = None) -> Union[Dict, int, None]:
     """
-    Получает список жанров фильмов с API сервера по заданному URL.
-    :param url: URL-адрес сервера, на котором расположено API.
-    :param headers: Заголовки запроса в виде словаря.
+    Получает список жанров фильмов с API сервера.
+    :param client: Общий асинхронный HTTP-клиент с пулом соединений.
+    :param cache: Кэш ответов. По умолчанию None.
+    :param guard: Политика устойчивости. По умолчанию None.
     :return: Возвращает словарь, содержащий список жанров, если ответ успешный (статус код 200),
             в противном случае возвращает статус код.
     """
-    url = f'{url}/titles/utils/genres'
-    response = _get_response(url, headers)
+    url = '/titles/utils/genres'
+    response = await _get_response(client, url, cache=cache, guard=guard)
     return response
 
 
-def _get_movies(url: str, headers: Dict, genre: Union[str, None], *, sort: str = 'decr', limit: int = 10,
-                start_year: int = None,
-                end_year: int = None) -> Union[Dict, int]:
+async def _get_movies(client: httpx.AsyncClient, genre: Union[str, None], *, sort: str = 'decr', limit: int = 10,
+                      start_year: int = None, end_year: int = None,
+                      cache: ResponseCache = None, guard: UpstreamGuard = None,
+                      refresh: bool = False) -> Union[Dict, int, None]:
     """
     Получает список фильмов с API сервера по заданным параметрам.
-    :param url: URL-адрес сервера, на котором расположено API.
-    :param headers: Заголовки запроса в виде словаря.
+    :param client: Общий асинхронный HTTP-клиент с пулом соединений.
     :param genre: Жанр фильмов, по которому будет выполнен поиск.
     :param sort: Способ сортировки результата. По умолчанию 'decr' - по убыванию года выпуска.
     :param limit: Максимальное количество результатов поиска. По умолчанию 10.
     :param start_year: Год выпуска фильма, начиная с которого нужно выполнить поиск. По умолчанию None.
     :param end_year: Год выпуска фильма, заканчивая которым нужно выполнить поиск. По умолчанию None.
-    :return: Возвращает словарь, содержащий список фильмов, если ответ успешный (статус код 200),
+    :param cache: Кэш ответов. По умолчанию None.
+    :param guard: Политика устойчивости. По умолчанию None.
+    :param refresh: Обновить запись кэша, даже если она актуальна. По умолчанию False.
+    :return: Возвращает словарь, содержащий список фильмов (Movie), если ответ успешный (статус код 200),
         в противном случае возвращает статус код.
     """
-    url = f'{url}/titles'
+    url = '/titles'
     querystring = {
         'titleType': 'movie',
         'genre': genre,
@@ -77,68 +117,138 @@ def _get_movies(url: str, headers: Dict, genre: Union[str, None], *, sort: str =
         'endYear': end_year,
         'startYear': start_year
     }
-    response = _get_response(url, headers, params=querystring)
+    response = await _get_response(client, url, params=querystring, cache=cache, guard=guard, refresh=refresh,
+                                   parse=parse_movies_response)
     return response
 
 
-def _get_movies_info(response: Dict) -> List[Dict[str, str]]:
+async def _get_top_rated_page(client: httpx.AsyncClient, page: int, *, limit: int = 50,
+                              guard: UpstreamGuard = None) -> Union[Dict, int, None]:
     """
-    Обрабатывает ответ от сервера, полученный из функции _get_movies,
-    и возвращает список словарей с отфильтрованными данными.
-    :param response: Ответ от сервера с информацией о фильмах в виде словаря.
-    :return: Список словарей с данными о фильмах.
+    Получает одну страницу полного списка Top-250 с расширенной информацией о фильмах
+    (жанры, даты выпуска, изображения и позиции).
+    :param client: Общий асинхронный HTTP-клиент с пулом соединений.
+    :param page: Номер страницы, начиная с 1.
+    :param limit: Количество фильмов на странице. Максимум API - 50.
+    :param guard: Политика устойчивости. По умолчанию None.
+    :return: Возвращает словарь, содержащий страницу фильмов (Movie), если ответ успешный (статус код 200),
+        в противном случае возвращает статус код.
     """
-    results = []
-    if response['results']:
-        for movie in response['results']:
-            movie_info = {}
-            try:
-                movie_info['image_caption'] = movie['primaryImage']['caption']['plainText']
-            except (KeyError, TypeError):
-                movie_info['image_caption'] = 'Info is absent'
-            try:
-                movie_info['image_url'] = movie['primaryImage']['url']
-            except (KeyError, TypeError):
-                movie_info['image_url'] = 'Info is absent'
-            try:
-                movie_info['release_date'] = datetime(year=movie['releaseDate']['year'],
-                                                      month=movie['releaseDate']['month'],
-                                                      day=movie['releaseDate']['day']).strftime('%d %b %Y')
-            except (KeyError, TypeError):
-                movie_info['release_date'] = 'Info is absent'
-            try:
-                movie_info['title'] = movie['titleText']['text']
-            except (KeyError, TypeError):
-                movie_info['title'] = 'Info is absent'
-            try:
-                movie_info['position'] = movie['position']
-            except (KeyError, TypeError):
-                movie_info['position'] = 'Info is absent'
-            results.append(movie_info)
-    return results
+    url = '/titles'
+    querystring = {
+        'titleType': 'movie',
+        'list': 'top_rated_250',
+        'info': 'base_info',
+        'sort': 'year.incr',
+        'limit': limit,
+        'page': page
+    }
+    response = await _get_response(client, url, params=querystring, guard=guard, parse=parse_movies_response)
+    return response
 
 
 class SiteApiInterface:
-    """Класс для взаимодействия с API сайта."""
+    """
+    Класс для асинхронного взаимодействия с API сайта.
+    Все запросы выполняются через общий httpx.AsyncClient с keep-alive, HTTP/2 и ограниченным пулом соединений.
+    Клиент создаётся методом start и закрывается методом close (или используется как асинхронный контекстный
+    менеджер), поэтому жизненный цикл интерфейса привязывается к жизненному циклу приложения бота.
+    Отказавшие запросы повторяются по политике устойчивости guard, а при недоступности API ответы
+    берутся из устаревших записей кэша.
+    В рабочем процессе запросы фильмов передаются супервизору через remote, поэтому кэш и выключатель общие.
+    """
 
-    def __init__(self, url: str, headers: Dict) -> None:
+    def __init__(self, url: str, headers: Dict, *, timeout: float = 10, max_connections: int = 20,
+                 max_keepalive_connections: int = 10, keepalive_expiry: float = 30, http2: bool = True,
+                 cache: ResponseCache = None, guard: UpstreamGuard = None) -> None:
         self.url = url
         self.headers = headers
+        self.timeout = httpx.Timeout(timeout)
+        self.limits = httpx.Limits(max_connections=max_connections,
+                                   max_keepalive_connections=max_keepalive_connections,
+                                   keepalive_expiry=keepalive_expiry)
+        self.http2 = http2
+        self.cache = cache
+        self.guard = guard
+        self.remote: Optional[RemoteSiteApi] = None
+        self._client: Optional[httpx.AsyncClient] = None
+
+    async def __aenter__(self) -> 'SiteApiInterface':
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """
+        Общий HTTP-клиент интерфейса.
+        :return: асинхронный HTTP-клиент
+        """
+        if self._client is None:
+            raise RuntimeError('SiteApiInterface is not started. Call "await start()" first')
+        return self._client
 
-    def get_genres_list(self) -> Union[List, int]:
+    async def start(self) -> None:
+        """
+        Создаёт общий HTTP-клиент с пулом соединений. Повторный вызов ничего не делает.
+        :return: None
+        """
+        if self._client is not None:
+            return
+        site_api_handler_logger.info(f'Starting site API client (http2={self.http2}, limits={self.limits})')
+        self._client = httpx.AsyncClient(base_url=self.url, headers=self.headers, timeout=self.timeout,
+                                         limits=self.limits, http2=self.http2)
+
+    async def close(self) -> None:
+        """
+        Закрывает общий HTTP-клиент и все соединения пула.
+        :return: None
+        """
+        if self._client is None:
+            return
+        site_api_handler_logger.info('Closing site API client')
+        await self._client.aclose()
+        self._client = None
+
+    async def get_genres_list(self) -> Union[List, int, None]:
         """
         Получить список жанров фильмов.
         :return: список жанров
         """
         site_api_handler_logger.info('Getting genres list')
-        response = _get_genres_list(self.url, self.headers)
+        response = await _get_genres_list(self.client, cache=self.cache, guard=self.guard)
         if isinstance(response, dict):
             results = ['All'] + response['results'][1:]
             site_api_handler_logger.debug('Genres list got successfully')
             return results
         return response
 
-    def get_movies_low(self, genre: Union[str, None], limit: int) -> Union[List, int]:
+    async def get_top_rated_movies(self, *, page_limit: int = 50,
+                                   max_pages: int = 10) -> Union[List[Movie], int, None]:
+        """
+        Получить полный список Top-250 с жанрами, датами выпуска, изображениями и позициями.
+        Страницы запрашиваются последовательно, пока API сообщает о наличии следующей страницы.
+
+        :param page_limit: количество фильмов на одной странице
+        :param max_pages: максимальное количество запрашиваемых страниц
+
+        :return: список записей о фильмах
+        """
+        site_api_handler_logger.info('Getting top rated movies')
+        movies = []
+        for page in range(1, max_pages + 1):
+            response = await _get_top_rated_page(self.client, page, limit=page_limit, guard=self.guard)
+            if not isinstance(response, dict):
+                return response
+            movies.extend(response['results'])
+            if not response['results'] or not response.get('next'):
+                break
+        site_api_handler_logger.debug(f'Top rated movies got successfully: {len(movies)}')
+        return movies
+
+    async def get_movies_low(self, genre: Union[str, None], limit: int) -> Union[List[Movie], int, None]:
         """
         Получить список фильмов отсортированных по возрастанию года выпуска фильма.
 
@@ -147,14 +257,17 @@ class SiteApiInterface:
 
         :return: список фильмов
         """
-        response = _get_movies(self.url, self.headers, genre, sort='incr', limit=limit)
+        if self.remote is not None:
+            return await self.remote.call('get_movies_low', genre, limit)
+        response = await _get_movies(self.client, genre, sort='incr', limit=MOVIES_LIMIT, cache=self.cache,
+                                     guard=self.guard)
         if isinstance(response, dict):
-            results = _get_movies_info(response)
+            results = response['results'][:int(limit)]
             site_api_handler_logger.debug('Movies low got successfully')
             return results
         return response
 
-    def get_movies_high(self, genre: Union[str, None], limit: int) -> Union[List, int]:
+    async def get_movies_high(self, genre: Union[str, None], limit: int) -> Union[List[Movie], int, None]:
         """
         Получить список фильмов отсортированных по убыванию года выпуска фильма.
 
@@ -163,15 +276,17 @@ class SiteApiInterface:
 
         :return: список фильмов
         """
-        response = _get_movies(self.url, self.headers, genre, limit=limit)
+        if self.remote is not None:
+            return await self.remote.call('get_movies_high', genre, limit)
+        response = await _get_movies(self.client, genre, limit=MOVIES_LIMIT, cache=self.cache, guard=self.guard)
         if isinstance(response, dict):
-            results = _get_movies_info(response)
+            results = response['results'][:int(limit)]
             site_api_handler_logger.debug('Movies high got successfully')
             return results
         return response
 
-    def get_movies_custom(self, genre: Union[str, None], limit: int, start_year: int = None,
-                          end_year: int = None) -> Union[List, int]:
+    async def get_movies_custom(self, genre: Union[str, None], limit: int, start_year: int = None,
+                                end_year: int = None) -> Union[List[Movie], int, None]:
         """
         Получить список фильмов с пользовательскими параметрами диапазона года выпуска.
 
@@ -181,10 +296,26 @@ class SiteApiInterface:
         :param end_year: конечный год выпуска фильмов
         :return: список фильмов
         """
-        response = _get_movies(self.url, self.headers, genre=genre, limit=limit, start_year=start_year,
-                               end_year=end_year)
+        if self.remote is not None:
+            return await self.remote.call('get_movies_custom', genre, limit, start_year, end_year)
+        response = await _get_movies(self.client, genre=genre, limit=MOVIES_LIMIT, start_year=start_year,
+                                     end_year=end_year, cache=self.cache, guard=self.guard)
         if isinstance(response, dict):
-            results = _get_movies_info(response)
+            results = response['results'][:int(limit)]
             site_api_handler_logger.debug('Movies custom got successfully')
             return results
         return response
+
+    async def prefetch_movies(self, genre: Union[str, None], sort: str) -> bool:
+        """
+        Запрашивает у API фильмы жанра и обновляет ими кэш, даже если запись кэша ещё актуальна.
+
+        :param genre: жанр фильмов
+        :param sort: 'incr' - по возрастанию года выпуска, 'decr' - по убыванию
+        :return: True, если ответ получен и сохранён в кэше
+        """
+        if self.cache is None:
+            return False
+        response = await _get_movies(self.client, genre, sort=sort, limit=MOVIES_LIMIT, cache=self.cache,
+                                     guard=self.guard, refresh=True)
+        return isinstance(response, dict)
@@ -0,0 +1,95 @@
+import re
+import unicodedata
+from bisect import bisect_left
+from collections import Counter
+from typing import Dict, Iterable, List, Set
+
+from site_API.utils.movies import Movie
+
+_WORD = re.compile(r'\w+')
+
+
+def normalize_title(text: str) -> str:
+    """
+    Приводит текст к виду для поиска: без диакритических знаков, без учёта регистра, только слова через пробел.
+    :param text: название фильма или текст запроса
+    :return: нормализованный текст
+    """
+    text = ''.join(char for char in unicodedata.normalize('NFKD', text) if not unicodedata.combining(char))
+    return ' '.join(_WORD.findall(text.casefold()))
+
+
+def title_trigrams(text: str) -> Set[str]:
+    """
+    Триграммы нормализованного текста. Начало текста дополняется пробелами, чтобы совпадение начала весило больше.
+    :param text: нормализованный текст
+    :return: множество триграмм
+    """
+    padded = f'  {text} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TitleIndex:
+    """
+    Поисковый индекс названий фильмов.
+    Фильмы ранжируются по группам: название начинается с запроса, каждое слово запроса - начало одного из слов
+    названия, название содержит большую часть триграмм запроса (опечатки). Внутри первых двух групп фильмы идут
+    по позиции в Top-250, в последней - по доле совпавших триграмм, а при равной доле - по позиции.
+    Начала слов ищутся двоичным поиском по отсортированному списку слов, похожие названия - по спискам фильмов
+    для каждой триграммы, поэтому запрос не перебирает все названия.
+    """
+
+    def __init__(self, movies: Iterable[Movie], min_similarity: float = 0.5, min_trigram_query: int = 3) -> None:
+        self.min_similarity = min_similarity
+        self.min_trigram_query = min_trigram_query
+        self._movies: List[Movie] = sorted((movie for movie in movies if movie.title),
+                                           key=lambda movie: (not movie.position, movie.position))
+        self._titles = [normalize_title(movie.title) for movie in self._movies]
+        words = sorted({(word, i) for i, title in enumerate(self._titles) for word in title.split()})
+        self._words = [word for word, i in words]
+        self._word_movies = [i for word, i in words]
+        self._trigrams: Dict[str, List[int]] = {}
+        for i, title in enumerate(self._titles):
+            for trigram in title_trigrams(title):
+                self._trigrams.setdefault(trigram, []).append(i)
+
+    def __len__(self) -> int:
+        return len(self._movies)
+
+    def _prefix_matches(self, prefix: str) -> Set[int]:
+        matches = set()
+        for i in range(bisect_left(self._words, prefix), len(self._words)):
+            if not self._words[i].startswith(prefix):
+                break
+            matches.add(self._word_movies[i])
+        return matches
+
+    def _similar(self, text: str, exclude: Set[int]) -> List[int]:
+        # Сходство - доля триграмм запроса, найденных в названии, поэтому длина названия не штрафуется
+        trigrams = title_trigrams(text)
+        shared = Counter()
+        for trigram in trigrams:
+            shared.update(self._trigrams.get(trigram, ()))
+        min_shared = self.min_similarity * len(trigrams)
+        return sorted((i for i, count in shared.items() if count >= min_shared and i not in exclude),
+                      key=lambda i: (-shared[i], i))
+
+    def search(self, query: str) -> List[Movie]:
+        """
+        Ищет фильмы по названию.
+        :param query: текст запроса
+        :return: найденные фильмы в порядке ранжирования; для пустого запроса - все фильмы по позиции
+        """
+        text = normalize_title(query)
+        if not text:
+            return list(self._movies)
+        matches = None
+        for word in text.split():
+            word_matches = self._prefix_matches(word)
+            matches = word_matches if matches is None else matches & word_matches
+            if not matches:
+                break
+        ranked = sorted(matches, key=lambda i: (not self._titles[i].startswith(text), i))
+        if len(text) >= self.min_trigram_query:
+            ranked.extend(self._similar(text, matches))
+        return [self._movies[i] for i in ranked]
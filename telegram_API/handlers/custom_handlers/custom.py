@@ -11,16 +11,16 @@ from telegram.ext import (
 )
 
 from database.db_core import crud
-from site_API.site_api import site_api_interface
+from site_API.site_api import movie_catalog, genre_registry
 from telegram_API.keyboards.markups import get_genres_markup
-from telegram_API.utils.command_handlers_util import reply_movie_info
+from telegram_API.utils.command_handlers_util import PAGINATION_MAX_RESULTS, reply_movie_pages
+from telegram_API.utils.filters import GenreFilter
 
 custom_logger = logging.getLogger(__name__)
 
 GENRE_CHOOSE, YEAR_START, YEAR_END, MOVIE_COUNT = range(4)
 
-genres = site_api_interface.get_genres_list()
-markup = get_genres_markup(genres)
+genre_filter = GenreFilter(genre_registry)
 
 
 async def custom_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
@@ -32,7 +32,7 @@ async def custom_command(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     """
     await update.message.reply_text(
         "Choose Genre:",
-        reply_markup=markup,
+        reply_markup=get_genres_markup(genre_registry.genres),
     )
     return GENRE_CHOOSE
 
@@ -47,7 +47,7 @@ async def wrong_genre_handler(update: Update, context: ContextTypes.DEFAULT_TYPE
     await update.message.reply_text(
         '''Wrong genre selected. Please select the correct option from the keyboard.
 Choose Genre:''',
-        reply_markup=markup,
+        reply_markup=get_genres_markup(genre_registry.genres),
     )
     return GENRE_CHOOSE
 
@@ -147,15 +147,20 @@ async def movie_info_reply(update: Update, context: ContextTypes.DEFAULT_TYPE) -
     genre = context.user_data['genre']
     start_year = context.user_data['start_year']
     end_year = context.user_data['end_year']
+    context.user_data.clear()
     custom_data = {'command': 'custom', 'genre': genre, 'start_year': start_year, 'end_year': end_year}
     crud.insert_history_data(update.effective_user, custom_data)
-    movies = site_api_interface.get_movies_custom(genre, movie_count, min(start_year, end_year),
-                                                  max(start_year, end_year))
+    movies = await movie_catalog.get_movies_custom(genre, PAGINATION_MAX_RESULTS,
+                                                   min(start_year, end_year), max(start_year, end_year))
+    if not isinstance(movies, list):
+        custom_logger.error(f'Movies API is unavailable. Response: {movies}')
+        await update.message.reply_text('The movie service is temporarily unavailable. Please try again later.')
+        return ConversationHandler.END
     if not movies:
         custom_logger.error(f'"{genre}" movies do not exist in the top :(')
         await update.message.reply_text(f'"{genre}" movies do not exist in the top :(')
         return ConversationHandler.END
-    await reply_movie_info(update, context, movies)
+    await reply_movie_pages(update, context, movies, int(movie_count))
 
     return ConversationHandler.END
 
@@ -173,13 +178,12 @@ async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     return ConversationHandler.END
 
 
-genres_regex = '(' + '|'.join(genres) + ')'
 custom_command_handler = ConversationHandler(
     entry_points=[CommandHandler("custom", custom_command)],
     states={
         GENRE_CHOOSE: [
-            MessageHandler(filters.Regex(genres_regex), movie_year_start_handler),
-            MessageHandler(~filters.Regex(genres_regex), wrong_genre_handler)
+            MessageHandler(genre_filter, movie_year_start_handler),
+            MessageHandler(~genre_filter, wrong_genre_handler)
         ],
         YEAR_START: [
             MessageHandler(filters.Regex('^[12][90][0129]\d$'), movie_year_end_handler),
@@ -195,4 +199,6 @@ custom_command_handler = ConversationHandler(
         ]
     },
     fallbacks=[CommandHandler('cancel', cancel)],
+    name='custom',
+    persistent=True,
 )
@@ -1,3 +1,4 @@
+import asyncio
 import logging
 
 from telegram import Update
@@ -11,23 +12,29 @@ history_logger = logging.getLogger(__name__)
 async def history_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """
     Обрабатывает команду "history" и извлекает историю команд пользователя.
+    История берётся из кэша последних команд пользователя, а при его отсутствии - одним запросом к базе данных
+    в отдельном потоке. Кэш заполняется в цикле событий, в отдельном потоке выполняется только запрос.
     :param update: Входящее обновление.
     :param context: Контекст бота.
     :return: None
     """
-    history = crud.retrieve_history(update.effective_user)
-    history_row_count = history.count()
+    history = crud.get_cached_history(update.effective_user)
+    if history is None:
+        history = crud.cache_history(update.effective_user,
+                                     await asyncio.to_thread(crud.retrieve_history, update.effective_user))
+    history_row_count = len(history)
     command_plural = 's' if history_row_count > 1 else ''
-    history_message = f'Here are last {history_row_count} command{command_plural} that you entered:\n'
+    history_lines = [f'Here are last {history_row_count} command{command_plural} that you entered:']
     for i, record in enumerate(history, start=1):
-        history_message += f'{i}. /{record.command}\n'
+        history_lines.append(f'{i}. /{record.command}')
         if record.command == 'custom':
-            history_message += f'{" " * 4}Genre: {record.genre}, ' \
-                               f'Start Year: {record.start_year}, ' \
-                               f'End Year: {record.end_year}\n'
+            history_lines.append(f'{" " * 4}Genre: {record.genre}, '
+                                 f'Start Year: {record.start_year}, '
+                                 f'End Year: {record.end_year}')
         elif record.command in ('high', 'low'):
-            history_message += f'{" " * 4}Genre: {record.genre}\n'
-    await update.message.reply_text(history_message)
+            history_lines.append(f'{" " * 4}Genre: {record.genre}')
+    history_lines.append('')
+    await update.message.reply_text('\n'.join(history_lines))
 
 
 history_command_handler = CommandHandler('history', history_command)
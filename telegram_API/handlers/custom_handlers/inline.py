@@ -0,0 +1,70 @@
+import logging
+
+from telegram import (
+    InlineQueryResult,
+    InlineQueryResultArticle,
+    InlineQueryResultCachedPhoto,
+    InlineQueryResultPhoto,
+    InputTextMessageContent,
+    Update,
+)
+from telegram.constants import InlineQueryLimit
+from telegram.error import BadRequest
+from telegram.ext import ContextTypes, InlineQueryHandler
+
+from database.db_core import crud
+from settings import ApplicationSettings
+from site_API.site_api import movie_catalog
+from site_API.utils.movies import INFO_ABSENT, Movie
+from telegram_API.utils.command_handlers_util import movie_caption, movie_text
+
+app_settings = ApplicationSettings()
+
+inline_logger = logging.getLogger(__name__)
+
+
+def _inline_result(movie: Movie) -> InlineQueryResult:
+    """
+    Формирует результат inline-запроса для фильма. Уже загруженные в Telegram постеры отправляются по file_id,
+    остальные - по URL-адресу, а фильмы без постера - текстом.
+    :param movie: Фильм.
+    :return: Результат inline-запроса.
+    """
+    title = movie.title or INFO_ABSENT
+    description = f'#{movie.position or INFO_ABSENT}, {movie.release_date or movie.year or INFO_ABSENT}'
+    if movie.image_url is None:
+        return InlineQueryResultArticle(movie.imdb_id, title, InputTextMessageContent(movie_text(movie)),
+                                        description=description)
+    poster_file = crud.get_poster_file(movie.image_url)
+    if poster_file is not None and poster_file[1] == 'photo':
+        return InlineQueryResultCachedPhoto(movie.imdb_id, poster_file[0], title=title, description=description,
+                                            caption=movie_caption(movie))
+    return InlineQueryResultPhoto(movie.imdb_id, movie.image_url, movie.image_url, title=title,
+                                  description=description, caption=movie_caption(movie))
+
+
+async def inline_query(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Отвечает на inline-запрос '@bot <название>' фильмами Top-250, найденными по названию в локальном индексе,
+    без обращения к API. Результаты отдаются страницами, номер следующей страницы передаётся в next_offset.
+    Пока индекс не загружен, возвращается пустой ответ, который Telegram не кэширует.
+    :param update: Входящее обновление.
+    :param context: Контекст бота.
+    :return: None
+    """
+    query = update.inline_query
+    offset = int(query.offset) if query.offset.isdigit() else 0
+    page_size = max(1, min(int(app_settings.inline_results_per_page), InlineQueryLimit.RESULTS))
+    movies = movie_catalog.search_titles(query.query)
+    page = movies[offset:offset + page_size]
+    next_offset = str(offset + page_size) if offset + page_size < len(movies) else ''
+    try:
+        await query.answer([_inline_result(movie) for movie in page],
+                           cache_time=app_settings.inline_cache_time if movie_catalog.is_loaded else 0,
+                           next_offset=next_offset)
+    except BadRequest as e:
+        # Запрос устарел, пока пользователь продолжал печатать
+        inline_logger.debug(f'Could not answer inline query "{query.query}". Error: {e}')
+
+
+inline_query_handler = InlineQueryHandler(inline_query)
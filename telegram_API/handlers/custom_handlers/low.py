@@ -10,16 +10,16 @@ from telegram.ext import (
 )
 
 from database.db_core import crud
-from site_API.site_api import site_api_interface
+from site_API.site_api import movie_catalog, genre_registry
 from telegram_API.keyboards.markups import get_genres_markup
-from telegram_API.utils.command_handlers_util import reply_movie_info
+from telegram_API.utils.command_handlers_util import PAGINATION_MAX_RESULTS, reply_movie_pages
+from telegram_API.utils.filters import GenreFilter
 
 low_logger = logging.getLogger(__name__)
 
 GENRE_CHOOSE, MOVIE_COUNT = range(2)
 
-genres = site_api_interface.get_genres_list()
-markup = get_genres_markup(genres)
+genre_filter = GenreFilter(genre_registry)
 
 
 async def low_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
@@ -31,7 +31,7 @@ async def low_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int
     """
     await update.message.reply_text(
         "Choose Genre:",
-        reply_markup=markup,
+        reply_markup=get_genres_markup(genre_registry.genres),
     )
     return GENRE_CHOOSE
 
@@ -46,7 +46,7 @@ async def wrong_genre_handler(update: Update, context: ContextTypes.DEFAULT_TYPE
     await update.message.reply_text(
         '''Wrong genre selected. Please select the correct option from the keyboard.
 Choose Genre:''',
-        reply_markup=markup,
+        reply_markup=get_genres_markup(genre_registry.genres),
     )
     return GENRE_CHOOSE
 
@@ -88,15 +88,20 @@ async def movie_info_reply(update: Update, context: ContextTypes.DEFAULT_TYPE) -
     :return: Следующее состояние после обработки команды.
     """
     genre = context.user_data['genre']
+    context.user_data.clear()
     movie_count = update.message.text
     low_data = {'command': 'low', 'genre': genre}
     crud.insert_history_data(update.effective_user, low_data)
-    movies = site_api_interface.get_movies_low(genre, movie_count)
+    movies = await movie_catalog.get_movies_low(genre, PAGINATION_MAX_RESULTS)
+    if not isinstance(movies, list):
+        low_logger.error(f'Movies API is unavailable. Response: {movies}')
+        await update.message.reply_text('The movie service is temporarily unavailable. Please try again later.')
+        return ConversationHandler.END
     if not movies:
         low_logger.error(f'"{genre}" movies do not exist in the top :(')
         await update.message.reply_text(f'"{genre}" movies do not exist in the top :(')
         return ConversationHandler.END
-    await reply_movie_info(update, context, movies)
+    await reply_movie_pages(update, context, movies, int(movie_count))
 
     return ConversationHandler.END
 
@@ -114,13 +119,12 @@ async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     return ConversationHandler.END
 
 
-genres_regex = '(' + '|'.join(genres) + ')'
 low_command_handler = ConversationHandler(
     entry_points=[CommandHandler("low", low_command)],
     states={
         GENRE_CHOOSE: [
-            MessageHandler(filters.Regex(genres_regex), movie_count_handler),
-            MessageHandler(~filters.Regex(genres_regex), wrong_genre_handler)
+            MessageHandler(genre_filter, movie_count_handler),
+            MessageHandler(~genre_filter, wrong_genre_handler)
         ],
         MOVIE_COUNT: [
             MessageHandler(filters.Regex(r'^([1-9]|10)$'), movie_info_reply),
@@ -128,4 +132,6 @@ low_command_handler = ConversationHandler(
         ]
     },
     fallbacks=[CommandHandler('cancel', cancel)],
+    name='low',
+    persistent=True,
 )
@@ -0,0 +1,45 @@
+import logging
+
+from telegram import Update
+from telegram.error import BadRequest
+from telegram.ext import CallbackQueryHandler, ContextTypes
+
+from telegram_API.keyboards.markups import PAGE_CALLBACK_PATTERN
+from telegram_API.utils.command_handlers_util import cursor_store, reply_movie_page
+
+pages_logger = logging.getLogger(__name__)
+
+
+async def _remove_buttons(update: Update) -> None:
+    try:
+        await update.callback_query.edit_message_reply_markup(None)
+    except BadRequest as e:
+        pages_logger.debug(f'Could not remove page buttons. Error: {e}')
+
+
+async def page_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Обрабатывает нажатие кнопки перехода по страницам результатов.
+    Страница отправляется из курсора пользователя без запроса к API и без записи в таблицу Историй.
+    Кнопки прежнего сообщения удаляются, чтобы перейти к странице можно было только из последнего сообщения.
+    :param update: Входящее обновление.
+    :param context: Контекст бота.
+    :return: None
+    """
+    query = update.callback_query
+    cursor_id, page = context.match.group(1), int(context.match.group(2))
+    cursor = cursor_store.get(update.effective_user.id, cursor_id)
+    if cursor is None or page >= cursor.pages:
+        pages_logger.info(f'Results cursor {cursor_id} of @{update.effective_user.username} expired')
+        await query.answer('These results have expired. Please repeat the command.', show_alert=True)
+        await _remove_buttons(update)
+        return
+    await query.answer()
+    if page == cursor.page:
+        # Повторное нажатие кнопки уже показанной страницы
+        return
+    await _remove_buttons(update)
+    await reply_movie_page(update, context, cursor, page)
+
+
+page_callback_handler = CallbackQueryHandler(page_callback, pattern=PAGE_CALLBACK_PATTERN)
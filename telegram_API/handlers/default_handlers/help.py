@@ -24,6 +24,7 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
 /high - Get the newest movies in the top.
 /custom - Get movies within custom range in the top.
 /history - View the history of user requests.
+@{context.bot.username} <title> - Search movies in the top by title in any chat.
 Feel free to use these commands to explore movie ratings and enjoy the experience!''')
 
 
@@ -1,7 +1,27 @@
-from telegram import ReplyKeyboardMarkup
+from functools import lru_cache
+from typing import Sequence
 
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMarkup
 
-def get_genres_markup(genres):
+# Данные кнопок перехода по страницам результатов: page:<идентификатор курсора>:<номер страницы>
+PAGE_CALLBACK_PATTERN = r'^page:([0-9a-f]+):(\d+)$'
+
+
+def get_genres_markup(genres: Sequence[str]) -> ReplyKeyboardMarkup:
+    return _get_genres_markup(tuple(genres))
+
+
+@lru_cache(maxsize=4)
+def _get_genres_markup(genres):
     reply_keyboard = [genres[i:i + 5] for i in range(0, len(genres), 5)]
     markup = ReplyKeyboardMarkup(reply_keyboard, one_time_keyboard=True)
     return markup
+
+
+def get_pages_markup(cursor_id: str, page: int, pages: int) -> InlineKeyboardMarkup:
+    buttons = []
+    if page > 0:
+        buttons.append(InlineKeyboardButton('« Back', callback_data=f'page:{cursor_id}:{page - 1}'))
+    if page < pages - 1:
+        buttons.append(InlineKeyboardButton('More »', callback_data=f'page:{cursor_id}:{page + 1}'))
+    return InlineKeyboardMarkup([buttons])
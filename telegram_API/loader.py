@@ -1,18 +1,150 @@
+import asyncio
 import logging
+from functools import partial
+from typing import Callable
 
 from telegram.ext import Application
 
+from database.db_core import crud
+from database.utils.persistence_store import PersistenceStore
+from metrics import REGISTRY
 from settings import ApplicationSettings
-from telegram_API.handlers.custom_handlers import low, high, custom, history
+from site_API.site_api import site_api_interface, query_prefetcher
+from telegram_API.handlers.custom_handlers import low, high, custom, history, inline, pages
 from telegram_API.handlers.default_handlers import start, help
+from telegram_API.utils.command_handlers_util import cursor_store, poster_pipeline
+from telegram_API.utils.dispatcher import OrderedApplication
+from telegram_API.utils.instrumentation import (
+    application_collector,
+    instrument_handlers,
+    start_metrics_server,
+    stats_collector,
+    stop_metrics_server,
+)
+from telegram_API.utils.jobs import (
+    log_stats_job,
+    prefetch_popular_job,
+    prune_history_job,
+    refresh_catalog_job,
+    refresh_genres_job,
+)
+from telegram_API.utils.persistence import SQLitePersistence
+from telegram_API.utils.profiler import UpdateProfiler
+from telegram_API.utils.rate_limiter import OutboundScheduler
+from telegram_API.utils.webhook import WebhookServer, serve_webhook
 
 app_settings = ApplicationSettings()
 
 bot_loader_logger = logging.getLogger(__name__)
 
 
-def load_bot() -> None:
-    application = Application.builder().token(app_settings.telegram_bot_api_key.get_secret_value()).build()
+def _schedule_refresh(application: Application, callback: Callable, interval: float, name: str) -> None:
+    # Первый запуск - отдельная разовая задача: у повторяющейся задачи, добавленной до запуска планировщика,
+    # первый запуск переносится на один интервал позже
+    application.job_queue.run_once(callback, when=0, name=name, job_kwargs={'misfire_grace_time': None})
+    application.job_queue.run_repeating(callback, interval=interval, first=interval, name=name)
+
+
+async def _start_metrics(application: Application, port: int) -> None:
+    if not app_settings.metrics_enabled:
+        return
+    REGISTRY.register_collector(application_collector(application))
+    REGISTRY.register_collector(stats_collector('history_writer', crud.history_writer.stats))
+    if site_api_interface.remote is not None:
+        REGISTRY.register_collector(stats_collector('site_api_remote', site_api_interface.remote.stats))
+    else:
+        if site_api_interface.cache is not None:
+            REGISTRY.register_collector(stats_collector('site_api_cache', site_api_interface.cache.stats))
+        if site_api_interface.guard is not None:
+            REGISTRY.register_collector(stats_collector('site_api_guard', site_api_interface.guard.stats))
+    REGISTRY.register_collector(stats_collector('prefetch', query_prefetcher.stats))
+    REGISTRY.register_collector(stats_collector('cursors', cursor_store.stats))
+    if poster_pipeline is not None:
+        REGISTRY.register_collector(stats_collector('posters', poster_pipeline.stats))
+    if isinstance(application.bot.rate_limiter, OutboundScheduler):
+        REGISTRY.register_collector(stats_collector('outbound_scheduler', application.bot.rate_limiter.stats))
+    if isinstance(application.persistence, SQLitePersistence):
+        REGISTRY.register_collector(stats_collector('persistence', application.persistence.stats))
+    await start_metrics_server(app_settings.metrics_listen, port)
+
+
+async def post_init(application: Application) -> None:
+    bot_loader_logger.info('Starting shared resources')
+    crud.history_writer.start()
+    await asyncio.to_thread(crud.load_poster_files)
+    await site_api_interface.start()
+    if poster_pipeline is not None:
+        await poster_pipeline.start()
+    await _start_metrics(application, app_settings.metrics_port)
+    _schedule_refresh(application, refresh_catalog_job, app_settings.catalog_refresh_interval, 'refresh_catalog')
+    _schedule_refresh(application, refresh_genres_job, app_settings.genres_refresh_interval, 'refresh_genres')
+    if app_settings.prefetch_queries > 0 and site_api_interface.cache is not None:
+        # Записи кэша обновляются до истечения срока их жизни
+        _schedule_refresh(application, prefetch_popular_job,
+                          min(app_settings.prefetch_interval, app_settings.site_api_cache_ttl * 0.8),
+                          'prefetch_popular')
+    application.job_queue.run_repeating(prune_history_job, interval=app_settings.history_prune_interval,
+                                        first=60, name='prune_history')
+    application.job_queue.run_repeating(log_stats_job, interval=app_settings.stats_log_interval, name='log_stats')
+
+
+async def worker_post_init(application: Application, metrics_port: int) -> None:
+    bot_loader_logger.info('Starting worker resources')
+    crud.history_writer.start()
+    await asyncio.to_thread(crud.load_poster_files)
+    await site_api_interface.start()
+    if poster_pipeline is not None:
+        await poster_pipeline.start()
+    await _start_metrics(application, metrics_port)
+    application.job_queue.run_repeating(log_stats_job, interval=app_settings.stats_log_interval, name='log_stats')
+
+
+async def post_shutdown(application: Application) -> None:
+    bot_loader_logger.info('Releasing shared resources')
+    await stop_metrics_server()
+    await site_api_interface.close()
+    if poster_pipeline is not None:
+        await poster_pipeline.close()
+    crud.history_writer.stop()
+
+
+def _create_rate_limiter(global_share: float = 1) -> OutboundScheduler:
+    return OutboundScheduler(global_rate=app_settings.rate_limit_global_rate * global_share,
+                             global_burst=max(1.0, app_settings.rate_limit_global_burst * global_share),
+                             chat_rate=app_settings.rate_limit_chat_rate,
+                             chat_burst=app_settings.rate_limit_chat_burst,
+                             group_rate=app_settings.rate_limit_group_rate,
+                             group_burst=app_settings.rate_limit_group_burst,
+                             max_retries=app_settings.rate_limit_max_retries)
+
+
+def build_application(*, with_updater: bool = True, workers: int = 0, worker: int = 0) -> Application:
+    """
+    Создаёт приложение бота со всеми обработчиками.
+    :param with_updater: Нужен ли Updater для получения обновлений через long polling.
+    :param workers: Количество рабочих процессов, если приложение работает в одном из них.
+        Рабочий процесс не запускает фоновое обслуживание общих ресурсов и получает долю общего лимита отправки.
+    :param worker: Номер рабочего процесса. Метрики процесса доступны на порту METRICS_PORT + 1 + worker.
+    :return: Приложение бота.
+    """
+    if workers:
+        application_post_init = partial(worker_post_init, metrics_port=app_settings.metrics_port + 1 + worker)
+    else:
+        application_post_init = post_init
+    builder = Application.builder() \
+        .application_class(OrderedApplication, kwargs={'max_concurrent_updates': app_settings.concurrent_updates}) \
+        .concurrent_updates(app_settings.max_pending_updates) \
+        .token(app_settings.telegram_bot_api_key.get_secret_value()) \
+        .base_url(app_settings.telegram_base_url) \
+        .rate_limiter(_create_rate_limiter(1 / workers if workers else 1)) \
+        .persistence(SQLitePersistence(PersistenceStore(crud.history_writer if workers else None),
+                                       update_interval=app_settings.persistence_update_interval,
+                                       max_entries=app_settings.persistence_cache_size)) \
+        .post_init(application_post_init) \
+        .post_shutdown(post_shutdown)
+    if not with_updater:
+        builder = builder.updater(None)
+    application = builder.build()
 
     application.add_handler(start.start_command_handler)
     application.add_handler(help.help_command_handler)
@@ -20,5 +152,31 @@ def load_bot() -> None:
     application.add_handler(low.low_command_handler)
     application.add_handler(custom.custom_command_handler)
     application.add_handler(history.history_command_handler)
+    application.add_handler(pages.page_callback_handler)
+    application.add_handler(inline.inline_query_handler)
+    for handlers in application.handlers.values():
+        instrument_handlers(handlers)
+    if app_settings.profiler_enabled:
+        application.profiler = UpdateProfiler(app_settings.profiler_dir,
+                                              sample_rate=app_settings.profiler_sample_rate,
+                                              slow_threshold=app_settings.profiler_slow_threshold,
+                                              max_files=app_settings.profiler_max_files)
+
+    return application
 
-    application.run_polling()
+
+def load_bot() -> None:
+    if app_settings.telegram_mode == 'webhook':
+        application = build_application(with_updater=False)
+        secret_token = app_settings.webhook_secret_token
+        webhook_server = WebhookServer(application,
+                                       listen=app_settings.webhook_listen,
+                                       port=app_settings.webhook_port,
+                                       path=app_settings.webhook_path,
+                                       url=app_settings.webhook_url,
+                                       secret_token=secret_token.get_secret_value() if secret_token else None,
+                                       max_connections=app_settings.webhook_max_connections)
+        asyncio.run(serve_webhook(application, webhook_server))
+    else:
+        application = build_application()
+        application.run_polling()
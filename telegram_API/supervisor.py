@@ -0,0 +1,306 @@
+import asyncio
+import json
+import logging
+import multiprocessing as mp
+import queue
+import signal
+import threading
+from typing import Any, List, Optional
+
+from telegram import Bot, Update
+from telegram.ext import Updater
+
+from database.db_core import crud, init_db
+from database.utils.history_writer import QueueHistoryWriter
+from settings import ApplicationSettings
+from metrics import REGISTRY
+from site_API.site_api import site_api_interface, movie_catalog, genre_registry
+from site_API.utils.remote import REMOTE_METHODS, RemoteSiteApi
+from telegram_API.loader import build_application
+from telegram_API.utils.instrumentation import start_metrics_server, stats_collector, stop_metrics_server
+
+app_settings = ApplicationSettings()
+
+supervisor_logger = logging.getLogger(__name__)
+
+WORKER_CHECK_INTERVAL = 5
+WORKER_STOP_TIMEOUT = 30
+
+
+def worker_index(update: Update, workers: int) -> int:
+    """
+    Номер рабочего процесса, обрабатывающего обновление. Все обновления одного пользователя попадают
+    в один процесс, поэтому состояние диалогов и кэш истории пользователя остаются локальными для процесса.
+    :param update: Входящее обновление.
+    :param workers: Количество рабочих процессов.
+    :return: номер рабочего процесса
+    """
+    user = update.effective_user
+    return user.id % workers if user is not None else 0
+
+
+async def _serve_worker(index: int, workers: int, inbox: Any) -> None:
+    application = build_application(with_updater=False, workers=workers, worker=index)
+    await application.initialize()
+    if application.post_init:
+        await application.post_init(application)
+    try:
+        await application.start()
+        parent = mp.parent_process()
+        while True:
+            try:
+                kind, payload = await asyncio.to_thread(inbox.get, True, WORKER_CHECK_INTERVAL)
+            except queue.Empty:
+                # Сигналы остановки рабочий процесс игнорирует, поэтому без супервизора он завершается сам
+                if parent is not None and not parent.is_alive():
+                    supervisor_logger.error('Supervisor process is gone. Stopping worker')
+                    break
+                continue
+            if kind == 'update':
+                update = Update.de_json(json.loads(payload), application.bot)
+                await application.update_queue.put(update)
+            elif kind == 'catalog':
+                movie_catalog.load(payload)
+            elif kind == 'genres':
+                genre_registry.load(payload)
+            elif kind == 'stop':
+                break
+    finally:
+        if application.running:
+            await application.stop()
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
+
+
+def _worker_main(index: int, workers: int, inbox: Any, history_queue: Any, upstream_queue: Any,
+                 reply_queue: Any) -> None:
+    """
+    Точка входа рабочего процесса. Процесс обрабатывает обновления, полученные от супервизора,
+    а строки истории, file_id постеров и изменения сохранённого состояния бота передаёт супервизору,
+    который записывает их в базу данных. Сам рабочий процесс базу данных только читает.
+    Запросы фильмов к API сайта также выполняет супервизор, поэтому кэш ответов и выключатель общие для всех процессов.
+    :param index: Номер рабочего процесса.
+    :param workers: Количество рабочих процессов.
+    :param inbox: Очередь сообщений от супервизора.
+    :param history_queue: Очередь записей в базу данных для супервизора.
+    :param upstream_queue: Очередь запросов к API сайта для супервизора.
+    :param reply_queue: Очередь ответов супервизора на запросы к API сайта.
+    :return: None
+    """
+    # Остановкой рабочих процессов управляет супервизор: SIGINT и SIGTERM, отправленные всей группе процессов
+    # (Ctrl+C, systemd, docker stop), обрабатывает только он, а рабочие процессы получают от него команду stop
+    # и успевают передать оставшиеся записи и закрыть клиенты
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    supervisor_logger.info(f'Starting worker {index}')
+    init_db()
+    crud.history_writer = QueueHistoryWriter(history_queue)
+    site_api_interface.remote = RemoteSiteApi(index, upstream_queue, reply_queue,
+                                              timeout=float(app_settings.site_api_retry_deadline) +
+                                              float(app_settings.site_api_timeout))
+    asyncio.run(_serve_worker(index, workers, inbox))
+    supervisor_logger.info(f'Worker {index} stopped')
+
+
+def _forward_history(history_queue: Any) -> None:
+    while True:
+        item = history_queue.get()
+        if item is None:
+            break
+        crud.history_writer.submit_item(item)
+
+
+def _forward_upstream(upstream_queue: Any, supervisor: 'Supervisor', loop: asyncio.AbstractEventLoop) -> None:
+    while True:
+        item = upstream_queue.get()
+        if item is None:
+            break
+        asyncio.run_coroutine_threadsafe(supervisor.answer_upstream(*item), loop)
+
+
+class Supervisor:
+    """
+    Супервизор рабочих процессов бота.
+    Получает обновления через long polling и распределяет их между рабочими процессами по id пользователя.
+    Владеет общими ресурсами: единственным потоком записи в базу данных, клиентом API сайта с общим кэшем ответов
+    и выключателем (рабочие процессы передают ему свои запросы), обновлением списка Top-250 и реестра жанров
+    (результаты рассылаются рабочим процессам) и очисткой истории.
+    Завершившийся рабочий процесс перезапускается.
+    """
+
+    def __init__(self, workers: int) -> None:
+        self.workers = workers
+        self._context = mp.get_context('spawn')
+        self._history_queue = self._context.Queue()
+        self._upstream_queue = self._context.Queue()
+        self._inboxes = [self._context.Queue() for _ in range(workers)]
+        self._replies = [self._context.Queue() for _ in range(workers)]
+        self._processes: List[Optional[mp.Process]] = [None] * workers
+        self._catalog: Optional[List] = None
+        self.routed_updates = [0] * workers
+
+    def _start_worker(self, index: int) -> None:
+        process = self._context.Process(target=_worker_main, name=f'bot-worker-{index}',
+                                        args=(index, self.workers, self._inboxes[index], self._history_queue,
+                                              self._upstream_queue, self._replies[index]))
+        process.start()
+        self._processes[index] = process
+        if self._catalog is not None:
+            self._inboxes[index].put(('catalog', self._catalog))
+        self._inboxes[index].put(('genres', list(genre_registry.genres)))
+
+    def _broadcast(self, kind: str, payload: Any) -> None:
+        for inbox in self._inboxes:
+            inbox.put((kind, payload))
+
+    def _route(self, update: object) -> None:
+        if not isinstance(update, Update):
+            return
+        index = worker_index(update, self.workers)
+        self._inboxes[index].put(('update', update.to_json()))
+        self.routed_updates[index] += 1
+
+    async def answer_upstream(self, worker: int, request_id: Any, method: str, args: tuple) -> None:
+        """
+        Выполняет запрос рабочего процесса к API сайта и отправляет ему ответ.
+        :param worker: Номер рабочего процесса.
+        :param request_id: Идентификатор запроса.
+        :param method: Название метода SiteApiInterface.
+        :param args: Аргументы метода.
+        :return: None
+        """
+        result = None
+        if method in REMOTE_METHODS:
+            try:
+                result = await getattr(site_api_interface, method)(*args)
+            except Exception as e:
+                supervisor_logger.exception(f'Site API request {method}{args} of worker {worker} failed. Error: {e}')
+        else:
+            supervisor_logger.error(f'Worker {worker} requested unknown site API method {method}')
+        self._replies[worker].put((request_id, result))
+
+    async def _route_updates(self, update_queue: asyncio.Queue) -> None:
+        while True:
+            self._route(await update_queue.get())
+
+    async def _refresh_catalog(self) -> None:
+        while True:
+            movies = await site_api_interface.get_top_rated_movies()
+            if isinstance(movies, list) and movies:
+                self._catalog = movies
+                self._broadcast('catalog', movies)
+                supervisor_logger.info(f'Catalog broadcast to workers: {len(movies)} movies')
+            else:
+                supervisor_logger.error(f'Catalog refresh failed. API response: {movies}')
+            await asyncio.sleep(app_settings.catalog_refresh_interval)
+
+    async def _refresh_genres(self) -> None:
+        while True:
+            if await genre_registry.refresh():
+                self._broadcast('genres', list(genre_registry.genres))
+            await asyncio.sleep(app_settings.genres_refresh_interval)
+
+    @staticmethod
+    async def _prune_history() -> None:
+        await asyncio.sleep(60)
+        while True:
+            deleted = await asyncio.to_thread(crud.prune_history, app_settings.history_keep_last,
+                                              app_settings.history_max_age_days)
+            supervisor_logger.info(f'History pruned: {deleted} rows deleted')
+            if deleted:
+                await asyncio.to_thread(crud.compact_database)
+            await asyncio.sleep(app_settings.history_prune_interval)
+
+    async def _watch_workers(self) -> None:
+        while True:
+            await asyncio.sleep(WORKER_CHECK_INTERVAL)
+            for index, process in enumerate(self._processes):
+                if process is not None and not process.is_alive():
+                    supervisor_logger.error(f'Worker {index} exited with code {process.exitcode}. Restarting')
+                    self._start_worker(index)
+
+    async def _log_stats(self) -> None:
+        while True:
+            await asyncio.sleep(app_settings.stats_log_interval)
+            supervisor_logger.info(f'History writer stats: {crud.history_writer.stats()}')
+            supervisor_logger.info(f'Routed updates per worker: {self.routed_updates}')
+            if site_api_interface.guard is not None:
+                supervisor_logger.info(f'Site API guard stats: {site_api_interface.guard.stats()}')
+
+    async def run(self) -> None:
+        """
+        Запускает рабочие процессы и распределяет обновления до получения сигнала остановки.
+        При остановке передаёт рабочим процессам оставшиеся обновления, дожидается их завершения
+        и только после этого записывает оставшуюся историю и закрывает клиент API.
+        :return: None
+        """
+        stop_event = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for stop_signal in (signal.SIGINT, signal.SIGTERM, signal.SIGABRT):
+            try:
+                loop.add_signal_handler(stop_signal, stop_event.set)
+            except NotImplementedError:
+                pass
+
+        crud.history_writer.start()
+        forwarder = threading.Thread(target=_forward_history, args=(self._history_queue,),
+                                     name='history-forwarder', daemon=True)
+        forwarder.start()
+        await site_api_interface.start()
+        upstream_forwarder = threading.Thread(target=_forward_upstream,
+                                              args=(self._upstream_queue, self, asyncio.get_running_loop()),
+                                              name='site-api-forwarder', daemon=True)
+        upstream_forwarder.start()
+        if app_settings.metrics_enabled:
+            REGISTRY.register_collector(stats_collector('history_writer', crud.history_writer.stats))
+            if site_api_interface.guard is not None:
+                REGISTRY.register_collector(stats_collector('site_api_guard', site_api_interface.guard.stats))
+            await start_metrics_server(app_settings.metrics_listen, app_settings.metrics_port)
+        for index in range(self.workers):
+            self._start_worker(index)
+
+        bot = Bot(app_settings.telegram_bot_api_key.get_secret_value(), base_url=app_settings.telegram_base_url)
+        updater = Updater(bot, asyncio.Queue())
+        tasks = [asyncio.create_task(coroutine) for coroutine in (self._refresh_catalog(), self._refresh_genres(),
+                                                                   self._prune_history(), self._watch_workers(),
+                                                                   self._log_stats())]
+        try:
+            async with updater:
+                update_queue = await updater.start_polling(allowed_updates=Update.ALL_TYPES)
+                tasks.append(asyncio.create_task(self._route_updates(update_queue)))
+                supervisor_logger.info(f'Bot is polling updates for {self.workers} workers')
+                await stop_event.wait()
+                await updater.stop()
+                while not update_queue.empty():
+                    self._route(update_queue.get_nowait())
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            self._broadcast('stop', None)
+            for process in self._processes:
+                if process is not None:
+                    await asyncio.to_thread(process.join, WORKER_STOP_TIMEOUT)
+                    if process.is_alive():
+                        supervisor_logger.error(f'Worker {process.name} did not stop in time. Terminating')
+                        process.terminate()
+            self._upstream_queue.put(None)
+            await asyncio.to_thread(upstream_forwarder.join)
+            self._history_queue.put(None)
+            await asyncio.to_thread(forwarder.join)
+            crud.history_writer.stop()
+            await stop_metrics_server()
+            await site_api_interface.close()
+
+
+def run_supervisor(workers: int) -> None:
+    """
+    Запускает бота в режиме супервизора с несколькими рабочими процессами.
+    Режим поддерживает только получение обновлений через long polling.
+    :param workers: Количество рабочих процессов.
+    :return: None
+    """
+    if app_settings.telegram_mode == 'webhook':
+        supervisor_logger.warning('Webhook mode is not supported with several workers. Falling back to polling')
+    asyncio.run(Supervisor(workers).run())
@@ -1,27 +1,235 @@
-from typing import List, Dict
+import asyncio
+from typing import List, Optional, Tuple, Union
 
-from telegram import Update
+from telegram import InputMediaPhoto, Message, Update
+from telegram.constants import MediaGroupLimit, MessageLimit
 from telegram.error import BadRequest
 from telegram.ext import ContextTypes
 
+from database.db_core import crud
+from settings import ApplicationSettings
+from site_API.utils.movies import INFO_ABSENT, Movie
+from site_API.utils.site_api_handler import MOVIES_LIMIT
+from telegram_API.keyboards.markups import get_pages_markup
+from telegram_API.utils.cursors import CursorStore, MovieCursor
+from telegram_API.utils.posters import PosterCache, PosterPipeline
+from telegram_API.utils.rate_limiter import BULK
 
-async def reply_movie_info(update: Update, context: ContextTypes.DEFAULT_TYPE, movies: List[Dict]) -> None:
+app_settings = ApplicationSettings()
+
+# API возвращает не больше MOVIES_LIMIT фильмов, поэтому из каталога берётся столько же: количество страниц
+# не зависит от того, откуда получены фильмы
+PAGINATION_MAX_RESULTS = max(1, min(int(app_settings.pagination_max_results), MOVIES_LIMIT))
+
+cursor_store = CursorStore(ttl=app_settings.pagination_cursor_ttl, max_entries=app_settings.pagination_max_cursors)
+
+poster_pipeline = PosterPipeline(PosterCache(app_settings.poster_cache_dir, app_settings.poster_cache_max_bytes),
+                                 max_side=app_settings.poster_max_side,
+                                 quality=app_settings.poster_jpeg_quality,
+                                 workers=app_settings.poster_workers,
+                                 timeout=app_settings.poster_download_timeout) \
+    if app_settings.poster_cache_enabled else None
+
+
+def _remember_poster(image_url: str, message: Message) -> None:
+    """
+    Сохраняет file_id отправленного постера, чтобы повторно не загружать его в Telegram.
+    :param image_url: URL-адрес постера.
+    :param message: Отправленное сообщение с постером.
+    :return: None
+    """
+    if message.photo:
+        crud.save_poster_file(image_url, message.photo[-1].file_id, 'photo')
+    elif message.document:
+        crud.save_poster_file(image_url, message.document.file_id, 'document')
+
+
+async def _poster_media(image_url: str) -> Union[bytes, str]:
+    """
+    Возвращает подготовленный постер из кэша постеров, а если его не удалось получить - URL-адрес постера.
+    :param image_url: URL-адрес постера.
+    :return: Изображение или URL-адрес постера.
+    """
+    photo = await poster_pipeline.get(image_url) if poster_pipeline is not None else None
+    return photo if photo is not None else image_url
+
+
+def movie_text(movie: Movie) -> str:
+    """
+    Формирует текст с информацией о фильме.
+    :param movie: Фильм.
+    :return: Текст с названием, позицией и датой выпуска фильма.
+    """
+    return f'''
+Movie title: {movie.title or INFO_ABSENT}
+Movie position: {movie.position or INFO_ABSENT}
+Movie release date: {movie.release_date or INFO_ABSENT}'''
+
+
+def movie_caption(movie: Movie) -> str:
+    """
+    Формирует подпись к постеру, включающую информацию о фильме.
+    :param movie: Фильм.
+    :return: Подпись, обрезанная до допустимой в Telegram длины.
+    """
+    caption = f"{movie.image_caption or INFO_ABSENT}\n{movie_text(movie)}"
+    return caption[:MessageLimit.CAPTION_LENGTH]
+
+
+async def reply_poster(update: Update, image_url: Optional[str], caption: str) -> Message:
+    """
+    Отправляет постер фильма. Уже загруженные в Telegram постеры отправляются по file_id,
+    остальные - подготовленными из кэша постеров, после чего их file_id сохраняется.
+    Если постер не удалось подготовить, он отправляется по URL-адресу, а при отказе Telegram - документом.
+    Если у фильма нет постера, отправляется только подпись.
+    Постер отправляется с приоритетом массовой отправки (BULK).
+    :param update: Входящее обновление.
+    :param image_url: URL-адрес постера или None.
+    :param caption: Подпись к постеру.
+    :return: Отправленное сообщение.
+    """
+    bot, chat_id = update.get_bot(), update.effective_chat.id
+    if image_url is None:
+        return await bot.send_message(chat_id, caption, rate_limit_args=BULK)
+    poster_file = crud.get_poster_file(image_url)
+    if poster_file is not None:
+        file_id, media_type = poster_file
+        try:
+            if media_type == 'photo':
+                return await bot.send_photo(chat_id, file_id, caption=caption, rate_limit_args=BULK)
+            return await bot.send_document(chat_id, file_id, caption=caption, rate_limit_args=BULK)
+        except BadRequest:
+            crud.forget_poster_file(image_url)
+
+    media = await _poster_media(image_url)
+    if isinstance(media, bytes):
+        message = await bot.send_photo(chat_id, media, caption=caption, rate_limit_args=BULK)
+    else:
+        try:
+            message = await bot.send_photo(chat_id, image_url, caption=caption, rate_limit_args=BULK)
+        except BadRequest:
+            message = await bot.send_document(chat_id, image_url, caption=caption, rate_limit_args=BULK)
+    _remember_poster(image_url, message)
+    return message
+
+
+async def _send_album(update: Update, album: List[Tuple[Movie, Union[bytes, str]]]) -> None:
+    """
+    Отправляет подряд идущие постеры альбомами не больше MediaGroupLimit.MAX_MEDIA_LENGTH фото.
+    Остаток из одного постера и постеры альбома, который Telegram отклонил, отправляются по одному.
+    :param update: Входящее обновление.
+    :param album: Фильмы с постерами: file_id, подготовленное изображение или URL-адрес.
+    :return: None
+    """
+    for i in range(0, len(album), MediaGroupLimit.MAX_MEDIA_LENGTH):
+        chunk = album[i:i + MediaGroupLimit.MAX_MEDIA_LENGTH]
+        if len(chunk) >= MediaGroupLimit.MIN_MEDIA_LENGTH:
+            media_group = [InputMediaPhoto(media, caption=movie_caption(movie)) for movie, media in chunk]
+            try:
+                messages = await update.get_bot().send_media_group(update.effective_chat.id, media_group,
+                                                                   rate_limit_args=BULK)
+            except BadRequest:
+                pass
+            else:
+                for (movie, media), message in zip(chunk, messages):
+                    _remember_poster(movie.image_url, message)
+                continue
+        for movie, media in chunk:
+            await reply_poster(update, movie.image_url, movie_caption(movie))
+
+
+async def reply_movie_album(update: Update, movies: List[Movie]) -> None:
+    """
+    Отправляет постеры фильмов альбомами (sendMediaGroup) с информацией о фильмах в подписях.
+    Ещё не загруженные в Telegram постеры подготавливаются одновременно.
+    Постеры, которые Telegram ранее не принял как фото, и фильмы без постеров отправляются отдельно, а альбомы
+    разделяются на них, поэтому фильмы приходят в том же порядке, что и в списке.
+    Если Telegram отклоняет альбом, его фильмы отправляются по одному.
+    :param update: Входящее обновление.
+    :param movies: Список фильмов.
+    :return: None
+    """
+    # Для каждого фильма - постер для альбома или None, если фильм отправляется отдельно
+    items: List[Tuple[Movie, Union[bytes, str, None]]] = []
+    uploads = []
+    for movie in movies:
+        poster_file = crud.get_poster_file(movie.image_url) if movie.image_url is not None else None
+        if movie.image_url is None or (poster_file is not None and poster_file[1] != 'photo'):
+            items.append((movie, None))
+        elif poster_file is None:
+            uploads.append(len(items))
+            items.append((movie, movie.image_url))
+        else:
+            items.append((movie, poster_file[0]))
+    prepared = await asyncio.gather(*(_poster_media(items[i][1]) for i in uploads))
+    for i, media in zip(uploads, prepared):
+        items[i] = (items[i][0], media)
+
+    album = []
+    for movie, media in items:
+        if media is not None:
+            album.append((movie, media))
+            continue
+        await _send_album(update, album)
+        album = []
+        await reply_poster(update, movie.image_url, movie_caption(movie))
+    await _send_album(update, album)
+
+
+async def reply_movie_info(update: Update, context: ContextTypes.DEFAULT_TYPE, movies: List[Movie]) -> None:
     """
     Отправляет информацию о фильмах в ответ на сообщение пользователя.
+    В режиме 'album' постеры отправляются альбомами, в режиме 'single' - постер и текст для каждого фильма.
+    Списки фильмов отправляются с приоритетом BULK, чтобы короткие ответы в других чатах не ждали за ними
+    в очереди общего лимита отправки.
+    Данные диалогов пользователя не изменяются: их очищает последний шаг диалога, а страницы результатов
+    могут отправляться и во время другого открытого диалога.
     :param update: Входящее обновление.
     :param context: Контекст бота.
     :param movies: Список фильмов
     :return: None
     """
-    for movie in movies:
-        try:
-            await update.message.reply_photo(movie['image_url'], caption=movie['image_caption'])
-        except BadRequest:
-            await update.message.reply_document(movie['image_url'], caption=movie['image_caption'])
-
-        reply_text = f'''
-Movie title: {movie['title']}
-Movie position: {movie['position']}
-Movie release date: {movie['release_date']}'''
-        await update.message.reply_text(reply_text)
-    context.user_data.clear()
+    if app_settings.movie_delivery_mode == 'album':
+        await reply_movie_album(update, movies)
+    else:
+        for movie in movies:
+            await reply_poster(update, movie.image_url, movie.image_caption or INFO_ABSENT)
+            await update.get_bot().send_message(update.effective_chat.id, movie_text(movie), rate_limit_args=BULK)
+
+
+async def reply_movie_page(update: Update, context: ContextTypes.DEFAULT_TYPE, cursor: MovieCursor,
+                           page: int) -> None:
+    """
+    Отправляет страницу результатов из курсора и сообщение с кнопками перехода по страницам.
+    :param update: Входящее обновление.
+    :param context: Контекст бота.
+    :param cursor: Курсор результатов пользователя.
+    :param page: Номер страницы, начиная с 0.
+    :return: None
+    """
+    cursor.page = page
+    await reply_movie_info(update, context, cursor.get_page(page))
+    await update.get_bot().send_message(update.effective_chat.id,
+                                        f'Page {page + 1} of {cursor.pages} ({len(cursor.movies)} movies)',
+                                        reply_markup=get_pages_markup(cursor.id, page, cursor.pages),
+                                        rate_limit_args=BULK)
+
+
+async def reply_movie_pages(update: Update, context: ContextTypes.DEFAULT_TYPE, movies: List[Movie],
+                            page_size: int) -> None:
+    """
+    Отправляет первую страницу найденных фильмов. Если фильмов больше одной страницы, они сохраняются
+    в курсоре пользователя, и следующие страницы отправляются по нажатию кнопок без повторного запроса к API.
+    Отправляется не больше PAGINATION_MAX_RESULTS фильмов.
+    :param update: Входящее обновление.
+    :param context: Контекст бота.
+    :param movies: Список найденных фильмов.
+    :param page_size: Количество фильмов на странице.
+    :return: None
+    """
+    movies = movies[:PAGINATION_MAX_RESULTS]
+    if len(movies) <= page_size:
+        await reply_movie_info(update, context, movies)
+        return
+    cursor = cursor_store.open(update.effective_user.id, movies, page_size)
+    await reply_movie_page(update, context, cursor, 0)
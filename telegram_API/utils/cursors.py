@@ -0,0 +1,107 @@
+import secrets
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from site_API.utils.movies import Movie
+
+
+class MovieCursor:
+    """
+    Курсор результатов запроса пользователя: найденные фильмы, размер страницы и последняя показанная страница.
+    """
+    __slots__ = ('id', 'movies', 'page_size', 'page', 'expires_at')
+
+    def __init__(self, movies: List[Movie], page_size: int, expires_at: float) -> None:
+        self.id = secrets.token_hex(4)
+        self.movies = movies
+        self.page_size = max(1, page_size)
+        self.page = 0
+        self.expires_at = expires_at
+
+    @property
+    def pages(self) -> int:
+        return -(-len(self.movies) // self.page_size)
+
+    def get_page(self, page: int) -> List[Movie]:
+        """
+        Фильмы страницы.
+        :param page: номер страницы, начиная с 0
+        :return: список фильмов
+        """
+        return self.movies[page * self.page_size:(page + 1) * self.page_size]
+
+
+class CursorStore:
+    """
+    Хранилище курсоров результатов. У каждого пользователя не больше одного курсора: новый запрос заменяет
+    прежний курсор. Курсоры живут ttl секунд с последнего обращения, а при переполнении вытесняются курсоры
+    пользователей, которые дольше всех к ним не обращались.
+    """
+
+    def __init__(self, ttl: float = 60 * 60, max_entries: int = 10000) -> None:
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._cursors: 'OrderedDict[int, MovieCursor]' = OrderedDict()
+        self.opened = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._cursors)
+
+    def open(self, user_id: int, movies: List[Movie], page_size: int) -> MovieCursor:
+        """
+        Создаёт курсор пользователя, заменяя его прежний курсор.
+        :param user_id: идентификатор пользователя
+        :param movies: найденные фильмы
+        :param page_size: количество фильмов на странице
+        :return: курсор
+        """
+        now = time.monotonic()
+        # Курсоры упорядочены по последнему обращению, поэтому устаревшие находятся в начале
+        while self._cursors and next(iter(self._cursors.values())).expires_at <= now:
+            self._cursors.popitem(last=False)
+        cursor = MovieCursor(movies, page_size, now + self.ttl)
+        self._cursors[user_id] = cursor
+        self._cursors.move_to_end(user_id)
+        self.opened += 1
+        while len(self._cursors) > self.max_entries:
+            self._cursors.popitem(last=False)
+            self.evictions += 1
+        return cursor
+
+    def get(self, user_id: int, cursor_id: str) -> Optional[MovieCursor]:
+        """
+        Возвращает курсор пользователя и продлевает срок его жизни.
+        :param user_id: идентификатор пользователя
+        :param cursor_id: идентификатор курсора из кнопки
+        :return: курсор или None, если он устарел или заменён более новым
+        """
+        cursor = self._cursors.get(user_id)
+        if cursor is None or cursor.id != cursor_id:
+            self.misses += 1
+            return None
+        now = time.monotonic()
+        if cursor.expires_at <= now:
+            del self._cursors[user_id]
+            self.misses += 1
+            return None
+        cursor.expires_at = now + self.ttl
+        self._cursors.move_to_end(user_id)
+        self.hits += 1
+        return cursor
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Счётчики работы хранилища курсоров.
+        :return: словарь с количеством курсоров, попаданий, промахов и вытеснений
+        """
+        return {
+            'cursors': len(self._cursors),
+            'opened': self.opened,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
@@ -0,0 +1,83 @@
+import asyncio
+import logging
+from typing import Any, Dict, Hashable, Optional
+
+from telegram import Update
+from telegram.ext import Application
+
+from telegram_API.utils.profiler import UpdateProfiler
+
+dispatcher_logger = logging.getLogger(__name__)
+
+
+class OrderedApplication(Application):
+    """
+    Приложение, обрабатывающее обновления разных чатов параллельно, а обновления одного чата - строго по очереди.
+    Приложение должно быть создано с concurrent_updates: это значение ограничивает количество принятых,
+    но ещё не обработанных обновлений. Количество одновременно обрабатываемых обновлений ограничено
+    max_concurrent_updates. Обновление ждёт завершения предыдущего обновления своего чата, не занимая
+    слот обработки, поэтому медленный пользователь не блокирует остальных.
+    Если задан profiler, обработка каждого обновления выполняется через него.
+    """
+
+    def __init__(self, *, max_concurrent_updates: int = 64, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        self.max_concurrent_updates = max_concurrent_updates
+        self._processing_slots: Optional[asyncio.Semaphore] = None
+        self._chat_tails: Dict[Hashable, asyncio.Future] = {}
+        self.in_progress_updates = 0
+        self.profiler: Optional[UpdateProfiler] = None
+
+    @staticmethod
+    def _ordering_key(update: object) -> Optional[Hashable]:
+        """
+        Ключ, в пределах которого обновления обрабатываются по порядку: чат, а при его отсутствии - пользователь.
+        :param update: Входящее обновление.
+        :return: ключ или None, если порядок обработки обновления не важен
+        """
+        if not isinstance(update, Update):
+            return None
+        if update.effective_chat is not None:
+            return 'chat', update.effective_chat.id
+        if update.effective_user is not None:
+            return 'user', update.effective_user.id
+        return None
+
+    async def _process_in_slot(self, update: object) -> None:
+        if self._processing_slots is None:
+            self._processing_slots = asyncio.Semaphore(self.max_concurrent_updates)
+        async with self._processing_slots:
+            self.in_progress_updates += 1
+            try:
+                if self.profiler is not None:
+                    await self.profiler.run(update, super().process_update(update))
+                else:
+                    await super().process_update(update)
+            finally:
+                self.in_progress_updates -= 1
+
+    async def process_update(self, update: object) -> None:
+        key = self._ordering_key(update)
+        if key is None:
+            await self._process_in_slot(update)
+            return
+
+        previous = self._chat_tails.get(key)
+        done = asyncio.get_running_loop().create_future()
+        self._chat_tails[key] = done
+        try:
+            if previous is not None:
+                await asyncio.shield(previous)
+            await self._process_in_slot(update)
+        finally:
+            done.set_result(None)
+            if self._chat_tails.get(key) is done:
+                del self._chat_tails[key]
+
+    @property
+    def waiting_chats(self) -> int:
+        """
+        Количество чатов, у которых есть принятые, но ещё не обработанные обновления.
+        :return: количество чатов
+        """
+        return len(self._chat_tails)
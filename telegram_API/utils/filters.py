@@ -0,0 +1,15 @@
+from telegram import Message
+from telegram.ext import filters
+
+from site_API.utils.genres import GenreRegistry
+
+
+class GenreFilter(filters.MessageFilter):
+    """Фильтр сообщений, текст которых совпадает с одним из жанров реестра."""
+
+    def __init__(self, genre_registry: GenreRegistry) -> None:
+        super().__init__(name='GenreFilter')
+        self.genre_registry = genre_registry
+
+    def filter(self, message: Message) -> bool:
+        return message.text in self.genre_registry
@@ -0,0 +1,158 @@
+import asyncio
+import logging
+from http import HTTPStatus
+from typing import Awaitable, Callable, Dict, NamedTuple, Optional, Tuple
+
+http_server_logger = logging.getLogger(__name__)
+
+
+class Request(NamedTuple):
+    method: str
+    path: str
+    query: str
+    headers: Dict[str, str]
+    body: bytes
+
+
+class Response(NamedTuple):
+    status: int = HTTPStatus.OK
+    body: bytes = b''
+    content_type: str = 'text/plain; charset=utf-8'
+
+
+Handler = Callable[[Request], Awaitable[Response]]
+
+
+class _HttpError(Exception):
+    def __init__(self, status: HTTPStatus) -> None:
+        super().__init__(status.phrase)
+        self.status = status
+
+
+class HttpServer:
+    """
+    Минимальный асинхронный HTTP/1.1 сервер на asyncio для служебных эндпоинтов бота.
+    Поддерживает keep-alive, тела запросов с Content-Length и ограничение количества одновременных соединений.
+    """
+
+    def __init__(self, listen: str, port: int, *, max_connections: int = 100, max_body_size: int = 1024 * 1024,
+                 idle_timeout: float = 30) -> None:
+        self.listen = listen
+        self.port = port
+        self.max_body_size = max_body_size
+        self.idle_timeout = idle_timeout
+        self.max_connections = max_connections
+        self._routes: Dict[Tuple[str, str], Handler] = {}
+        self._connections: Optional[asyncio.BoundedSemaphore] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    def route(self, method: str, path: str, handler: Handler) -> None:
+        """
+        Регистрирует обработчик запросов.
+        :param method: HTTP метод запроса
+        :param path: путь запроса
+        :param handler: асинхронный обработчик, принимающий Request и возвращающий Response
+        :return: None
+        """
+        self._routes[(method.upper(), path)] = handler
+
+    @property
+    def port_in_use(self) -> int:
+        """
+        Порт, который фактически слушает сервер (полезно при port=0).
+        :return: номер порта
+        """
+        return self._server.sockets[0].getsockname()[1] if self._server else self.port
+
+    async def start(self) -> None:
+        http_server_logger.info(f'Starting HTTP server on {self.listen}:{self.port}')
+        self._connections = asyncio.BoundedSemaphore(self.max_connections)
+        self._server = await asyncio.start_server(self._handle_connection, self.listen, self.port)
+
+    async def stop(self) -> None:
+        if self._server is None:
+            return
+        http_server_logger.info(f'Stopping HTTP server on {self.listen}:{self.port_in_use}')
+        self._server.close()
+        await self._server.wait_closed()
+        self._server = None
+
+    async def _read_line(self, reader: asyncio.StreamReader, too_long: HTTPStatus) -> bytes:
+        try:
+            return await asyncio.wait_for(reader.readline(), self.idle_timeout)
+        except ValueError:
+            # Строка длиннее лимита буфера StreamReader (64 КиБ); LimitOverrunError readline превращает в ValueError
+            raise _HttpError(too_long)
+
+    async def _read_request(self, reader: asyncio.StreamReader) -> Optional[Request]:
+        request_line = await self._read_line(reader, HTTPStatus.BAD_REQUEST)
+        if not request_line:
+            return None
+        try:
+            method, target, version = request_line.decode('latin-1').rstrip('\r\n').split(' ', 2)
+        except ValueError:
+            raise _HttpError(HTTPStatus.BAD_REQUEST)
+        headers = {}
+        while True:
+            line = await self._read_line(reader, HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE)
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        if 'chunked' in headers.get('transfer-encoding', '').lower():
+            raise _HttpError(HTTPStatus.LENGTH_REQUIRED)
+        try:
+            content_length = int(headers.get('content-length') or 0)
+        except ValueError:
+            raise _HttpError(HTTPStatus.BAD_REQUEST)
+        if content_length > self.max_body_size:
+            raise _HttpError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+        body = await reader.readexactly(content_length) if content_length else b''
+        path, _, query = target.partition('?')
+        return Request(method.upper(), path, query, headers, body)
+
+    async def _dispatch(self, request: Request) -> Response:
+        handler = self._routes.get((request.method, request.path))
+        if handler is None:
+            if any(path == request.path for method, path in self._routes):
+                return Response(HTTPStatus.METHOD_NOT_ALLOWED, b'Method Not Allowed')
+            return Response(HTTPStatus.NOT_FOUND, b'Not Found')
+        try:
+            return await handler(request)
+        except Exception as e:
+            http_server_logger.exception(f'Request {request.method} {request.path} failed. Error: {e}')
+            return Response(HTTPStatus.INTERNAL_SERVER_ERROR, b'Internal Server Error')
+
+    @staticmethod
+    async def _write_response(writer: asyncio.StreamWriter, response: Response, keep_alive: bool) -> None:
+        status = HTTPStatus(response.status)
+        head = (
+            f'HTTP/1.1 {status.value} {status.phrase}\r\n'
+            f'Content-Type: {response.content_type}\r\n'
+            f'Content-Length: {len(response.body)}\r\n'
+            f'Connection: {"keep-alive" if keep_alive else "close"}\r\n'
+            '\r\n'
+        )
+        writer.write(head.encode('latin-1') + response.body)
+        await writer.drain()
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        async with self._connections:
+            try:
+                while True:
+                    try:
+                        request = await self._read_request(reader)
+                    except _HttpError as e:
+                        await self._write_response(writer, Response(e.status, e.status.phrase.encode()), False)
+                        break
+                    if request is None:
+                        break
+                    keep_alive = request.headers.get('connection', '').lower() != 'close'
+                    response = await self._dispatch(request)
+                    await self._write_response(writer, response, keep_alive)
+                    if not keep_alive:
+                        break
+            except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+                pass
+            finally:
+                writer.close()
@@ -0,0 +1,116 @@
+import logging
+from http import HTTPStatus
+from typing import Callable, Dict, Iterable, List, Optional, Union
+
+from telegram.ext import Application, BaseHandler, ConversationHandler
+
+from metrics import REGISTRY, timed
+from telegram_API.utils.http_server import HttpServer, Request, Response
+
+instrumentation_logger = logging.getLogger(__name__)
+
+HANDLER_DURATION = REGISTRY.histogram('bot_handler_duration_seconds', 'Duration of update handler callbacks',
+                                      ('handler',))
+HANDLER_ERRORS = REGISTRY.counter('bot_handler_errors_total', 'Update handler callbacks that raised an exception',
+                                  ('handler',))
+CONVERSATIONS = REGISTRY.gauge('bot_conversations', 'Conversations in progress per state', ('conversation', 'state'))
+UPDATES_IN_PROGRESS = REGISTRY.gauge('bot_updates_in_progress', 'Updates being processed by handlers')
+CHATS_WAITING = REGISTRY.gauge('bot_chats_waiting', 'Chats with accepted but not yet processed updates')
+COMPONENT_STATS = REGISTRY.gauge('bot_component_stats', 'Internal counters of bot components', ('component', 'stat'))
+
+_metrics_server: Optional[HttpServer] = None
+
+
+def _iter_handlers(handlers: Iterable[BaseHandler]) -> Iterable[BaseHandler]:
+    for handler in handlers:
+        if isinstance(handler, ConversationHandler):
+            yield from _iter_handlers(handler.entry_points)
+            for state_handlers in handler.states.values():
+                yield from _iter_handlers(state_handlers)
+            yield from _iter_handlers(handler.fallbacks)
+        else:
+            yield handler
+
+
+def instrument_handlers(handlers: Iterable[BaseHandler]) -> None:
+    """
+    Оборачивает функции обработчиков (в том числе вложенных в ConversationHandler) измерением длительности.
+    Метка handler - имя модуля и функции обработчика, например high.movie_count_handler.
+    Повторный вызов не оборачивает функции ещё раз.
+    :param handlers: обработчики приложения
+    :return: None
+    """
+    for handler in _iter_handlers(handlers):
+        callback = getattr(handler, 'callback', None)
+        if callback is None or hasattr(callback, '__wrapped__'):
+            continue
+        label = f'{callback.__module__.rsplit(".", 1)[-1]}.{callback.__name__}'
+        handler.callback = timed(HANDLER_DURATION, HANDLER_ERRORS, handler=label)(callback)
+
+
+def application_collector(application: Application) -> Callable[[], None]:
+    """
+    Создаёт сборщик метрик приложения: количество диалогов в каждом состоянии
+    и количество обрабатываемых обновлений.
+    :param application: приложение бота
+    :return: функция, обновляющая метрики
+    """
+    conversation_handlers: List[ConversationHandler] = [
+        handler for handlers in application.handlers.values() for handler in handlers
+        if isinstance(handler, ConversationHandler) and handler.name
+    ]
+
+    def collect() -> None:
+        CONVERSATIONS.clear()
+        for handler in conversation_handlers:
+            counts = {}
+            for state in list(handler._conversations.values()):
+                counts[state] = counts.get(state, 0) + 1
+            for state, conversations in counts.items():
+                CONVERSATIONS.set(conversations, conversation=handler.name, state=state)
+        UPDATES_IN_PROGRESS.set(getattr(application, 'in_progress_updates', 0))
+        CHATS_WAITING.set(getattr(application, 'waiting_chats', 0))
+
+    return collect
+
+
+def stats_collector(component: str, stats: Callable[[], Dict[str, Union[int, float]]]) -> Callable[[], None]:
+    """
+    Создаёт сборщик, публикующий счётчики компонента (метод stats) в метрике bot_component_stats.
+    :param component: имя компонента
+    :param stats: функция, возвращающая счётчики компонента
+    :return: функция, обновляющая метрики
+    """
+    def collect() -> None:
+        for stat, value in stats().items():
+            COMPONENT_STATS.set(value, component=component, stat=stat)
+
+    return collect
+
+
+async def _handle_metrics(request: Request) -> Response:
+    return Response(HTTPStatus.OK, REGISTRY.render().encode(), 'text/plain; version=0.0.4; charset=utf-8')
+
+
+async def start_metrics_server(listen: str, port: int) -> None:
+    """
+    Запускает HTTP сервер с эндпоинтом GET /metrics в текстовом формате Prometheus.
+    :param listen: адрес сервера
+    :param port: порт сервера
+    :return: None
+    """
+    global _metrics_server
+    if _metrics_server is not None:
+        return
+    _metrics_server = HttpServer(listen, port)
+    _metrics_server.route('GET', '/metrics', _handle_metrics)
+    await _metrics_server.start()
+    instrumentation_logger.info(f'Serving metrics on http://{listen}:{_metrics_server.port_in_use}/metrics')
+
+
+async def stop_metrics_server() -> None:
+    global _metrics_server
+    if _metrics_server is None:
+        return
+    await _metrics_server.stop()
+    _metrics_server = None
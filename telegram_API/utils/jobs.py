@@ -0,0 +1,90 @@
+import asyncio
+import logging
+
+from telegram.ext import ContextTypes
+
+from database.db_core import crud
+from settings import ApplicationSettings
+from site_API.site_api import movie_catalog, genre_registry, site_api_interface, query_prefetcher
+from telegram_API.utils.command_handlers_util import cursor_store, poster_pipeline
+from telegram_API.utils.persistence import SQLitePersistence
+from telegram_API.utils.rate_limiter import OutboundScheduler
+
+app_settings = ApplicationSettings()
+
+jobs_logger = logging.getLogger(__name__)
+
+
+async def refresh_catalog_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Фоновая задача обновления локального индекса Top-250.
+    :param context: Контекст бота.
+    :return: None
+    """
+    jobs_logger.info('Refreshing movie catalog')
+    await movie_catalog.refresh()
+
+
+async def refresh_genres_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Фоновая задача обновления реестра жанров.
+    :param context: Контекст бота.
+    :return: None
+    """
+    jobs_logger.info('Refreshing genres list')
+    await genre_registry.refresh()
+
+
+async def prefetch_popular_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Фоновая задача прогрева кэша API самыми частыми запросами /high и /low из таблицы Историй.
+    Запрос к базе данных выполняется в отдельном потоке.
+    :param context: Контекст бота.
+    :return: None
+    """
+    if movie_catalog.is_loaded:
+        return
+    queries = await asyncio.to_thread(crud.popular_queries, limit=app_settings.prefetch_queries,
+                                      since_days=app_settings.prefetch_history_days)
+    warmed = await query_prefetcher.warm(queries)
+    jobs_logger.info(f'Prefetched {warmed} of {len(queries)} popular queries')
+
+
+async def prune_history_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Фоновая задача применения политики хранения истории и сжатия базы данных.
+    Запросы к базе данных выполняются в отдельном потоке.
+    :param context: Контекст бота.
+    :return: None
+    """
+    deleted = await asyncio.to_thread(crud.prune_history, app_settings.history_keep_last,
+                                      app_settings.history_max_age_days)
+    jobs_logger.info(f'History pruned: {deleted} rows deleted')
+    if deleted:
+        await asyncio.to_thread(crud.compact_database)
+
+
+async def log_stats_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Фоновая задача, периодически записывающая в лог метрики кэша API, хранилища состояния
+    и планировщика исходящих запросов.
+    :param context: Контекст бота.
+    :return: None
+    """
+    jobs_logger.info(f'History writer stats: {crud.history_writer.stats()}')
+    if site_api_interface.cache is not None:
+        jobs_logger.info(f'Site API cache stats: {site_api_interface.cache.stats()}')
+    jobs_logger.info(f'Prefetch stats: {query_prefetcher.stats()}')
+    jobs_logger.info(f'Results cursor stats: {cursor_store.stats()}')
+    if site_api_interface.remote is not None:
+        jobs_logger.info(f'Site API requests to supervisor stats: {site_api_interface.remote.stats()}')
+    if poster_pipeline is not None:
+        jobs_logger.info(f'Poster stats: {poster_pipeline.stats()}')
+    if site_api_interface.guard is not None:
+        jobs_logger.info(f'Site API guard stats: {site_api_interface.guard.stats()}')
+    persistence = context.application.persistence
+    if isinstance(persistence, SQLitePersistence):
+        jobs_logger.info(f'Persistence stats: {persistence.stats()}')
+    rate_limiter = context.bot.rate_limiter
+    if isinstance(rate_limiter, OutboundScheduler):
+        jobs_logger.info(f'Outbound scheduler stats: {rate_limiter.stats()}')
@@ -0,0 +1,168 @@
+import asyncio
+import json
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple, Union
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+from database.utils.persistence_store import PersistenceStore
+
+persistence_logger = logging.getLogger(__name__)
+
+Entry = Tuple[str, str]
+ConversationKey = Tuple[Union[int, str], ...]
+
+
+class SQLitePersistence(BasePersistence[Dict, Dict, Dict]):
+    """
+    Инкрементальное хранение user_data, chat_data, bot_data и состояний диалогов в SQLite.
+    Записываются только изменившиеся записи: приложение сообщает, какие пользователи и чаты затронуты
+    обновлениями, а записи с неизменившимся значением пропускаются. Все изменения одного прохода
+    update_persistence записываются одной транзакцией. Данные пользователя и чата читаются из базы
+    при первом обращении (refresh_user_data / refresh_chat_data), а не при запуске, поэтому ни запуск,
+    ни сохранение не зависят от общего количества пользователей. При запуске загружаются только
+    незавершённые диалоги. Значения хранятся в JSON.
+    Чтобы не записывать неизменившиеся значения, в памяти хранятся последние записанные значения max_entries
+    недавно использованных записей. Остальные записи при следующем обращении снова читаются из базы.
+    """
+
+    def __init__(self, store: PersistenceStore, update_interval: float = 60, max_entries: int = 10000) -> None:
+        super().__init__(store_data=PersistenceInput(callback_data=False), update_interval=update_interval)
+        self.store = store
+        self.max_entries = max_entries
+        # Значение записи в базе данных; None - записи в базе нет
+        self._stored: 'OrderedDict[Entry, Optional[str]]' = OrderedDict()
+        self._pending: Dict[Entry, Optional[str]] = {}
+        self._write_task: Optional[asyncio.Task] = None
+        self.written = 0
+        self.batches = 0
+
+    @staticmethod
+    def _conversation_entry(name: str, key: ConversationKey) -> Entry:
+        return f'conversation:{name}', json.dumps(list(key))
+
+    def _remember(self, entry: Entry, value: Optional[str]) -> None:
+        self._stored[entry] = value
+        self._stored.move_to_end(entry)
+        if len(self._stored) > self.max_entries:
+            self._stored.popitem(last=False)
+
+    def _stage(self, entry: Entry, value: Optional[str]) -> None:
+        if entry not in self._pending and entry in self._stored and self._stored[entry] == value:
+            self._stored.move_to_end(entry)
+            return
+        self._pending[entry] = value
+
+    async def _write_batch(self) -> None:
+        # Даём остальным корутинам текущего прохода update_persistence добавить свои изменения в пакет
+        await asyncio.sleep(0)
+        batch, self._pending = self._pending, {}
+        if not batch:
+            return
+        try:
+            await asyncio.to_thread(self.store.write, batch)
+        except Exception:
+            for entry, value in batch.items():
+                self._pending.setdefault(entry, value)
+            raise
+        for entry, value in batch.items():
+            self._remember(entry, value)
+        self.written += len(batch)
+        self.batches += 1
+
+    async def _write_pending(self) -> None:
+        while self._pending:
+            if self._write_task is None or self._write_task.done():
+                self._write_task = asyncio.create_task(self._write_batch())
+            await asyncio.shield(self._write_task)
+
+    async def _load(self, entry: Entry) -> Optional[Any]:
+        if entry in self._pending:
+            return None
+        if entry in self._stored:
+            self._stored.move_to_end(entry)
+            return None
+        value = await asyncio.to_thread(self.store.load, *entry)
+        self._remember(entry, value)
+        if value is None:
+            return None
+        return json.loads(value)
+
+    async def get_user_data(self) -> Dict[int, Dict]:
+        return {}
+
+    async def get_chat_data(self) -> Dict[int, Dict]:
+        return {}
+
+    async def get_bot_data(self) -> Dict:
+        return await self._load(('bot_data', '')) or {}
+
+    async def get_callback_data(self) -> Optional[Any]:
+        return None
+
+    async def get_conversations(self, name: str) -> Dict[ConversationKey, object]:
+        kind = f'conversation:{name}'
+        stored = await asyncio.to_thread(self.store.load_kind, kind)
+        conversations = {}
+        for key, value in stored.items():
+            self._remember((kind, key), value)
+            conversations[tuple(json.loads(key))] = json.loads(value)
+        persistence_logger.info(f'Loaded {len(conversations)} unfinished "{name}" conversations')
+        return conversations
+
+    async def update_conversation(self, name: str, key: ConversationKey, new_state: Optional[object]) -> None:
+        self._stage(self._conversation_entry(name, key), None if new_state is None else json.dumps(new_state))
+        await self._write_pending()
+
+    async def update_user_data(self, user_id: int, data: Dict) -> None:
+        self._stage(('user_data', str(user_id)), json.dumps(data) if data else None)
+        await self._write_pending()
+
+    async def update_chat_data(self, chat_id: int, data: Dict) -> None:
+        self._stage(('chat_data', str(chat_id)), json.dumps(data) if data else None)
+        await self._write_pending()
+
+    async def update_bot_data(self, data: Dict) -> None:
+        self._stage(('bot_data', ''), json.dumps(data) if data else None)
+        await self._write_pending()
+
+    async def update_callback_data(self, data: Any) -> None:
+        pass
+
+    async def drop_user_data(self, user_id: int) -> None:
+        self._stage(('user_data', str(user_id)), None)
+        await self._write_pending()
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        self._stage(('chat_data', str(chat_id)), None)
+        await self._write_pending()
+
+    async def refresh_user_data(self, user_id: int, user_data: Dict) -> None:
+        stored = await self._load(('user_data', str(user_id)))
+        if stored and not user_data:
+            user_data.update(stored)
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: Dict) -> None:
+        stored = await self._load(('chat_data', str(chat_id)))
+        if stored and not chat_data:
+            chat_data.update(stored)
+
+    async def refresh_bot_data(self, bot_data: Dict) -> None:
+        pass
+
+    async def flush(self) -> None:
+        await self._write_pending()
+        persistence_logger.info(f'Persistence flushed. Stats: {self.stats()}')
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Счётчики хранилища.
+        :return: количество ожидающих записи, загруженных и записанных записей и количество пакетов
+        """
+        return {
+            'pending': len(self._pending),
+            'loaded': len(self._stored),
+            'written': self.written,
+            'batches': self.batches,
+        }
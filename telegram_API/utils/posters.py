@@ -0,0 +1,292 @@
+import asyncio
+import hashlib
+import io
+import logging
+import math
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Optional, Union
+
+import httpx
+from PIL import Image, ImageOps
+
+posters_logger = logging.getLogger(__name__)
+
+# Ограничения Telegram для фото: сумма ширины и высоты не больше 10000, соотношение сторон не больше 20,
+# размер файла не больше 10 МБ
+PHOTO_MAX_DIMENSIONS_SUM = 10000
+PHOTO_MAX_ASPECT_RATIO = 20
+PHOTO_MAX_BYTES = 10 * 1024 * 1024
+
+
+def prepare_poster(data: bytes, max_side: int = 1280, quality: int = 85) -> bytes:
+    """
+    Уменьшает и пережимает постер в JPEG, подходящий под ограничения Telegram для фото.
+    :param data: исходное изображение
+    :param max_side: максимальная длина большей стороны в пикселях
+    :param quality: качество JPEG
+    :return: изображение в формате JPEG
+    """
+    with Image.open(io.BytesIO(data)) as source:
+        # Для JPEG декодирование сразу выполняется в уменьшенном масштабе, не меньшем итогового размера
+        scale = max_side / max(source.size)
+        if scale < 1:
+            source.draft('RGB', (math.ceil(source.width * scale), math.ceil(source.height * scale)))
+        image = ImageOps.exif_transpose(source)
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        width, height = image.size
+        if max(width, height) > PHOTO_MAX_ASPECT_RATIO * min(width, height):
+            if width > height:
+                image = image.crop((0, 0, height * PHOTO_MAX_ASPECT_RATIO, height))
+            else:
+                image = image.crop((0, 0, width, width * PHOTO_MAX_ASPECT_RATIO))
+        side = min(max_side, PHOTO_MAX_DIMENSIONS_SUM // 2)
+        image.thumbnail((side, side), Image.LANCZOS)
+        output = io.BytesIO()
+        image.save(output, 'JPEG', quality=quality, optimize=True, progressive=True)
+    result = output.getvalue()
+    if len(result) > PHOTO_MAX_BYTES:
+        raise ValueError(f'Prepared poster is too large: {len(result)} bytes')
+    return result
+
+
+class PosterCache:
+    """
+    Кэш подготовленных постеров на диске с ограниченным общим размером и вытеснением давно не использованных
+    файлов (LRU). Порядок использования хранится во времени изменения файлов, поэтому переживает перезапуск.
+    Файлы записываются атомарно, так что каталог могут использовать несколько процессов бота.
+    Методы выполняют операции с файлами и вызываются из пула потоков.
+    """
+
+    def __init__(self, directory: Union[str, Path], max_bytes: int = 256 * 1024 * 1024) -> None:
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self._files: 'OrderedDict[str, int]' = OrderedDict()
+        self._size = 0
+        self._loaded = False
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+    @staticmethod
+    def file_name(image_url: str) -> str:
+        return f'{hashlib.sha1(image_url.encode()).hexdigest()}.jpg'
+
+    def _load(self) -> None:
+        if self._loaded:
+            return
+        self.directory.mkdir(parents=True, exist_ok=True)
+        files = []
+        for path in self.directory.glob('*.jpg'):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, path.name, stat.st_size))
+        for mtime, name, size in sorted(files):
+            self._files[name] = size
+            self._size += size
+        self._loaded = True
+        self._evict()
+        posters_logger.info(f'Poster cache {self.directory}: {len(self._files)} files, {self._size} bytes')
+
+    def _evict(self) -> None:
+        while self._size > self.max_bytes and len(self._files) > 1:
+            name, size = self._files.popitem(last=False)
+            self._size -= size
+            self.evictions += 1
+            try:
+                os.remove(self.directory / name)
+            except FileNotFoundError:
+                pass
+
+    def read(self, image_url: str) -> Optional[bytes]:
+        """
+        Читает подготовленный постер из кэша.
+        :param image_url: URL-адрес постера
+        :return: изображение или None, если его нет в кэше
+        """
+        name = self.file_name(image_url)
+        with self._lock:
+            self._load()
+            if name not in self._files:
+                self.misses += 1
+                return None
+            self._files.move_to_end(name)
+        path = self.directory / name
+        try:
+            data = path.read_bytes()
+            os.utime(path)
+        except FileNotFoundError:
+            # Файл вытеснен другим процессом
+            with self._lock:
+                self._size -= self._files.pop(name, 0)
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return data
+
+    def write(self, image_url: str, data: bytes) -> None:
+        """
+        Сохраняет подготовленный постер в кэше, вытесняя давно не использованные файлы при переполнении.
+        :param image_url: URL-адрес постера
+        :param data: изображение
+        :return: None
+        """
+        name = self.file_name(image_url)
+        path = self.directory / name
+        with self._lock:
+            self._load()
+        temporary_path = path.with_name(f'{name}.{os.getpid()}.{threading.get_ident()}.tmp')
+        temporary_path.write_bytes(data)
+        os.replace(temporary_path, path)
+        with self._lock:
+            self._size += len(data) - self._files.pop(name, 0)
+            self._files[name] = len(data)
+            self.stores += 1
+            self._evict()
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Счётчики работы кэша постеров.
+        :return: словарь с количеством и размером файлов, попаданий, промахов, записей и вытеснений
+        """
+        return {
+            'files': len(self._files),
+            'bytes': self._size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'stores': self.stores,
+            'evictions': self.evictions,
+        }
+
+
+class PosterPipeline:
+    """
+    Подготовка постеров к отправке.
+    Каждый постер скачивается один раз, уменьшается и пережимается под ограничения Telegram для фото в пуле
+    потоков и сохраняется в кэше на диске. Одновременные запросы одного постера объединяются в одну загрузку.
+    Клиент для скачивания создаётся методом start и закрывается методом close.
+    """
+
+    def __init__(self, cache: PosterCache, *, max_side: int = 1280, quality: int = 85, workers: int = 2,
+                 timeout: float = 10, max_download_bytes: int = 20 * 1024 * 1024) -> None:
+        self.cache = cache
+        self.max_side = max_side
+        self.quality = quality
+        self.workers = workers
+        self.timeout = timeout
+        self.max_download_bytes = max_download_bytes
+        self._client: Optional[httpx.AsyncClient] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self.downloads = 0
+        self.failures = 0
+
+    async def start(self) -> None:
+        if self._client is not None:
+            return
+        self._client = httpx.AsyncClient(timeout=self.timeout, follow_redirects=True)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='poster')
+
+    async def close(self) -> None:
+        if self._client is None:
+            return
+        await self._client.aclose()
+        self._executor.shutdown(wait=False)
+        self._client = None
+        self._executor = None
+
+    async def get(self, image_url: str) -> Optional[bytes]:
+        """
+        Возвращает подготовленный постер из кэша или скачивает и подготавливает его.
+        Если вызов, начавший загрузку, отменён, ожидающие её вызовы повторяют загрузку, а если он завершился
+        ошибкой, ожидающие получают ту же ошибку.
+        :param image_url: URL-адрес постера
+        :return: изображение в формате JPEG или None, если постер не удалось получить
+        """
+        if self._client is None or not image_url.startswith(('http://', 'https://')):
+            return None
+        loop = asyncio.get_running_loop()
+        data = await loop.run_in_executor(self._executor, self.cache.read, image_url)
+        if data is not None:
+            return data
+
+        while True:
+            in_flight = self._in_flight.get(image_url)
+            if in_flight is None:
+                break
+            try:
+                return await asyncio.shield(in_flight)
+            except asyncio.CancelledError:
+                if not in_flight.cancelled():
+                    raise
+                # Загрузка отменена вместе с запросившим её вызовом: ожидающие повторяют её,
+                # и первый из них становится новым ведущим
+        future = loop.create_future()
+        self._in_flight[image_url] = future
+        try:
+            data = await self._download(image_url)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()
+            raise
+        else:
+            future.set_result(data)
+            return data
+        finally:
+            del self._in_flight[image_url]
+
+    async def _download(self, image_url: str) -> Optional[bytes]:
+        try:
+            self.downloads += 1
+            content = await self._read(image_url)
+            return await asyncio.get_running_loop().run_in_executor(self._executor, self._prepare, image_url, content)
+        except Exception as e:
+            # Кроме ошибок сети и размера, это могут быть httpx.InvalidURL, httpx.StreamError и ошибки разбора
+            # повреждённого изображения в Pillow (SyntaxError, struct.error): во всех случаях постер отправляется по URL
+            self.failures += 1
+            posters_logger.warning(f'Could not prepare poster {image_url}. Error: {e}')
+            return None
+
+    async def _read(self, image_url: str) -> bytes:
+        # Тело читается частями, чтобы слишком большой постер не загружался в память целиком
+        async with self._client.stream('GET', image_url) as response:
+            if response.status_code != httpx.codes.OK:
+                raise ValueError(f'status code {response.status_code}')
+            length = response.headers.get('Content-Length', '')
+            if length.isdigit() and int(length) > self.max_download_bytes:
+                raise ValueError(f'poster is too large: {length} bytes')
+            chunks = []
+            size = 0
+            async for chunk in response.aiter_bytes():
+                size += len(chunk)
+                if size > self.max_download_bytes:
+                    raise ValueError(f'poster is larger than {self.max_download_bytes} bytes')
+                chunks.append(chunk)
+        return b''.join(chunks)
+
+    def _prepare(self, image_url: str, content: bytes) -> bytes:
+        data = prepare_poster(content, self.max_side, self.quality)
+        try:
+            self.cache.write(image_url, data)
+        except OSError as e:
+            posters_logger.warning(f'Could not store poster {image_url} in the cache. Error: {e}')
+        return data
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Счётчики работы подготовки постеров.
+        :return: счётчики кэша постеров, количество загрузок и неудавшихся подготовок
+        """
+        return {**self.cache.stats(), 'downloads': self.downloads, 'failures': self.failures}
@@ -0,0 +1,197 @@
+import asyncio
+import cProfile
+import io
+import logging
+import os
+import pstats
+import random
+import re
+import time
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+from types import FrameType
+from typing import Any, Coroutine, Dict, Generator, List, Optional, Tuple, Union
+
+from telegram import Update
+
+from metrics import Span, trace
+
+profiler_logger = logging.getLogger(__name__)
+
+AwaitSite = Tuple[str, ...]
+
+
+def _frame_location(frame: FrameType) -> str:
+    return f'{frame.f_globals.get("__name__", "?")}:{frame.f_code.co_name}:{frame.f_lineno}'
+
+
+def _await_stack(coroutine: Any) -> AwaitSite:
+    """
+    Стек ожидания приостановленной корутины: цепочка cr_await от обработчика до самого глубокого await.
+    :param coroutine: приостановленная корутина
+    :return: места приостановки, от внешнего к внутреннему
+    """
+    stack = []
+    while coroutine is not None:
+        frame = getattr(coroutine, 'cr_frame', None) or getattr(coroutine, 'gi_frame', None)
+        if frame is not None:
+            stack.append(_frame_location(frame))
+        coroutine = getattr(coroutine, 'cr_await', None) or getattr(coroutine, 'gi_yieldfrom', None)
+    return tuple(stack)
+
+
+class _ProfiledCoroutine:
+    """
+    Обёртка корутины, выполняющая её по шагам. Для каждого шага (отрезка между двумя await, на котором корутина
+    занимает цикл событий) измеряется время и процессорное время, а для каждой приостановки - стек ожидания
+    и его длительность. Если передан cProfile.Profile, он включается только на шагах этой корутины, поэтому
+    в профиль не попадают другие обновления, обрабатываемые в это время.
+    """
+
+    def __init__(self, coroutine: Coroutine, profile: Optional[cProfile.Profile] = None) -> None:
+        self.coroutine = coroutine
+        self.profile = profile
+        self.running_time = 0.0
+        self.cpu_time = 0.0
+        self.steps = 0
+        self.waits: Dict[AwaitSite, List[float]] = defaultdict(lambda: [0, 0.0])
+
+    def __await__(self) -> Generator[Any, Any, Any]:
+        send_value, throw_value = None, None
+        while True:
+            started, cpu_started = time.perf_counter(), time.thread_time()
+            if self.profile is not None:
+                self.profile.enable()
+            try:
+                if throw_value is not None:
+                    suspended_on = self.coroutine.throw(throw_value)
+                else:
+                    suspended_on = self.coroutine.send(send_value)
+            except StopIteration as stop:
+                return stop.value
+            finally:
+                if self.profile is not None:
+                    self.profile.disable()
+                self.running_time += time.perf_counter() - started
+                self.cpu_time += time.thread_time() - cpu_started
+                self.steps += 1
+
+            site = _await_stack(self.coroutine)
+            suspended = time.perf_counter()
+            try:
+                send_value, throw_value = (yield suspended_on), None
+            except GeneratorExit:
+                self.coroutine.close()
+                raise
+            except BaseException as e:
+                send_value, throw_value = None, e
+            finally:
+                wait = self.waits[site]
+                wait[0] += 1
+                wait[1] += time.perf_counter() - suspended
+
+
+class UpdateProfiler:
+    """
+    Профилировщик обработки обновлений.
+    Для каждого обновления измеряет общее время, время выполнения в цикле событий (в том числе процессорное)
+    и время ожидания в await с разбивкой по местам ожидания, а также собирает наблюдения метрик
+    (запросы к API, CRUD, запросы к Telegram), сделанные при обработке. Доля sample_rate обновлений
+    дополнительно профилируется cProfile. Отчёт записывается для профилированных обновлений и для обновлений,
+    обработка которых заняла не меньше slow_threshold секунд. В каталоге хранится не больше max_files отчётов.
+    """
+
+    def __init__(self, directory: Union[str, Path], *, sample_rate: float = 0.0, slow_threshold: float = 1.0,
+                 max_files: int = 200) -> None:
+        self.directory = Path(directory)
+        self.sample_rate = sample_rate
+        self.slow_threshold = slow_threshold
+        self.max_files = max_files
+        self.reports = 0
+
+    async def run(self, update: object, coroutine: Coroutine) -> Any:
+        """
+        Выполняет обработку обновления с профилированием.
+        :param update: обрабатываемое обновление
+        :param coroutine: корутина обработки обновления
+        :return: результат корутины
+        """
+        sampled = self.sample_rate > 0 and random.random() < self.sample_rate
+        profiled = _ProfiledCoroutine(coroutine, cProfile.Profile() if sampled else None)
+        started = time.perf_counter()
+        with trace() as spans:
+            try:
+                return await profiled
+            finally:
+                wall_time = time.perf_counter() - started
+                if sampled or wall_time >= self.slow_threshold:
+                    report = self._report(update, profiled, spans, wall_time, sampled)
+                    asyncio.get_running_loop().run_in_executor(None, self._write_report, report)
+
+    @staticmethod
+    def _describe(update: object, spans: List[Span]) -> Tuple[str, str]:
+        handlers = [key[0] for name, key, value in spans if name == 'bot_handler_duration_seconds']
+        command = handlers[0] if handlers else 'update'
+        if command == 'update' and isinstance(update, Update) and update.effective_message \
+                and (update.effective_message.text or '').startswith('/'):
+            command = update.effective_message.text.split()[0][1:]
+        user = update.effective_user.id if isinstance(update, Update) and update.effective_user else 'unknown'
+        return command, str(user)
+
+    def _report(self, update: object, profiled: _ProfiledCoroutine, spans: List[Span], wall_time: float,
+                sampled: bool) -> Dict[str, Any]:
+        command, user = self._describe(update, spans)
+        lines = [
+            f'update_id: {update.update_id if isinstance(update, Update) else None}',
+            f'user_id: {user}',
+            f'command: {command}',
+            f'sampled: {sampled}',
+            '',
+            f'wall time:          {wall_time * 1000:10.1f} ms',
+            f'running on loop:    {profiled.running_time * 1000:10.1f} ms in {profiled.steps} steps',
+            f'  of it CPU:        {profiled.cpu_time * 1000:10.1f} ms',
+            f'awaiting:           {max(0.0, wall_time - profiled.running_time) * 1000:10.1f} ms',
+            '',
+            'Instrumented operations (metric{labels}: count, total ms):',
+        ]
+        operations: Dict[str, List[float]] = defaultdict(lambda: [0, 0.0])
+        for name, key, value in spans:
+            operation = operations[f'{name}{{{",".join(key)}}}']
+            operation[0] += 1
+            operation[1] += value
+        for name, (count, total) in sorted(operations.items(), key=lambda item: -item[1][1]):
+            lines.append(f'  {name}: {count}, {total * 1000:.1f}')
+        lines += ['', 'Await sites (innermost frames last: count, total ms):']
+        for site, (count, total) in sorted(profiled.waits.items(), key=lambda item: -item[1][1])[:20]:
+            lines.append(f'  {count}, {total * 1000:.1f}')
+            lines.extend(f'      {location}' for location in site[-6:])
+        profile_stats = None
+        if profiled.profile is not None:
+            stream = io.StringIO()
+            pstats.Stats(profiled.profile, stream=stream).sort_stats('cumulative').print_stats(40)
+            lines += ['', 'cProfile (steps of this update only):', stream.getvalue()]
+            profile_stats = profiled.profile
+        timestamp = datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+        name = f'{timestamp}-{re.sub(r"[^A-Za-z0-9_.-]", "_", command)}-{user}-{int(wall_time * 1000)}ms'
+        return {'name': name, 'text': '\n'.join(lines) + '\n', 'profile': profile_stats}
+
+    def _write_report(self, report: Dict[str, Any]) -> None:
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            (self.directory / f'{report["name"]}.txt').write_text(report['text'], encoding='utf-8')
+            if report['profile'] is not None:
+                report['profile'].dump_stats(str(self.directory / f'{report["name"]}.prof'))
+            self.reports += 1
+            self._rotate()
+        except OSError as e:
+            profiler_logger.warning(f'Could not write profile {report["name"]}. Error: {e}')
+
+    def _rotate(self) -> None:
+        reports = sorted(self.directory.glob('*.txt'))
+        for old_report in reports[:max(0, len(reports) - self.max_files)]:
+            for path in (old_report, old_report.with_suffix('.prof')):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
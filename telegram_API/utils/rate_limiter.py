@@ -0,0 +1,230 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from typing import Any, Callable, Coroutine, Dict, List, Optional, Tuple, Union
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+from metrics import REGISTRY
+
+rate_limiter_logger = logging.getLogger(__name__)
+
+TELEGRAM_REQUEST_DURATION = REGISTRY.histogram('telegram_request_duration_seconds',
+                                               'Duration of Telegram Bot API requests', ('endpoint', 'result'))
+TELEGRAM_WAIT_DURATION = REGISTRY.histogram('telegram_rate_limit_wait_seconds',
+                                            'Time Telegram requests waited for the outbound rate limiter',
+                                            ('endpoint',))
+
+INTERACTIVE, BULK = 0, 1
+
+INTERACTIVE_ENDPOINTS = frozenset({'answerCallbackQuery', 'answerInlineQuery'})
+
+
+class TokenBucket:
+    """Корзина токенов: rate токенов в секунду, не более capacity накопленных токенов."""
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def take(self) -> float:
+        """
+        Забирает токен, если он доступен.
+        :return: 0, если токен получен, иначе время в секундах до появления токена
+        """
+        self._refill()
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0.0
+        return (1 - self._tokens) / self.rate
+
+    def reserve(self) -> float:
+        """
+        Резервирует токен в порядке очереди, в том числе в долг.
+        :return: время в секундах, которое нужно подождать перед использованием токена
+        """
+        self._refill()
+        self._tokens -= 1
+        return max(0.0, -self._tokens / self.rate)
+
+    def pause(self, seconds: float) -> None:
+        """
+        Откладывает выдачу токенов на указанное время.
+        :param seconds: время паузы в секундах
+        :return: None
+        """
+        self._refill()
+        self._tokens = min(self._tokens, 0.0) - seconds * self.rate
+
+    @property
+    def is_idle(self) -> bool:
+        self._refill()
+        return self._tokens >= self.capacity
+
+
+class OutboundScheduler(BaseRateLimiter[int]):
+    """
+    Планировщик исходящих запросов к Bot API с учётом ограничений Telegram.
+    Каждый запрос сначала резервирует токен в корзине своего чата (отдельные лимиты для личных чатов и групп),
+    затем ждёт токен в общей корзине. Очередь общей корзины упорядочена по приоритету: интерактивные ответы
+    (INTERACTIVE) обслуживаются раньше массовых отправок (BULK). Приоритет передаётся через rate_limit_args
+    методов ExtBot; BULK помечены отправки списков фильмов (telegram_API.utils.command_handlers_util).
+    При ошибке RetryAfter выдача токенов приостанавливается на указанное время и запрос повторяется.
+    """
+
+    def __init__(self, *, global_rate: float = 30, global_burst: float = 30,
+                 chat_rate: float = 1, chat_burst: float = 10,
+                 group_rate: float = 20 / 60, group_burst: float = 3,
+                 max_retries: int = 3, max_idle_chats: int = 10000) -> None:
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_rate = group_rate
+        self.group_burst = group_burst
+        self.max_retries = max_retries
+        self.max_idle_chats = max_idle_chats
+        self._global = TokenBucket(global_rate, global_burst)
+        self._chats: Dict[Union[int, str], TokenBucket] = {}
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._sequence = itertools.count()
+        self._dispatcher: Optional[asyncio.Task] = None
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+        self.requests = 0
+        self.delayed_requests = 0
+        self.retry_after_hits = 0
+        self.total_wait_time = 0.0
+        self.max_wait_time = 0.0
+
+    async def initialize(self) -> None:
+        rate_limiter_logger.info('Starting outbound scheduler')
+
+    async def shutdown(self) -> None:
+        rate_limiter_logger.info(f'Stopping outbound scheduler. Stats: {self.stats()}')
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            self._dispatcher = None
+        for priority, sequence, future in self._waiters:
+            if not future.done():
+                future.cancel()
+        self._waiters.clear()
+
+    def _get_chat_bucket(self, chat_id: Union[int, str]) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= self.max_idle_chats:
+                self._chats = {key: value for key, value in self._chats.items() if not value.is_idle}
+            is_group = isinstance(chat_id, str) or chat_id < 0
+            bucket = TokenBucket(self.group_rate, self.group_burst) if is_group \
+                else TokenBucket(self.chat_rate, self.chat_burst)
+            self._chats[chat_id] = bucket
+        return bucket
+
+    async def _dispatch(self) -> None:
+        """Выдаёт токены общей корзины ожидающим запросам в порядке приоритета."""
+        while self._waiters:
+            if self._waiters[0][2].done():
+                heapq.heappop(self._waiters)
+                continue
+            wait = self._global.take()
+            if wait > 0:
+                await asyncio.sleep(wait)
+                continue
+            priority, sequence, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)
+        self._dispatcher = None
+
+    async def _acquire(self, chat_id: Optional[Union[int, str]], priority: int) -> None:
+        if chat_id is not None:
+            delay = self._get_chat_bucket(chat_id).reserve()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        if not self._waiters and self._global.take() == 0:
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), future))
+        if self._dispatcher is None:
+            self._dispatcher = asyncio.create_task(self._dispatch())
+        await future
+
+    async def process_request(
+        self,
+        callback: Callable[..., Coroutine[Any, Any, Union[bool, Dict[str, Any], List[Dict[str, Any]]]]],
+        args: Any,
+        kwargs: Dict[str, Any],
+        endpoint: str,
+        data: Dict[str, Any],
+        rate_limit_args: Optional[int],
+    ) -> Union[bool, Dict[str, Any], List[Dict[str, Any]]]:
+        """
+        Отправляет запрос, дождавшись токенов чата и общей корзины.
+        :param rate_limit_args: приоритет запроса: INTERACTIVE (по умолчанию) или BULK
+        """
+        priority = INTERACTIVE if rate_limit_args is None or endpoint in INTERACTIVE_ENDPOINTS \
+            else rate_limit_args
+        chat_id = data.get('chat_id')
+        try:
+            chat_id = int(chat_id)
+        except (TypeError, ValueError):
+            pass
+
+        self.requests += 1
+        for attempt in range(self.max_retries + 1):
+            started = time.monotonic()
+            self.queue_depth += 1
+            self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+            try:
+                await self._acquire(chat_id, priority)
+            finally:
+                self.queue_depth -= 1
+            waited = time.monotonic() - started
+            self.total_wait_time += waited
+            self.max_wait_time = max(self.max_wait_time, waited)
+            if waited > 0.001:
+                self.delayed_requests += 1
+            TELEGRAM_WAIT_DURATION.observe(waited, endpoint=endpoint)
+
+            sent = time.perf_counter()
+            result = 'error'
+            try:
+                response = await callback(*args, **kwargs)
+                result = 'ok'
+                return response
+            except RetryAfter as exc:
+                result = 'retry_after'
+                self.retry_after_hits += 1
+                if attempt == self.max_retries:
+                    rate_limiter_logger.error(f'{endpoint} rate limited after {self.max_retries} retries')
+                    raise
+                rate_limiter_logger.warning(f'{endpoint} rate limited. Retrying after {exc.retry_after} seconds')
+                if chat_id is not None:
+                    self._get_chat_bucket(chat_id).pause(exc.retry_after)
+                else:
+                    self._global.pause(exc.retry_after)
+            finally:
+                TELEGRAM_REQUEST_DURATION.observe(time.perf_counter() - sent, endpoint=endpoint, result=result)
+
+    def stats(self) -> Dict[str, Union[int, float]]:
+        """
+        Метрики планировщика.
+        :return: словарь с глубиной очереди, количеством запросов и временем ожидания
+        """
+        return {
+            'queue_depth': self.queue_depth,
+            'max_queue_depth': self.max_queue_depth,
+            'requests': self.requests,
+            'delayed_requests': self.delayed_requests,
+            'retry_after_hits': self.retry_after_hits,
+            'avg_wait_time': self.total_wait_time / self.requests if self.requests else 0.0,
+            'max_wait_time': self.max_wait_time,
+        }
@@ -0,0 +1,109 @@
+import asyncio
+import hmac
+import json
+import logging
+import signal
+from http import HTTPStatus
+from typing import Optional
+
+from telegram import Update
+from telegram.ext import Application
+
+from telegram_API.utils.http_server import HttpServer, Request, Response
+
+webhook_logger = logging.getLogger(__name__)
+
+
+class WebhookServer:
+    """
+    Принимает обновления Telegram через вебхук на локальном HTTP сервере и передаёт их в очередь обновлений
+    приложения. Дополнительно обслуживает эндпоинт проверки состояния /healthz.
+    """
+
+    def __init__(self, application: Application, *, listen: str, port: int, path: str,
+                 url: Optional[str] = None, secret_token: Optional[str] = None, max_connections: int = 40) -> None:
+        self.application = application
+        self.path = path
+        self.url = url
+        self.secret_token = secret_token
+        self.max_connections = max_connections
+        self.http_server = HttpServer(listen, port, max_connections=max_connections)
+        self.http_server.route('POST', path, self._handle_update)
+        self.http_server.route('GET', '/healthz', self._handle_health)
+        self.received_updates = 0
+
+    async def _handle_update(self, request: Request) -> Response:
+        if self.secret_token:
+            received_token = request.headers.get('x-telegram-bot-api-secret-token', '')
+            if not hmac.compare_digest(received_token, self.secret_token):
+                webhook_logger.warning('Rejected webhook request with a wrong secret token')
+                return Response(HTTPStatus.FORBIDDEN, b'Forbidden')
+        try:
+            update = Update.de_json(json.loads(request.body), self.application.bot)
+        except (ValueError, TypeError, KeyError) as e:
+            webhook_logger.warning(f'Rejected malformed webhook update. Error: {e}')
+            return Response(HTTPStatus.BAD_REQUEST, b'Bad Request')
+        if update is None:
+            return Response(HTTPStatus.BAD_REQUEST, b'Bad Request')
+        self.received_updates += 1
+        await self.application.update_queue.put(update)
+        return Response(HTTPStatus.OK, b'OK')
+
+    async def _handle_health(self, request: Request) -> Response:
+        status = {
+            'status': 'ok' if self.application.running else 'starting',
+            'received_updates': self.received_updates,
+            'pending_updates': self.application.update_queue.qsize(),
+        }
+        return Response(HTTPStatus.OK if self.application.running else HTTPStatus.SERVICE_UNAVAILABLE,
+                        json.dumps(status).encode(), 'application/json')
+
+    async def start(self) -> None:
+        """
+        Запускает HTTP сервер и, если задан публичный адрес, регистрирует вебхук в Telegram.
+        :return: None
+        """
+        await self.http_server.start()
+        if self.url:
+            webhook_url = f'{self.url.rstrip("/")}{self.path}'
+            webhook_logger.info(f'Setting webhook to {webhook_url}')
+            await self.application.bot.set_webhook(webhook_url, secret_token=self.secret_token,
+                                                   max_connections=self.max_connections,
+                                                   allowed_updates=Update.ALL_TYPES)
+
+    async def stop(self) -> None:
+        await self.http_server.stop()
+
+
+async def serve_webhook(application: Application, webhook_server: WebhookServer) -> None:
+    """
+    Запускает приложение в режиме вебхука и обслуживает обновления до получения сигнала остановки.
+    Повторяет жизненный цикл Application.run_polling: initialize, post_init, start, а при остановке -
+    stop, shutdown, post_shutdown.
+    :param application: Приложение бота.
+    :param webhook_server: Сервер вебхука.
+    :return: None
+    """
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for stop_signal in (signal.SIGINT, signal.SIGTERM, signal.SIGABRT):
+        try:
+            loop.add_signal_handler(stop_signal, stop_event.set)
+        except NotImplementedError:
+            pass
+
+    await application.initialize()
+    if application.post_init:
+        await application.post_init(application)
+    try:
+        await application.start()
+        await webhook_server.start()
+        webhook_logger.info('Bot is serving webhook updates')
+        await stop_event.wait()
+    finally:
+        await webhook_server.stop()
+        if application.running:
+            await application.stop()
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)